@@ -0,0 +1,93 @@
+"""
+Post-trade analytics with scripts/response_analytics.py against a loop over
+response dicts.
+
+Writes --acks acks to a response journal and to a ResponseStore, then times
+the same statistics (latency percentiles, reject ratio, per-symbol counts,
+worst 10) computed by loading the journal as dicts and looping over them in
+Python, and by the vectorized single pass over each file. Peak memory is
+traced for each, the loop keeps every record while the single pass keeps
+one chunk.
+"""
+
+import argparse
+import json
+import shutil
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+import os, sys
+
+cwd = os.getcwd()
+if cwd.endswith("benchmarks"):
+    os.chdir("..")
+sys.path.append(os.getcwd())
+
+from scripts.journal import Journal
+from scripts.order import ResponseType
+from scripts.response_store import ResponseStore
+from scripts.response_analytics import analyze
+
+def write_history(journal_path, store_path, count, symbols, batch=10000):
+    journal = Journal(journal_path)
+    store = ResponseStore(store_path)
+    for start in range(0, count, batch):
+        acks = [(i, i % symbols, ResponseType.Reject if i % 20 == 0 else ResponseType.Accept,
+                 100_000 + (i * 7919) % 900_000, 1_700_000_000 * 10**9 + i * 100_000)
+                for i in range(start, min(start + batch, count))]
+        store.append_many(acks)
+        journal.append_many([{"order_id": order_id, "symbol_id": symbol_id, "response_type": str(response_type),
+                              "latency": latency_ns / 1e9, "timestamp": timestamp_ns / 1e9}
+                             for order_id, symbol_id, response_type, latency_ns, timestamp_ns in acks])
+    journal.close()
+    store.close()
+
+def dict_loop(journal_path):
+    """What the post-trade scripts did: every record as a dict, one Python loop"""
+    with open(journal_path) as f:
+        records = [json.loads(line) for line in f]
+    latencies = sorted(record["latency"] for record in records)
+    rejects = sum(1 for record in records if record["response_type"] == str(ResponseType.Reject))
+    by_symbol = {}
+    for record in records:
+        by_symbol[record["symbol_id"]] = by_symbol.get(record["symbol_id"], 0) + 1
+    worst = sorted(records, key=lambda record: record["latency"], reverse=True)[:10]
+    return {"p99": latencies[int(len(latencies) * 0.99)], "rejects": rejects, "by_symbol": by_symbol, "worst": worst}
+
+def measure(function, *args):
+    """Seconds of an untraced run and peak traced MB of a second run, tracing slows it down"""
+    start = time.perf_counter()
+    function(*args)
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    function(*args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak / 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--acks", type=int, default=500000, help="acks in the history")
+    parser.add_argument("--symbols", type=int, default=100, help="symbols the acks are spread over")
+    args = parser.parse_args()
+
+    temp_dir = tempfile.mkdtemp()
+    try:
+        journal_path = Path(temp_dir) / "responses.json"
+        store_path = Path(temp_dir) / "acks.bin"
+        write_history(journal_path, store_path, args.acks, args.symbols)
+        results = [("dict loop over the journal", *measure(dict_loop, journal_path)),
+                   ("vectorized, journal", *measure(analyze, journal_path)),
+                   ("vectorized, ResponseStore", *measure(analyze, store_path))]
+    finally:
+        shutil.rmtree(temp_dir)
+
+    print(f"{args.acks} acks")
+    print(f"{'':<28} {'seconds':>8} {'peak MB':>8}")
+    for label, elapsed, peak in results:
+        print(f"{label:<28} {elapsed:>8.2f} {peak:>8.1f}")
+
+if __name__ == "__main__":
+    main()
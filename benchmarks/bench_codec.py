@@ -0,0 +1,107 @@
+"""
+Microbenchmark for the binary wire codec against JSON lines.
+
+Measures encode and decode throughput for single messages and for batches
+packed into one preallocated buffer, plus the encoded size per message.
+"""
+
+import argparse
+import json
+import random
+import time
+
+import os, sys
+
+cwd = os.getcwd()
+if cwd.endswith("benchmarks"):
+    os.chdir("..")
+sys.path.append(os.getcwd())
+
+from scripts import codec
+from scripts.order import OrderRequest, OrderResponse, RequestType, ResponseType, REQUEST_TYPES, RESPONSE_TYPES
+
+def json_encode_request(order):
+    return (json.dumps({
+        "id": order.m_orderId,
+        "sym": order.m_symbolId,
+        "px": order.m_price,
+        "qty": order.m_qty,
+        "side": order.m_side,
+        "type": order.request_type.value,
+    }, separators=(',', ':')) + '\n').encode()
+
+def json_decode_request(line):
+    message = json.loads(line)
+    return OrderRequest(message["sym"], message["px"], message["qty"], message["side"], message["id"],
+                        REQUEST_TYPES[message["type"]])
+
+def json_encode_response(response):
+    return (json.dumps({"id": response.m_orderId, "type": response.m_responseType.value},
+                       separators=(',', ':')) + '\n').encode()
+
+def json_decode_response(line):
+    message = json.loads(line)
+    return OrderResponse(message["id"], RESPONSE_TYPES[message["type"]])
+
+def make_messages(count):
+    orders = [
+        OrderRequest(random.randint(1, 500), round(random.uniform(10, 1000), 2), random.randint(1, 1000),
+                     random.choice('BS'), order_id, random.choice((RequestType.New, RequestType.Modify, RequestType.Cancel)))
+        for order_id in range(count)
+    ]
+    responses = [OrderResponse(order_id, random.choice((ResponseType.Accept, ResponseType.Reject)))
+                 for order_id in range(count)]
+    return orders, responses
+
+def rate(fn, count):
+    start = time.perf_counter()
+    fn()
+    return count / (time.perf_counter() - start)
+
+def bench(count):
+    orders, responses = make_messages(count)
+    results = []
+
+    json_requests = [json_encode_request(order) for order in orders]
+    json_responses = [json_encode_response(response) for response in responses]
+    json_request_blob = b''.join(json_requests)
+    json_response_blob = b''.join(json_responses)
+    results.append(("json request", len(json_request_blob) / count,
+                    rate(lambda: [json_encode_request(order) for order in orders], count),
+                    rate(lambda: [json_decode_request(line) for line in json_request_blob.splitlines()], count)))
+    results.append(("json response", len(json_response_blob) / count,
+                    rate(lambda: [json_encode_response(response) for response in responses], count),
+                    rate(lambda: [json_decode_response(line) for line in json_response_blob.splitlines()], count)))
+
+    single_requests = [codec.encode_request(order) for order in orders]
+    results.append(("codec request", codec.REQUEST_SIZE,
+                    rate(lambda: [codec.encode_request(order) for order in orders], count),
+                    rate(lambda: [codec.decode_request(message) for message in single_requests], count)))
+    single_responses = [codec.encode_response(response) for response in responses]
+    results.append(("codec response", codec.RESPONSE_SIZE,
+                    rate(lambda: [codec.encode_response(response) for response in responses], count),
+                    rate(lambda: [codec.decode_response(message) for message in single_responses], count)))
+
+    request_buffer = bytearray(count * codec.REQUEST_SIZE)
+    response_buffer = bytearray(count * codec.RESPONSE_SIZE)
+    request_view = codec.encode_requests(orders, request_buffer)
+    response_view = codec.encode_responses(responses, response_buffer)
+    results.append(("codec request batch", codec.REQUEST_SIZE,
+                    rate(lambda: codec.encode_requests(orders, request_buffer), count),
+                    rate(lambda: codec.decode_requests(request_view), count)))
+    results.append(("codec response batch", codec.RESPONSE_SIZE,
+                    rate(lambda: codec.encode_responses(responses, response_buffer), count),
+                    rate(lambda: codec.decode_responses(response_view), count)))
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=200000, help="messages per measurement")
+    args = parser.parse_args()
+
+    print(f"{'format':<22} {'bytes/msg':>10} {'encode msg/s':>14} {'decode msg/s':>14}")
+    for name, size, encode_rate, decode_rate in bench(args.messages):
+        print(f"{name:<22} {size:>10.1f} {encode_rate:>14,.0f} {decode_rate:>14,.0f}")
+
+if __name__ == "__main__":
+    main()
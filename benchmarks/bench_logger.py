@@ -0,0 +1,57 @@
+"""
+Microbenchmark for the caller side cost of logging an order event.
+
+Reports nanoseconds per call for an f-string print to /dev/null (what the
+modules did before), the ring logger with the level enabled, disabled and
+sampled, all against a bare method call.
+"""
+
+import argparse
+import timeit
+
+import os, sys
+
+cwd = os.getcwd()
+if cwd.endswith("benchmarks"):
+    os.chdir("..")
+sys.path.append(os.getcwd())
+
+from scripts.logger import RingLogger, WARNING
+
+class Noop:
+    def info(self, template, *args):
+        pass
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--iterations", type=int, default=200000, help="calls per measurement")
+    parser.add_argument("--sample-every", type=int, default=100, help="sampling rate of the sampled case")
+    args = parser.parse_args()
+
+    devnull = open(os.devnull, 'w')
+    # Large enough that the enabled case measures enqueueing, not drops
+    logger = RingLogger(capacity=4 * args.iterations, stream=devnull)
+    disabled = RingLogger(level=WARNING, stream=devnull)
+    logger.set_sampling("bench", args.sample_every)
+    sampler = logger.sampled("bench")
+    noop = Noop()
+    order_id = 12345
+
+    cases = [
+        ("method call (baseline)", lambda: noop.info("Order %d added to queue.", order_id)),
+        ("print to /dev/null", lambda: print(f"Order {order_id} added to queue.", file=devnull)),
+        ("log.info", lambda: logger.info("Order %d added to queue.", order_id)),
+        ("log.info disabled", lambda: disabled.info("Order %d added to queue.", order_id)),
+        (f"sampled 1/{args.sample_every}", lambda: sampler.info("Order %d added to queue.", order_id)),
+    ]
+    print(f"{'operation':<24} {'ns/op':>8}")
+    for name, fn in cases:
+        elapsed = min(timeit.repeat(fn, number=args.iterations, repeat=3))
+        logger.flush()
+        print(f"{name:<24} {elapsed / args.iterations * 1e9:>8.1f}")
+    print(f"dropped records: {logger.dropped}")
+    logger.close()
+    disabled.close()
+
+if __name__ == "__main__":
+    main()
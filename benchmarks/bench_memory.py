@@ -0,0 +1,74 @@
+"""
+Memory benchmark: bytes per pending order.
+
+Compares the original dict-backed OrderRequest class, the current
+__slots__ OrderRequest and the struct-of-arrays PendingOrderStore,
+each holding N orders indexed by order ID.
+"""
+
+import argparse
+import time
+import tracemalloc
+
+import os, sys
+
+cwd = os.getcwd()
+if cwd.endswith("benchmarks"):
+    os.chdir("..")
+sys.path.append(os.getcwd())
+
+from scripts.order import OrderRequest, RequestType
+from scripts.order_store import PendingOrderStore
+
+class LegacyOrderRequest:
+    """OrderRequest as it was before __slots__, kept here as the baseline"""
+    def __init__(self, m_symbolId, m_price, m_qty, m_side, m_orderId, request_type=RequestType.New):
+        self.m_symbolId = m_symbolId
+        self.m_price = m_price
+        self.m_qty = m_qty
+        self.m_side = m_side
+        self.m_orderId = m_orderId
+        self.request_type = request_type
+        self.timestamp = time.time()
+
+def measure(build, count):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    holder = build(count)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del holder
+    return (after - before) / count
+
+def build_legacy(count):
+    return {i: LegacyOrderRequest(i % 500, 100.0 + i % 100 * 0.25, 10 + i % 7, 'B', i) for i in range(count)}
+
+def build_slotted(count):
+    return {i: OrderRequest(i % 500, 100.0 + i % 100 * 0.25, 10 + i % 7, 'B', i) for i in range(count)}
+
+def build_store(count):
+    store = PendingOrderStore()
+    template = OrderRequest(0, 0.0, 0, 'B', 0)
+    for i in range(count):
+        template.m_symbolId = i % 500
+        template.m_price = 100.0 + i % 100 * 0.25
+        template.m_qty = 10 + i % 7
+        template.m_orderId = i
+        store.add(template)
+    return store
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--orders", type=int, default=200000, help="number of pending orders")
+    args = parser.parse_args()
+
+    baseline = measure(build_legacy, args.orders)
+    print(f"{'representation':<28} {'bytes/order':>12} {'vs baseline':>12}")
+    for name, build in (("dict-backed OrderRequest", build_legacy),
+                        ("__slots__ OrderRequest", build_slotted),
+                        ("PendingOrderStore columns", build_store)):
+        per_order = baseline if build is build_legacy else measure(build, args.orders)
+        print(f"{name:<28} {per_order:>12.0f} {per_order / baseline:>11.0%}")
+
+if __name__ == "__main__":
+    main()
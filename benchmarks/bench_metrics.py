@@ -0,0 +1,63 @@
+"""
+Microbenchmark for the hot path cost of metric updates.
+
+Reports nanoseconds per counter increment and histogram observation,
+through the metric and through a thread's cached cell, against a bare
+method call and a lock-protected increment for reference.
+"""
+
+import argparse
+import threading
+import timeit
+
+import os, sys
+
+cwd = os.getcwd()
+if cwd.endswith("benchmarks"):
+    os.chdir("..")
+sys.path.append(os.getcwd())
+
+from scripts.metrics import MetricsRegistry
+
+class LockedCounter:
+    def __init__(self):
+        self.value = 0
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+class Noop:
+    def inc(self, amount=1):
+        pass
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--iterations", type=int, default=2000000, help="updates per measurement")
+    args = parser.parse_args()
+
+    registry = MetricsRegistry()
+    counter = registry.counter("bench_total", "Benchmark counter").labels()
+    histogram = registry.histogram("bench_seconds", "Benchmark histogram").labels()
+    counter_cell = counter.cell()
+    histogram_cell = histogram.cell()
+    noop = Noop()
+    locked = LockedCounter()
+
+    cases = [
+        ("method call (baseline)", noop.inc),
+        ("locked counter", locked.inc),
+        ("Counter.inc", counter.inc),
+        ("counter cell.inc", counter_cell.inc),
+        ("Histogram.observe", lambda: histogram.observe(0.0042)),
+        ("histogram cell.observe", lambda: histogram_cell.observe(0.0042)),
+        ("lambda (baseline)", lambda: None),
+    ]
+    print(f"{'operation':<24} {'ns/op':>8}")
+    for name, fn in cases:
+        elapsed = min(timeit.repeat(fn, number=args.iterations, repeat=3))
+        print(f"{name:<24} {elapsed / args.iterations * 1e9:>8.1f}")
+
+if __name__ == "__main__":
+    main()
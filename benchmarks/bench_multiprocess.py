@@ -0,0 +1,94 @@
+"""
+Throughput of the multi-process pipeline against the threaded OrderManagement.
+
+Both send --orders new orders to the same MockExchange over TCP, with no
+effective rate limit, and are timed from the first submit until every ack
+is persisted. The multi-process pipeline can only beat the threaded one
+when there are cores for its sequencer and persistence processes to run
+on, so the CPU count is printed with the results.
+"""
+
+import argparse
+import functools
+import shutil
+import tempfile
+import time
+from datetime import time as dtime
+from pathlib import Path
+
+import os, sys
+
+cwd = os.getcwd()
+if cwd.endswith("benchmarks"):
+    os.chdir("..")
+sys.path.append(os.getcwd())
+
+from scripts.order import OrderRequest
+from scripts.order_management import OrderManagement
+from scripts.multiprocess_pipeline import MultiProcessPipeline
+from scripts.mock_exchange import MockExchange
+from scripts.transport import SocketTransport
+from scripts.logger import log, WARNING
+
+RATE_LIMIT = 10**9
+
+def orders(count, symbols):
+    return [OrderRequest(order_id % symbols, 100.0 + order_id % 100, 10, 'B', order_id) for order_id in range(count)]
+
+def run_threaded(args, exchange, temp_dir):
+    order_management = OrderManagement(dtime(0, 0), dtime(23, 59, 59, 999999), RATE_LIMIT,
+                                       response_storage_path=Path(temp_dir) / "threaded.json",
+                                       max_in_flight=args.max_in_flight,
+                                       transport=SocketTransport(exchange.address))
+    batch = orders(args.orders, args.symbols)
+    start = time.perf_counter()
+    for first in range(0, len(batch), args.batch):
+        order_management.submit_many(batch[first:first + args.batch])
+    deadline = time.monotonic() + args.timeout
+    while len(order_management.response_handler.responses) < args.orders and time.monotonic() < deadline:
+        time.sleep(0.001)
+    order_management.response_handler.flush()
+    elapsed = time.perf_counter() - start
+    acked = len(order_management.response_handler.responses)
+    order_management.close()
+    return acked, elapsed
+
+def run_multiprocess(args, exchange, temp_dir):
+    pipeline = MultiProcessPipeline(RATE_LIMIT, response_storage_path=Path(temp_dir) / "multiprocess.json",
+                                    transport=functools.partial(SocketTransport, exchange.address),
+                                    max_in_flight=args.max_in_flight, drain_timeout=args.timeout)
+    batch = orders(args.orders, args.symbols)
+    time.sleep(1.0)  # Let the child processes finish importing before the clock starts
+    start = time.perf_counter()
+    for first in range(0, len(batch), args.batch):
+        pipeline.submit_many(batch[first:first + args.batch])
+    acked = pipeline.close()["responses"]
+    return acked, time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--orders", type=int, default=50000, help="new orders to send")
+    parser.add_argument("--symbols", type=int, default=100, help="symbols the orders are spread over")
+    parser.add_argument("--batch", type=int, default=1000, help="orders per submit_many call")
+    parser.add_argument("--max-in-flight", type=int, default=256, help="sends outstanding at once")
+    parser.add_argument("--exchange-latency-us", type=int, default=100, help="mock exchange ack latency")
+    parser.add_argument("--timeout", type=float, default=120.0, help="seconds to wait for the acks")
+    args = parser.parse_args()
+
+    log.set_level(WARNING)
+    temp_dir = tempfile.mkdtemp()
+    exchange = MockExchange(latency=f"fixed:{args.exchange_latency_us}").start()
+    try:
+        results = [("threaded OrderManagement", *run_threaded(args, exchange, temp_dir)),
+                   ("multi-process pipeline", *run_multiprocess(args, exchange, temp_dir))]
+    finally:
+        exchange.stop()
+        shutil.rmtree(temp_dir)
+
+    print(f"{args.orders} orders, {os.cpu_count()} CPUs")
+    print(f"{'':<26} {'acked':>8} {'seconds':>8} {'orders/s':>10}")
+    for label, acked, elapsed in results:
+        print(f"{label:<26} {acked:>8} {elapsed:>8.2f} {acked / elapsed:>10.0f}")
+
+if __name__ == "__main__":
+    main()
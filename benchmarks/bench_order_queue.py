@@ -0,0 +1,73 @@
+"""
+Microbenchmark for OrderQueue cancels against queues of increasing depth.
+
+Cancel cost should stay flat from 1k to 1M queued orders. The deque-backed
+queue the OMS used before is measured alongside for reference.
+"""
+
+import argparse
+import random
+import time
+from collections import deque
+
+import os, sys
+
+cwd = os.getcwd()
+if cwd.endswith("benchmarks"):
+    os.chdir("..")
+sys.path.append(os.getcwd())
+
+from scripts.order import OrderRequest, RequestType
+from scripts.order_queue import OrderQueue
+from scripts.logger import log, WARNING
+
+def build_queue(depth):
+    order_queue = OrderQueue()
+    for order_id in range(depth):
+        order = OrderRequest(1, 100.0, 10, 'B', order_id)
+        with order_queue.lock:
+            order_queue.queue.append(order)
+        order_queue.orders[order_id] = order
+    return order_queue
+
+def bench_cancel(depth, cancels):
+    order_queue = build_queue(depth)
+    victims = random.sample(range(depth), cancels)
+    requests = [OrderRequest(1, 0, 0, 'B', order_id, RequestType.Cancel) for order_id in victims]
+    start = time.perf_counter()
+    for request in requests:
+        order_queue.handle_request(request)
+    elapsed = time.perf_counter() - start
+    assert len(order_queue) == depth - cancels
+    return elapsed / cancels
+
+def bench_deque_cancel(depth, cancels):
+    orders = {order_id: OrderRequest(1, 100.0, 10, 'B', order_id) for order_id in range(depth)}
+    queue = deque(orders.values())
+    victims = random.sample(range(depth), cancels)
+    start = time.perf_counter()
+    for order_id in victims:
+        queue.remove(orders.pop(order_id))
+    return (time.perf_counter() - start) / cancels
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--depths", default="1000,10000,100000,1000000",
+                        help="comma separated queue depths")
+    parser.add_argument("--cancels", type=int, default=1000, help="cancels per depth")
+    parser.add_argument("--deque-max-depth", type=int, default=100000,
+                        help="largest depth to measure the deque baseline at")
+    args = parser.parse_args()
+
+    # Cancels log a line each, keep the report readable
+    log.set_level(WARNING)
+    print(f"{'depth':>10} {'OrderQueue ns/cancel':>22} {'deque ns/cancel':>18}")
+    for depth in (int(d) for d in args.depths.split(",")):
+        per_cancel = bench_cancel(depth, min(args.cancels, depth))
+        baseline = "-"
+        if depth <= args.deque_max_depth:
+            baseline = f"{bench_deque_cancel(depth, min(args.cancels, depth)) * 1e9:.0f}"
+        print(f"{depth:>10} {per_cancel * 1e9:>22.0f} {baseline:>18}")
+
+if __name__ == "__main__":
+    main()
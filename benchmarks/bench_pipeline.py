@@ -0,0 +1,322 @@
+"""
+End-to-end throughput and latency benchmark for the OMS pipeline.
+
+Drives OrderManagement with a synthetic New/Modify/Cancel mix at a
+configurable offered rate, acknowledges every sent order from a simulated
+exchange, and reports sustained orders/s, ingress-to-send and send-to-ack
+latency percentiles, CPU time and peak RSS. Results can be written as JSON
+and two result files can be compared to spot regressions across commits.
+
+    python benchmarks/bench_pipeline.py --orders 20000 --json results.json
+    python benchmarks/bench_pipeline.py --compare old.json new.json
+"""
+
+import argparse
+import json
+import random
+import resource
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from collections import deque
+from datetime import time as dtime
+from pathlib import Path
+
+import os, sys
+
+cwd = os.getcwd()
+if cwd.endswith("benchmarks"):
+    os.chdir("..")
+sys.path.append(os.getcwd())
+
+from scripts.order import OrderRequest, OrderResponse, RequestType, ResponseType
+from scripts.order_management import OrderManagement
+from scripts.latency_histogram import LatencyHistogram
+from scripts.ingress_executor import Admission
+from scripts.mock_exchange import MockExchange
+from scripts.transport import SocketTransport
+from scripts.logger import log, WARNING
+
+class SimulatedExchange:
+    """
+    Acknowledges sent orders after a fixed delay from a single thread,
+    feeding the responses back through OrderManagement.handle_order_response.
+    """
+    def __init__(self, order_management, latency_us, reject_ratio):
+        self.order_management = order_management
+        self.latency_ns = int(latency_us * 1000)
+        self.reject_ratio = reject_ratio
+        self.pending = deque()
+        self.outstanding = 0  # Sent orders whose response has not been handed to the OMS yet
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def on_send(self, order):
+        with self.lock:
+            self.outstanding += 1
+        self.pending.append((time.perf_counter_ns() + self.latency_ns, order.m_orderId))
+        self.wakeup.set()
+
+    def _run(self):
+        while self.running:
+            if not self.pending:
+                self.wakeup.wait(0.01)
+                self.wakeup.clear()
+                continue
+            due, order_id = self.pending[0]
+            delay = (due - time.perf_counter_ns()) / 1e9
+            if delay > 0:
+                time.sleep(delay)
+            self.pending.popleft()
+            response_type = ResponseType.Reject if random.random() < self.reject_ratio else ResponseType.Accept
+            self.order_management.handle_order_response(OrderResponse(order_id, response_type))
+            with self.lock:
+                self.outstanding -= 1
+
+    def stop(self):
+        self.running = False
+        self.wakeup.set()
+        self.thread.join()
+
+class LoopbackExchange:
+    """
+    MockExchange reached over a real loopback socket through SocketTransport,
+    so serialization and syscall costs are part of the measurement.
+    """
+    def __init__(self, order_management, latency_us, reject_ratio, address, pool_size):
+        self.order_management = order_management
+        self.exchange = MockExchange(address=address, latency=f"fixed:{latency_us}",
+                                     accept_ratio=1.0 - reject_ratio).start()
+        self.transport = SocketTransport(self.exchange.address, pool_size=pool_size)
+        self.outstanding = 0
+        self.lock = threading.Lock()
+        self.transport.start(self.on_response)
+
+    def on_send(self, order):
+        with self.lock:
+            self.outstanding += 1
+        self.transport.send(order)
+
+    def on_response(self, response):
+        self.order_management.handle_order_response(response)
+        with self.lock:
+            self.outstanding -= 1
+
+    def stop(self):
+        self.transport.close()
+        self.exchange.stop()
+
+def parse_mix(mix):
+    weights = [float(part) for part in mix.split(":")]
+    if len(weights) != 3:
+        raise argparse.ArgumentTypeError("mix must be new:modify:cancel, e.g. 80:15:5")
+    return weights
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run(args):
+    random.seed(args.seed)
+    temp_dir = tempfile.mkdtemp()
+    order_management = OrderManagement(
+        start_time=dtime(0, 0),
+        end_time=dtime(23, 59, 59, 999999),
+        order_rate_limit=args.order_rate_limit,
+        response_storage_path=Path(temp_dir) / "responses.json",
+        num_workers=args.workers,
+        ingress_queue_depth=args.queue_depth,
+        max_in_flight=args.max_in_flight
+    )
+    if args.exchange == "inprocess":
+        exchange = SimulatedExchange(order_management, args.exchange_latency_us, args.reject_ratio)
+    else:
+        address = ("127.0.0.1", 0) if args.exchange == "tcp" else str(Path(temp_dir) / "exchange.sock")
+        exchange = LoopbackExchange(order_management, args.exchange_latency_us, args.reject_ratio,
+                                    address, args.connections)
+    ingress_to_send = LatencyHistogram()
+    send_to_ack = LatencyHistogram()
+    sent_at = {}
+    stats = {"sent": 0, "acked": 0, "busy": 0, "first_send": None, "last_send": None}
+    stats_lock = threading.Lock()
+
+    def send(order):
+        now = time.perf_counter_ns()
+        with stats_lock:
+            ingress_to_send.record(now - order.timestamp_ns)
+            sent_at[order.m_orderId] = now
+            stats["sent"] += 1
+            if stats["first_send"] is None:
+                stats["first_send"] = now
+            stats["last_send"] = now
+        exchange.on_send(order)
+    order_management.order_processor.send = send
+
+    record_response = order_management.response_handler.record_response
+    def timed_record_response(response):
+        record = record_response(response)
+        if record is not None:
+            now = time.perf_counter_ns()
+            with stats_lock:
+                send_to_ack.record(now - sent_at.pop(response.m_orderId, now))
+                stats["acked"] += 1
+        return record
+    order_management.response_handler.record_response = timed_record_response
+
+    weights = parse_mix(args.mix)
+    live_ids = []
+    news = 0
+    interval = 1.0 / args.rate if args.rate else 0.0
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    next_due = wall_start
+    for message in range(args.orders):
+        kind = random.choices((RequestType.New, RequestType.Modify, RequestType.Cancel), weights)[0]
+        if kind == RequestType.New or not live_ids:
+            order_id = message
+            live_ids.append(order_id)
+            request = OrderRequest(random.randrange(args.symbols), 100.0 + random.random(), 10, 'B', order_id)
+            news += 1
+        else:
+            position = random.randrange(len(live_ids))
+            order_id = live_ids[position]
+            if kind == RequestType.Cancel:
+                live_ids[position] = live_ids[-1]
+                live_ids.pop()
+            request = OrderRequest(0, 100.0 + random.random(), 5, 'B', order_id, kind)
+        if order_management.handle_order_request(request) == Admission.Busy:
+            stats["busy"] += 1
+        if interval:
+            next_due += interval
+            delay = next_due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+    offered_elapsed = time.perf_counter() - wall_start
+
+    # Wait for the pipeline to drain: nothing queued, nothing in flight, every response handled.
+    # Acks for orders canceled after they were sent are dropped by the OMS, so acked can trail sent.
+    deadline = time.perf_counter() + args.drain_timeout
+    while time.perf_counter() < deadline:
+        order_management.ingress.join()
+        if (len(order_management.order_queue) == 0
+                and order_management.order_processor.in_flight == 0
+                and exchange.outstanding == 0):
+            order_management.ingress.join()  # Responses handed over last
+            break
+        time.sleep(0.01)
+    order_management.response_handler.flush()
+    wall_elapsed = time.perf_counter() - wall_start
+    cpu_elapsed = time.process_time() - cpu_start
+    coalescing = order_management.coalescing_stats()
+    exchange.stop()
+    order_management.close()
+    shutil.rmtree(temp_dir)
+
+    send_span = ((stats["last_send"] - stats["first_send"]) / 1e9
+                 if stats["sent"] > 1 else 0.0)
+    return {
+        "revision": git_revision(),
+        "timestamp": time.time(),
+        "params": vars(args),
+        "results": {
+            "messages": args.orders,
+            "news": news,
+            "busy_rejections": stats["busy"],
+            "sent": stats["sent"],
+            "acked": stats["acked"],
+            "offered_msgs_per_s": args.orders / offered_elapsed if offered_elapsed else 0.0,
+            "sustained_orders_per_s": stats["sent"] / send_span if send_span else 0.0,
+            "wall_s": wall_elapsed,
+            "cpu_s": cpu_elapsed,
+            "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+            "ingress_to_send_ns": ingress_to_send.summary(),
+            "send_to_ack_ns": send_to_ack.summary(),
+            "coalescing": coalescing,
+        },
+    }
+
+def print_report(report):
+    results = report["results"]
+    print(f"revision            {report['revision']}")
+    print(f"messages            {results['messages']} ({results['news']} new, "
+          f"{results['busy_rejections']} rejected busy)")
+    print(f"sent / acked        {results['sent']} / {results['acked']}")
+    if "coalescing" in results:
+        print(f"coalesced           {results['coalescing']['messages_saved']} messages saved "
+              f"({results['coalescing']['cancels_annihilated']} cancels before send)")
+    print(f"offered             {results['offered_msgs_per_s']:.0f} msgs/s")
+    print(f"sustained           {results['sustained_orders_per_s']:.0f} orders/s")
+    print(f"wall / cpu          {results['wall_s']:.2f} s / {results['cpu_s']:.2f} s")
+    print(f"peak RSS            {results['peak_rss_kb'] / 1024:.1f} MiB")
+    for name in ("ingress_to_send_ns", "send_to_ack_ns"):
+        summary = results[name]
+        print(f"{name[:-3]:<19} " + "  ".join(
+            f"{key} {summary[key] / 1000:.0f}us" for key in ("p50", "p90", "p99", "p99.9", "max")))
+
+def compare(old_path, new_path):
+    """Print the relative change of every numeric result between two runs"""
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+
+    def flatten(results, prefix=""):
+        for key, value in results.items():
+            if isinstance(value, dict):
+                yield from flatten(value, f"{prefix}{key}.")
+            elif isinstance(value, (int, float)):
+                yield f"{prefix}{key}", value
+
+    old_results = dict(flatten(old["results"]))
+    print(f"{'metric':<32} {old.get('revision') or 'old':>14} {new.get('revision') or 'new':>14} {'change':>9}")
+    for key, value in flatten(new["results"]):
+        before = old_results.get(key)
+        if before is None:
+            continue
+        change = f"{(value - before) / before:+.1%}" if before else "-"
+        print(f"{key:<32} {before:>14.6g} {value:>14.6g} {change:>9}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--orders", type=int, default=20000, help="messages to submit")
+    parser.add_argument("--rate", type=float, default=0, help="offered messages/s, 0 = as fast as possible")
+    parser.add_argument("--mix", default="80:15:5", help="new:modify:cancel weights")
+    parser.add_argument("--symbols", type=int, default=50, help="number of symbols")
+    parser.add_argument("--order-rate-limit", type=int, default=5000, help="OMS order rate limit")
+    parser.add_argument("--workers", type=int, default=4, help="ingress worker threads")
+    parser.add_argument("--queue-depth", type=int, default=100000, help="ingress queue depth per worker")
+    parser.add_argument("--max-in-flight", type=int, default=64, help="send window")
+    parser.add_argument("--exchange", choices=("inprocess", "tcp", "unix"), default="inprocess",
+                        help="simulated exchange thread, or the mock exchange over a loopback socket")
+    parser.add_argument("--connections", type=int, default=2, help="socket connections to the mock exchange")
+    parser.add_argument("--exchange-latency-us", type=float, default=200, help="simulated exchange round trip")
+    parser.add_argument("--reject-ratio", type=float, default=0.05, help="fraction of rejects")
+    parser.add_argument("--drain-timeout", type=float, default=60, help="seconds to wait for the pipeline to drain")
+    parser.add_argument("--seed", type=int, default=1, help="random seed")
+    parser.add_argument("--json", help="write machine-readable results to this file")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="compare two result files and exit")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    params = {key: value for key, value in vars(args).items() if key not in ("json", "compare")}
+    # The OMS logs a line per event, keep the report readable
+    log.set_level(WARNING)
+    report = run(argparse.Namespace(**params))
+    print_report(report)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=4)
+
+if __name__ == "__main__":
+    main()
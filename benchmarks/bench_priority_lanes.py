@@ -0,0 +1,76 @@
+"""
+Cancel latency against a growing backlog of new orders.
+
+Queues a backlog of new orders behind a rate-limited OrderProcessor, then
+cancels an order that was already sent and measures how long the cancel
+takes to reach the transport. With priority lanes it goes out on the next
+token whatever the backlog; in a single FIFO it would wait backlog / rate.
+"""
+
+import argparse
+import threading
+import time
+
+import os, sys
+
+cwd = os.getcwd()
+if cwd.endswith("benchmarks"):
+    os.chdir("..")
+sys.path.append(os.getcwd())
+
+from scripts.order import OrderRequest, RequestType
+from scripts.sharded_order_queue import ShardedOrderQueue
+from scripts.order_processor import OrderProcessor
+from scripts.logger import log, WARNING
+
+def bench_cancel(depth, rate, symbols, cancels):
+    order_queue = ShardedOrderQueue()
+    processor = OrderProcessor(rate, order_queue)
+    sent_at = {}
+    cancel_sent = threading.Event()
+
+    def send(order):
+        if order.request_type == RequestType.Cancel:
+            sent_at[order.m_orderId] = time.perf_counter()
+            cancel_sent.set()
+    processor.send = send
+
+    # Orders that are already at the exchange, then the backlog behind them
+    for order_id in range(cancels):
+        order_queue.add_order(OrderRequest(order_id % symbols, 100.0, 10, 'B', order_id))
+        order_queue.pop()
+    for order_id in range(cancels, cancels + depth):
+        order_queue.add_order(OrderRequest(order_id % symbols, 100.0, 10, 'B', order_id))
+
+    thread = threading.Thread(target=processor.process_queue, daemon=True)
+    thread.start()
+    latencies = []
+    for order_id in range(cancels):
+        time.sleep(0.01)  # Let the backlog keep draining at the rate limit
+        cancel_sent.clear()
+        submitted = time.perf_counter()
+        order_queue.handle_request(OrderRequest(order_id % symbols, 0, 0, 'B', order_id, RequestType.Cancel))
+        cancel_sent.wait(5.0)
+        latencies.append(sent_at[order_id] - submitted)
+    processor.close()
+    thread.join()
+    latencies.sort()
+    return latencies[len(latencies) // 2], latencies[-1]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--depths", default="1000,10000,100000", help="comma separated new order backlogs")
+    parser.add_argument("--rate", type=int, default=2000, help="session orders per second")
+    parser.add_argument("--symbols", type=int, default=10, help="symbols the orders are spread over")
+    parser.add_argument("--cancels", type=int, default=20, help="cancels measured per depth")
+    args = parser.parse_args()
+
+    # Queue operations log a line each, keep the report readable
+    log.set_level(WARNING)
+    print(f"{'backlog':>10} {'p50 cancel ms':>14} {'max cancel ms':>14} {'FIFO wait ms':>14}")
+    for depth in (int(d) for d in args.depths.split(",")):
+        p50, worst = bench_cancel(depth, args.rate, args.symbols, args.cancels)
+        print(f"{depth:>10} {p50 * 1e3:>14.2f} {worst * 1e3:>14.2f} {depth / args.rate * 1e3:>14.0f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Crash recovery time of the request log with a large number of pending orders.
+
+Logs --orders new orders, then measures reopening the log three ways: by
+replaying the whole journal, from a snapshot alone, and from a snapshot
+plus a journal tail of --tail requests written after it. The last case is
+what a restart looks like, its tail is bounded by the snapshot interval.
+Also reports the time to put the recovered orders back in a ShardedOrderQueue.
+"""
+
+import argparse
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+import os, sys
+
+cwd = os.getcwd()
+if cwd.endswith("benchmarks"):
+    os.chdir("..")
+sys.path.append(os.getcwd())
+
+from scripts.order import OrderRequest, RequestType
+from scripts.order_queue import RequestOutcome
+from scripts.request_log import RequestLog
+from scripts.sharded_order_queue import ShardedOrderQueue
+from scripts.logger import log, WARNING
+
+def log_orders(request_log, first_id, count, symbols, batch=10000):
+    for start in range(first_id, first_id + count, batch):
+        requests = [OrderRequest(order_id % symbols, 100.0 + order_id % 100, 10, 'B', order_id)
+                    for order_id in range(start, min(start + batch, first_id + count))]
+        request_log.applied([RequestOutcome.Added] * len(requests), requests)
+
+def log_tail(request_log, count, orders, symbols):
+    """A mix of modifies, cancels and sends of existing orders"""
+    for i in range(count):
+        order_id = i * 7 % orders
+        if i % 3 == 0:
+            request = OrderRequest(order_id % symbols, 101.0, 5, 'B', order_id, RequestType.Modify)
+            request_log.applied((RequestOutcome.Modified,), (request,))
+        elif i % 3 == 1:
+            request_log.sent(OrderRequest(order_id % symbols, 100.0, 10, 'B', order_id))
+        else:
+            request = OrderRequest(order_id % symbols, 0, 0, 'B', order_id, RequestType.Cancel)
+            request_log.applied((RequestOutcome.Canceled,), (request,))
+
+def timed_open(path):
+    start = time.perf_counter()
+    request_log = RequestLog(path, snapshot_interval=None)
+    elapsed = time.perf_counter() - start
+    return request_log, elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--orders", type=int, default=1000000, help="pending orders in the log")
+    parser.add_argument("--tail", type=int, default=10000, help="requests logged after the snapshot")
+    parser.add_argument("--symbols", type=int, default=100, help="symbols the orders are spread over")
+    args = parser.parse_args()
+
+    log.set_level(WARNING)
+    temp_dir = tempfile.mkdtemp()
+    try:
+        path = Path(temp_dir) / "requests.wal"
+        request_log = RequestLog(path, snapshot_interval=None)
+        start = time.perf_counter()
+        log_orders(request_log, 0, args.orders, args.symbols)
+        print(f"logged {args.orders} orders in {time.perf_counter() - start:.2f}s")
+        request_log.close(snapshot=False)
+
+        request_log, full_replay = timed_open(path)
+        start = time.perf_counter()
+        request_log.snapshot()
+        snapshot_time = time.perf_counter() - start
+        snapshot_size = request_log.snapshot_path.stat().st_size
+        request_log.close(snapshot=False)
+
+        request_log, from_snapshot = timed_open(path)
+        log_tail(request_log, args.tail, args.orders, args.symbols)
+        request_log.close(snapshot=False)
+
+        request_log, with_tail = timed_open(path)
+        pending = len(request_log)
+        start = time.perf_counter()
+        ShardedOrderQueue().restore(request_log.pending())
+        restore_time = time.perf_counter() - start
+        request_log.close(snapshot=False)
+    finally:
+        shutil.rmtree(temp_dir)
+
+    print(f"{'recovery':<34} {'seconds':>8}")
+    print(f"{'full journal replay':<34} {full_replay:>8.2f}")
+    print(f"{'snapshot only':<34} {from_snapshot:>8.2f}")
+    print(f"{f'snapshot + {args.tail} request tail':<34} {with_tail:>8.2f}")
+    print(f"{'restore into ShardedOrderQueue':<34} {restore_time:>8.2f}")
+    print(f"snapshot written in {snapshot_time:.2f}s, {snapshot_size / 1e6:.1f} MB, {pending} orders pending after the tail")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Open, point lookup and time-range scan of the memory-mapped ResponseStore
+against the response journal, which has to be replayed to answer either.
+
+Appends --acks acks to both, then reports the time to open each, the mean
+latency of a lookup by order ID and the time to scan one second of acks.
+"""
+
+import argparse
+import random
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+import os, sys
+
+cwd = os.getcwd()
+if cwd.endswith("benchmarks"):
+    os.chdir("..")
+sys.path.append(os.getcwd())
+
+from scripts.journal import Journal
+from scripts.order import ResponseType
+from scripts.response_store import ResponseStore
+
+START_NS = 1_700_000_000 * 10**9
+
+def acks(count, rate, batch=10000):
+    """Batches of (order ID, symbol ID, type, latency, timestamp) at rate acks per second"""
+    step = 10**9 // rate
+    for start in range(0, count, batch):
+        yield [(order_id, order_id % 100, ResponseType.Accept if order_id % 20 else ResponseType.Reject,
+                100000 + order_id % 5000, START_NS + order_id * step)
+               for order_id in range(start, min(start + batch, count))]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--acks", type=int, default=1000000, help="acks in the store")
+    parser.add_argument("--rate", type=int, default=10000, help="acks per second of timestamps")
+    parser.add_argument("--lookups", type=int, default=10000, help="point lookups to time")
+    args = parser.parse_args()
+
+    temp_dir = tempfile.mkdtemp()
+    try:
+        store_path = Path(temp_dir) / "acks.bin"
+        journal_path = Path(temp_dir) / "responses.json"
+        store = ResponseStore(store_path)
+        journal = Journal(journal_path)
+        start = time.perf_counter()
+        for batch in acks(args.acks, args.rate):
+            store.append_many(batch)
+        store_write = time.perf_counter() - start
+        start = time.perf_counter()
+        for batch in acks(args.acks, args.rate):
+            journal.append_many([{"order_id": order_id, "symbol_id": symbol_id, "response_type": response_type.name,
+                                  "latency": latency_ns / 1e9, "timestamp": timestamp_ns / 1e9}
+                                 for order_id, symbol_id, response_type, latency_ns, timestamp_ns in batch])
+        journal_write = time.perf_counter() - start
+        store.close()
+        journal.close()
+
+        start = time.perf_counter()
+        store = ResponseStore(store_path)
+        store_open = time.perf_counter() - start
+        order_ids = [random.randrange(args.acks) for _ in range(args.lookups)]
+        start = time.perf_counter()
+        for order_id in order_ids:
+            store.lookup(order_id)
+        store_lookup = (time.perf_counter() - start) / args.lookups
+        middle = START_NS + args.acks // 2 * (10**9 // args.rate)
+        start = time.perf_counter()
+        scanned = len(store.scan(middle, middle + 10**9))
+        store_scan = time.perf_counter() - start
+        runs = len(store.runs)
+        store.close()
+
+        # The journal answers nothing without a replay, which is both its open and its lookup
+        start = time.perf_counter()
+        journal = Journal(journal_path)
+        by_order = {}
+        for record in journal.replay():
+            by_order.setdefault(record["order_id"], []).append(record)
+        journal_replay = time.perf_counter() - start
+        journal.close()
+    finally:
+        shutil.rmtree(temp_dir)
+
+    print(f"{args.acks} acks, {runs} index runs, {scanned} acks in the scanned second")
+    print(f"{'':<28} {'store':>10} {'journal':>10}")
+    print(f"{'append (s)':<28} {store_write:>10.2f} {journal_write:>10.2f}")
+    print(f"{'open (s)':<28} {store_open:>10.4f} {journal_replay:>10.2f}")
+    print(f"{'point lookup (us)':<28} {store_lookup * 1e6:>10.1f} {'replay':>10}")
+    print(f"{'1 s time range scan (ms)':<28} {store_scan * 1e3:>10.2f} {'replay':>10}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Memory held by ResponseHandler.responses as acks accumulate, with and
+without a retention window.
+
+Handles --acks acks in batches through a ResponseHandler and reports the
+traced memory of its response records after every quarter of them: without
+a limit it grows with the number of acks, with --max-responses it levels
+off at the window plus the per-minute rollups.
+"""
+
+import argparse
+import shutil
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+import os, sys
+
+cwd = os.getcwd()
+if cwd.endswith("benchmarks"):
+    os.chdir("..")
+sys.path.append(os.getcwd())
+
+from scripts.order import OrderRequest, OrderResponse, ResponseType
+from scripts.order_queue import OrderQueue
+from scripts.response_handler import ResponseHandler
+from scripts.logger import log, WARNING
+
+def run(acks, max_responses, symbols, batch=1000):
+    """Traced MB of the response window after each quarter of the acks"""
+    temp_dir = tempfile.mkdtemp()
+    try:
+        order_queue = OrderQueue()
+        handler = ResponseHandler(order_queue, storage_path=Path(temp_dir) / "responses.json",
+                                  max_responses=max_responses)
+        readings = []
+        tracemalloc.start()
+        base = tracemalloc.get_traced_memory()[0]
+        for start in range(0, acks, batch):
+            order_ids = range(start, min(start + batch, acks))
+            for order_id in order_ids:
+                order_queue.orders[order_id] = OrderRequest(order_id % symbols, 100.0, 10, 'B', order_id)
+            handler.handle_responses([OrderResponse(order_id, ResponseType.Accept if order_id % 10 else ResponseType.Reject)
+                                      for order_id in order_ids])
+            if (start + batch) % (acks // 4) == 0:
+                readings.append((tracemalloc.get_traced_memory()[0] - base) / 1e6)
+        tracemalloc.stop()
+        rollups = len(handler.responses.rollups)
+        handler.close()
+        return readings, rollups
+    finally:
+        shutil.rmtree(temp_dir)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--acks", type=int, default=200000, help="acks to handle, a multiple of 4000")
+    parser.add_argument("--max-responses", type=int, default=10000, help="window size for the bounded run")
+    parser.add_argument("--symbols", type=int, default=100, help="symbols the orders are spread over")
+    args = parser.parse_args()
+
+    log.set_level(WARNING)
+    quarters = " ".join(f"{f'{args.acks * i // 4} acks':>12}" for i in range(1, 5))
+    print(f"{'traced MB':<24} {quarters}")
+    for label, max_responses in (("unbounded", None), (f"last {args.max_responses}", args.max_responses)):
+        start = time.perf_counter()
+        readings, rollups = run(args.acks, max_responses, args.symbols)
+        elapsed = time.perf_counter() - start
+        print(f"{label:<24} " + " ".join(f"{reading:>12.1f}" for reading in readings)
+              + f"   ({elapsed:.1f}s, {rollups} rollups)")
+
+if __name__ == "__main__":
+    main()
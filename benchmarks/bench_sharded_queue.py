@@ -0,0 +1,79 @@
+"""
+Ingress contention benchmark: OrderQueue versus ShardedOrderQueue.
+
+N producer threads add orders for disjoint sets of symbols while a single
+consumer drains the queue. Reports sustained adds/s per producer count.
+"""
+
+import argparse
+import threading
+import time
+
+import os, sys
+
+cwd = os.getcwd()
+if cwd.endswith("benchmarks"):
+    os.chdir("..")
+sys.path.append(os.getcwd())
+
+from scripts.order import OrderRequest
+from scripts.order_queue import OrderQueue
+from scripts.sharded_order_queue import ShardedOrderQueue
+from scripts.logger import log, WARNING
+
+def run(queue_factory, producers, orders_per_producer, symbols_per_producer):
+    order_queue = queue_factory()
+    batches = [
+        [
+            OrderRequest(p * symbols_per_producer + i % symbols_per_producer, 100.0, 10, 'B',
+                         p * orders_per_producer + i)
+            for i in range(orders_per_producer)
+        ]
+        for p in range(producers)
+    ]
+    total = producers * orders_per_producer
+    start_barrier = threading.Barrier(producers + 1)
+    popped = [0]
+
+    def produce(batch):
+        start_barrier.wait()
+        for order in batch:
+            order_queue.handle_request(order)
+
+    def consume():
+        while popped[0] < total:
+            if order_queue.pop() is None:
+                order_queue.ready.wait(0.001)
+                order_queue.ready.clear()
+            else:
+                popped[0] += 1
+
+    threads = [threading.Thread(target=produce, args=(batch,)) for batch in batches]
+    consumer = threading.Thread(target=consume)
+    for thread in threads:
+        thread.start()
+    consumer.start()
+    start_barrier.wait()
+    start = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    consumer.join()
+    return total / (time.perf_counter() - start)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--producers", default="1,2,4,8,16,32", help="comma separated producer counts")
+    parser.add_argument("--orders", type=int, default=20000, help="orders per producer")
+    parser.add_argument("--symbols", type=int, default=4, help="symbols per producer")
+    args = parser.parse_args()
+
+    # The queues log a line per order, keep the report readable
+    log.set_level(WARNING)
+    print(f"{'producers':>9} {'OrderQueue orders/s':>20} {'Sharded orders/s':>18}")
+    for producers in (int(p) for p in args.producers.split(",")):
+        single = run(OrderQueue, producers, args.orders, args.symbols)
+        sharded = run(ShardedOrderQueue, producers, args.orders, args.symbols)
+        print(f"{producers:>9} {single:>20.0f} {sharded:>18.0f}")
+
+if __name__ == "__main__":
+    main()
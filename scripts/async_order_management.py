@@ -0,0 +1,244 @@
+import asyncio
+import time
+
+import os, sys
+
+cwd = os.getcwd()
+if cwd.endswith("scripts"):
+    os.chdir("..")
+sys.path.append(os.getcwd())
+
+from scripts.order_queue import OrderQueue
+from scripts.response_handler import ResponseHandler
+from scripts.response_writer import Durability, write_batch
+from scripts.trading_schedule import TradingSchedule, SessionScheduler
+from scripts.logger import log
+
+_send_log = log.sampled("sends")
+
+class AsyncTokenBucket:
+    """
+    Token bucket for coroutines. acquire() sleeps exactly until the next
+    token is due instead of polling.
+    """
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = rate if capacity is None else capacity
+        self.tokens = self.capacity  # Start with full bucket
+        self.last_token_time = time.monotonic()
+
+    def refill(self):
+        """Refill tokens based on elapsed time"""
+        now = time.monotonic()
+        self.tokens = min(self.tokens + (now - self.last_token_time) * self.rate, self.capacity)
+        self.last_token_time = now
+
+    async def acquire(self):
+        """Wait for and take one token"""
+        while True:
+            self.refill()
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def refund(self):
+        """Give back a token that ended up unused"""
+        self.tokens = min(self.tokens + 1, self.capacity)
+
+class AsyncResponseWriter:
+    """
+    Asyncio counterpart of ResponseWriter. Records go through a bounded
+    asyncio.Queue and are appended to the journal in batches on the
+    loop's default executor, so the event loop never blocks on disk I/O.
+    """
+    def __init__(self, journal, durability=Durability.Flush, max_pending=10000, batch_size=512, flush_interval=0.005):
+        self.journal = journal
+        self.durability = durability
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue = asyncio.Queue(maxsize=max_pending)
+        self.task = asyncio.get_running_loop().create_task(self._run())
+
+    async def submit(self, record):
+        """Queue a record, waiting for room when the queue is full (backpressure)"""
+        await self.queue.put(record)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - loop.time()
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), remaining) if remaining > 0
+                                 else self.queue.get_nowait())
+                except (asyncio.TimeoutError, asyncio.QueueEmpty):
+                    break
+            try:
+                await loop.run_in_executor(None, write_batch, self.journal, batch, self.durability)
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+    async def flush(self):
+        """Wait until every submitted record has been written"""
+        await self.queue.join()
+
+    async def close(self):
+        """Drain the queue, stop the writer task and close the journal"""
+        await self.flush()
+        self.task.cancel()
+        try:
+            await self.task
+        except asyncio.CancelledError:
+            pass
+        self.journal.close()
+
+class AsyncOrderManagement:
+    """
+    Asyncio-native order management engine.
+
+    Runs on a single event loop: requests and responses are coroutine calls,
+    sending is paced by an async token bucket and responses are persisted by
+    an async writer. Queue bookkeeping is the same OrderQueue used by the
+    threaded OrderManagement, so Modify/Cancel semantics are identical.
+    """
+    def __init__(self, start_time, end_time, order_rate_limit, response_storage_path="responses.json",
+                 durability=Durability.Flush, max_in_flight=10000):
+        """
+        Args:
+            start_time (time): Trading start time
+            end_time (time): Trading end time, before start_time for a session crossing midnight
+            order_rate_limit (int): Maximum orders per second
+            response_storage_path (str): Path to store response data
+            durability (Durability): Durability of the response writer
+            max_in_flight (int): Maximum concurrent sends
+        """
+        self.start_time = start_time
+        self.end_time = end_time
+        self.order_rate_limit = order_rate_limit
+        self.response_storage_path = response_storage_path
+        self.durability = durability
+        self.max_in_flight = max_in_flight
+        self.order_queue = OrderQueue()
+        self.is_logged_on = False
+        self.running = False
+
+    async def start(self):
+        """Start the processing and persistence tasks on the running loop"""
+        self.response_handler = ResponseHandler(self.order_queue, storage_path=self.response_storage_path)
+        self.writer = AsyncResponseWriter(self.response_handler.journal, durability=self.durability)
+        self.token_bucket = AsyncTokenBucket(self.order_rate_limit)
+        self.ready = asyncio.Event()
+        self.window = asyncio.Semaphore(self.max_in_flight)
+        self.in_flight = set()
+        self.running = True
+        # Flips the trading window and logs on and off at its boundaries from its own thread
+        loop = asyncio.get_running_loop()
+        self.session = SessionScheduler(
+            TradingSchedule([(self.start_time, self.end_time)]),
+            on_open=lambda: asyncio.run_coroutine_threadsafe(self.logon(), loop),
+            on_close=lambda: asyncio.run_coroutine_threadsafe(self.logout(), loop)
+        ).start()
+        self.processing_task = asyncio.get_running_loop().create_task(self.process_queue())
+        return self
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    def is_within_time_window(self):
+        """
+        Checks if the current time is within the trading window, a single
+        attribute read kept up to date by the session scheduler
+        """
+        return self.session.open
+
+    async def logon(self):
+        if not self.is_logged_on and self.is_within_time_window():
+            self.is_logged_on = True
+            log.info("Logon message sent to exchange")
+
+    async def logout(self):
+        if self.is_logged_on and not self.is_within_time_window():
+            self.is_logged_on = False
+            log.info("Logout message sent to exchange")
+
+    async def submit(self, order_request):
+        """
+        Handles an order request
+
+        Returns:
+            bool: True if the request was applied to the queue, False if it
+                was rejected outside the trading window
+        """
+        if not self.session.open:
+            log.warning("Order %d rejected: Outside time window", order_request.m_orderId)
+            return False
+        self.order_queue.handle_request(order_request)
+        self.ready.set()
+        return True
+
+    async def on_response(self, response):
+        """
+        Handles an order response and queues it for persistence
+        """
+        record = self.response_handler.record_response(response)
+        if record is not None:
+            await self.writer.submit(record)
+
+    async def process_queue(self):
+        """Send queued orders at the rate limit, keeping up to max_in_flight sends outstanding"""
+        while self.running:
+            if len(self.order_queue) == 0:
+                self.ready.clear()
+                await self.ready.wait()
+                continue
+            await self.token_bucket.acquire()
+            await self.window.acquire()
+            # Pop only once the token and window slot are held so a cancel can still reach the order
+            order = self.order_queue.pop()
+            if order is None:
+                self.token_bucket.refund()
+                self.window.release()
+                continue
+            task = asyncio.get_running_loop().create_task(self._send(order))
+            self.in_flight.add(task)
+            task.add_done_callback(self.in_flight.discard)
+
+    async def _send(self, order):
+        try:
+            await self.send(order)
+        except Exception as e:
+            log.error("Error sending order %d: %s", order.m_orderId, e)
+        finally:
+            self.window.release()
+
+    async def send(self, order):
+        """Simulate sending order to exchange"""
+        _send_log.info("Sending order %d to exchange", order.m_orderId)
+        # Simulate network delay
+        await asyncio.sleep(0.05)
+
+    async def flush(self):
+        """Wait until every handled response is persisted"""
+        await self.writer.flush()
+
+    async def close(self):
+        """
+        Stops order processing, waits for outstanding sends and persists every handled response
+        """
+        self.running = False
+        self.session.stop()
+        self.processing_task.cancel()
+        try:
+            await self.processing_task
+        except asyncio.CancelledError:
+            pass
+        if self.in_flight:
+            await asyncio.gather(*self.in_flight, return_exceptions=True)
+        await self.writer.close()
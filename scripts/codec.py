@@ -0,0 +1,162 @@
+import struct
+
+import os, sys
+
+cwd = os.getcwd()
+if cwd.endswith("scripts"):
+    os.chdir("..")
+sys.path.append(os.getcwd())
+
+from scripts.order import (OrderRequest, OrderResponse, SIDES, SIDE_CODES, REQUEST_TYPES,
+                           RESPONSE_TYPES, PRICE_SCALE)
+
+# Fixed little-endian layouts. The first byte of every message is its kind.
+#   request:  kind, request type, side, pad, symbol id (i32), order id, price (scaled), qty (i64)
+#   response: kind, response type, pad[6], order id (i64)
+REQUEST_KIND = 1
+RESPONSE_KIND = 2
+REQUEST = struct.Struct('<BBBxiqqq')
+RESPONSE = struct.Struct('<BB6xq')
+REQUEST_SIZE = REQUEST.size
+RESPONSE_SIZE = RESPONSE.size
+
+def encode_request(order):
+    """Encode one order request to bytes"""
+    return REQUEST.pack(REQUEST_KIND, order.request_type.value, SIDE_CODES[order.m_side], order.m_symbolId,
+                        order.m_orderId, round(order.m_price * PRICE_SCALE), order.m_qty)
+
+def encode_request_into(buffer, offset, order):
+    """
+    Encode one order request into a preallocated buffer
+
+    returns:
+        int: offset just past the encoded message
+    """
+    REQUEST.pack_into(buffer, offset, REQUEST_KIND, order.request_type.value, SIDE_CODES[order.m_side],
+                      order.m_symbolId, order.m_orderId, round(order.m_price * PRICE_SCALE), order.m_qty)
+    return offset + REQUEST_SIZE
+
+def decode_request(view, offset=0):
+    """Decode the order request at offset of a buffer or memoryview without copying it"""
+    kind, request_type, side, symbol_id, order_id, price, qty = REQUEST.unpack_from(view, offset)
+    if kind != REQUEST_KIND:
+        raise ValueError(f"Expected an order request, got message kind {kind}")
+    return OrderRequest(symbol_id, price / PRICE_SCALE, qty, SIDES[side], order_id, REQUEST_TYPES[request_type])
+
+def encode_response(response):
+    """Encode one order response to bytes"""
+    return RESPONSE.pack(RESPONSE_KIND, response.m_responseType.value, response.m_orderId)
+
+def encode_response_into(buffer, offset, response):
+    """
+    Encode one order response into a preallocated buffer
+
+    returns:
+        int: offset just past the encoded message
+    """
+    RESPONSE.pack_into(buffer, offset, RESPONSE_KIND, response.m_responseType.value, response.m_orderId)
+    return offset + RESPONSE_SIZE
+
+def decode_response(view, offset=0):
+    """Decode the order response at offset of a buffer or memoryview without copying it"""
+    kind, response_type, order_id = RESPONSE.unpack_from(view, offset)
+    if kind != RESPONSE_KIND:
+        raise ValueError(f"Expected an order response, got message kind {kind}")
+    return OrderResponse(order_id, RESPONSE_TYPES[response_type])
+
+def encode_requests(orders, buffer=None):
+    """
+    Encode many order requests back to back
+
+    params:
+        orders: sequence of OrderRequest
+        buffer: preallocated bytearray to encode into, allocated when None
+
+    returns:
+        memoryview: the encoded bytes (a view on the buffer)
+    """
+    size = len(orders) * REQUEST_SIZE
+    if buffer is None:
+        buffer = bytearray(size)
+    elif len(buffer) < size:
+        raise ValueError(f"Buffer of {len(buffer)} bytes cannot hold {len(orders)} requests")
+    offset = 0
+    for order in orders:
+        offset = encode_request_into(buffer, offset, order)
+    return memoryview(buffer)[:size]
+
+def encode_responses(responses, buffer=None):
+    """
+    Encode many order responses back to back, see encode_requests
+
+    returns:
+        memoryview: the encoded bytes (a view on the buffer)
+    """
+    size = len(responses) * RESPONSE_SIZE
+    if buffer is None:
+        buffer = bytearray(size)
+    elif len(buffer) < size:
+        raise ValueError(f"Buffer of {len(buffer)} bytes cannot hold {len(responses)} responses")
+    offset = 0
+    for response in responses:
+        offset = encode_response_into(buffer, offset, response)
+    return memoryview(buffer)[:size]
+
+def _check_kinds(view, size, kind, name):
+    """Raise ValueError unless every size-byte message in view starts with kind"""
+    kinds = bytes(memoryview(view)[::size])
+    wrong = kinds.strip(bytes((kind,)))
+    if wrong:
+        raise ValueError(f"Expected {name}, got message kind {wrong[0]}")
+
+def decode_requests(view):
+    """Decode a buffer holding a whole number of order requests"""
+    _check_kinds(view, REQUEST_SIZE, REQUEST_KIND, "order requests")
+    return [
+        OrderRequest(symbol_id, price / PRICE_SCALE, qty, SIDES[side], order_id, REQUEST_TYPES[request_type])
+        for kind, request_type, side, symbol_id, order_id, price, qty in REQUEST.iter_unpack(view)
+    ]
+
+def decode_responses(view):
+    """Decode a buffer holding a whole number of order responses"""
+    _check_kinds(view, RESPONSE_SIZE, RESPONSE_KIND, "order responses")
+    return [
+        OrderResponse(order_id, RESPONSE_TYPES[response_type])
+        for kind, response_type, order_id in RESPONSE.iter_unpack(view)
+    ]
+
+class FrameReader:
+    """
+    Reassembles fixed-size messages from a stream socket. Bytes are received
+    straight into a preallocated buffer and complete frames are handed out as
+    a memoryview slice of it; a partial frame is carried over to the next read.
+    """
+    def __init__(self, sock, frame_size, capacity=64 * 1024):
+        self.sock = sock
+        self.frame_size = frame_size
+        self.buffer = bytearray(max(capacity - capacity % frame_size, frame_size))
+        self.view = memoryview(self.buffer)
+        self.filled = 0
+        self.consumed = 0
+
+    def read(self):
+        """
+        Block for more data
+
+        returns:
+            memoryview | None: complete frames (possibly empty), None once the peer closed.
+                Only valid until the next call.
+        """
+        if self.consumed:
+            # Carry the partial frame over to the front of the buffer
+            remainder = self.filled - self.consumed
+            if remainder:
+                self.buffer[:remainder] = self.buffer[self.consumed:self.filled]
+            self.filled = remainder
+            self.consumed = 0
+        received = self.sock.recv_into(self.view[self.filled:])
+        if received == 0:
+            return None
+        self.filled += received
+        self.consumed = self.filled - self.filled % self.frame_size
+        return self.view[:self.consumed]
@@ -0,0 +1,98 @@
+import queue
+import threading
+from enum import Enum
+
+from scripts.logger import log
+
+class Admission(Enum):
+    Accepted = 1
+    Busy = 2
+
+_STOP = object()
+
+class IngressExecutor:
+    """
+    Fixed pool of worker threads fed by bounded per-worker queues.
+
+    Every task is submitted with a key and tasks sharing a key always land on
+    the same worker, so they run in submission order (a Modify can never
+    overtake the New for the same order ID).
+    """
+    def __init__(self, num_workers=4, queue_depth=1024):
+        """
+        Args:
+            num_workers (int): Number of worker threads
+            queue_depth (int): Maximum pending tasks per worker
+        """
+        self.queues = [queue.Queue(maxsize=queue_depth) for _ in range(num_workers)]
+        self.stopped = False
+        self.workers = [
+            threading.Thread(target=self._run, args=(task_queue,), daemon=True)
+            for task_queue in self.queues
+        ]
+        for worker in self.workers:
+            worker.start()
+
+    def submit(self, key, fn, *args, block=False):
+        """
+        Queue fn(*args) on the worker owning key
+
+        params:
+            key: hashable routing key, e.g. an order ID
+            fn: callable to run
+            block: wait for room instead of rejecting when the worker is saturated
+
+        returns:
+            Admission: Accepted, or Busy if the worker queue is full or the
+                executor was shut down
+        """
+        if self.stopped:
+            return Admission.Busy
+        task_queue = self.queues[hash(key) % len(self.queues)]
+        try:
+            task_queue.put((fn, args), block=block)
+        except queue.Full:
+            return Admission.Busy
+        return Admission.Accepted
+
+    def _run(self, task_queue):
+        while True:
+            task = task_queue.get()
+            if task is _STOP:
+                task_queue.task_done()
+                return
+            try:
+                _call(task)
+            finally:
+                task_queue.task_done()
+
+    def join(self):
+        """Block until every submitted task has run"""
+        for task_queue in self.queues:
+            task_queue.join()
+
+    def shutdown(self):
+        """Run the remaining tasks and stop the workers, later submits are refused"""
+        if self.stopped:
+            return
+        self.stopped = True
+        for task_queue in self.queues:
+            task_queue.put(_STOP)
+        for worker in self.workers:
+            worker.join()
+        # A submit that saw the executor running may have queued behind _STOP
+        for task_queue in self.queues:
+            while True:
+                try:
+                    task = task_queue.get_nowait()
+                except queue.Empty:
+                    break
+                _call(task)
+                task_queue.task_done()
+
+def _call(task):
+    fn, args = task
+    try:
+        fn(*args)
+    except Exception as e:
+        log.error("Error handling message: %s", e)
@@ -0,0 +1,220 @@
+import os
+import json
+import time
+import threading
+from pathlib import Path
+
+class Journal:
+    """
+    Segmented append-only journal of JSON records, one record per line.
+
+    The active segment lives at `path`. When it grows past `segment_size`
+    bytes it is sealed by renaming it to `<path>.<n>` (n = 000001, 000002, ...)
+    and a fresh active segment is started, so appends never rewrite old data.
+    """
+    def __init__(self, path, segment_size=64 * 1024 * 1024, fsync_interval=None):
+        """
+        Open (or create) the journal
+
+        Args:
+            path (str | Path): Path of the active segment
+            segment_size (int): Rotate the active segment once it exceeds this many bytes
+            fsync_interval (float | None): Group-commit window in seconds. Appends are
+                flushed to the OS immediately, but fsync is issued at most once per
+                window. None never fsyncs, 0 fsyncs on every append.
+        """
+        self.path = Path(path)
+        self.segment_size = segment_size
+        self.fsync_interval = fsync_interval
+        self.lock = threading.Lock()
+        self.last_fsync = time.monotonic()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        migrate_legacy_json(self.path)
+        self._repair_tail()
+        self.file = open(self.path, 'ab')
+        self.size = self.file.tell()
+        sealed = self.sealed_segments()
+        self.next_index = self.segment_index(sealed[-1]) + 1 if sealed else 1
+
+    def _repair_tail(self):
+        """Drop a partially written last record left behind by a crash"""
+        if not self.path.exists():
+            return
+        with open(self.path, 'rb+') as f:
+            f.seek(0, os.SEEK_END)
+            end = f.tell()
+            if end == 0:
+                return
+            f.seek(end - 1)
+            if f.read(1) == b'\n':
+                return
+            # Scan backwards for the last complete line
+            pos = end
+            while pos > 0:
+                step = min(4096, pos)
+                pos -= step
+                f.seek(pos)
+                chunk = f.read(step)
+                idx = chunk.rfind(b'\n')
+                if idx != -1:
+                    f.truncate(pos + idx + 1)
+                    return
+            f.truncate(0)
+
+    def sealed_segments(self):
+        """Returns the sealed segment paths, oldest first"""
+        return sealed_segments(self.path)
+
+    @staticmethod
+    def segment_index(segment):
+        """Sequence number of a sealed segment path"""
+        return int(segment.name.rsplit('.', 1)[1])
+
+    def append(self, record):
+        """
+        Append a single record
+
+        params:
+            record: JSON-serializable dict
+        """
+        self.append_many((record,))
+
+    def append_many(self, records, fsync=None, flush=True):
+        """
+        Append several records with a single write
+
+        params:
+            records: iterable of JSON-serializable dicts
+            fsync: force (True) or skip (False) an fsync; None follows fsync_interval
+            flush: hand the data to the OS right away instead of leaving it
+                in the file buffer
+        """
+        data = b''.join(
+            json.dumps(record, separators=(',', ':')).encode() + b'\n'
+            for record in records
+        )
+        if not data:
+            return
+        with self.lock:
+            self.file.write(data)
+            self.size += len(data)
+            if flush or fsync:
+                self.file.flush()
+                self._maybe_fsync(fsync)
+            if self.size >= self.segment_size:
+                self._rotate()
+
+    def _maybe_fsync(self, fsync):
+        now = time.monotonic()
+        if fsync is None:
+            fsync = (self.fsync_interval is not None
+                     and now - self.last_fsync >= self.fsync_interval)
+        if fsync:
+            os.fsync(self.file.fileno())
+            self.last_fsync = now
+
+    def _rotate(self):
+        """Seal the active segment and start a new one"""
+        if self.fsync_interval is not None:
+            os.fsync(self.file.fileno())
+        self.file.close()
+        os.replace(self.path, self.path.with_name(f"{self.path.name}.{self.next_index:06d}"))
+        self.next_index += 1
+        self.file = open(self.path, 'ab')
+        self.size = 0
+
+    def rotate(self):
+        """
+        Seal the active segment now, unless it is empty
+
+        returns:
+            int: index of the newest sealed segment, every record appended so far
+                is in a segment up to this index (0 if nothing was ever sealed)
+        """
+        with self.lock:
+            self.file.flush()
+            if self.size:
+                self._rotate()
+            return self.next_index - 1
+
+    def remove_sealed(self, upto):
+        """Delete the sealed segments up to and including index upto"""
+        for segment in self.sealed_segments():
+            if self.segment_index(segment) <= upto:
+                segment.unlink()
+
+    def flush(self, fsync=True):
+        """Flush buffered data and optionally fsync it"""
+        with self.lock:
+            self.file.flush()
+            if fsync:
+                os.fsync(self.file.fileno())
+                self.last_fsync = time.monotonic()
+
+    def replay(self, after=0):
+        """
+        Stream every record in the journal, oldest first.
+        Lines that fail to decode are skipped.
+
+        params:
+            after: skip the sealed segments up to and including this index
+        """
+        sealed = [segment for segment in self.sealed_segments() if self.segment_index(segment) > after]
+        for segment in sealed + [self.path]:
+            if not segment.exists():
+                continue
+            with open(segment, 'rb') as f:
+                for line in f:
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        continue
+
+    def close(self):
+        """Flush and close the active segment"""
+        with self.lock:
+            if not self.file.closed:
+                self.file.flush()
+                if self.fsync_interval is not None:
+                    os.fsync(self.file.fileno())
+                self.file.close()
+
+def sealed_segments(path):
+    """Returns the sealed segment paths of the journal whose active segment is at path, oldest first"""
+    path = Path(path)
+    prefix = path.name + '.'
+    segments = []
+    for candidate in path.parent.glob(prefix + '*'):
+        suffix = candidate.name[len(prefix):]
+        if suffix.isdigit():
+            segments.append((int(suffix), candidate))
+    return [segment for _, segment in sorted(segments)]
+
+def migrate_legacy_json(path):
+    """
+    One-off migration of a file holding a single JSON array of records
+    (the original responses.json format) into journal lines, in place.
+
+    Returns the number of migrated records, or None if nothing was migrated.
+    """
+    path = Path(path)
+    if not path.exists():
+        return None
+    with open(path, 'rb') as f:
+        head = f.read(64).lstrip()
+    if not head.startswith(b'['):
+        return None
+    with open(path, 'r') as f:
+        try:
+            records = json.load(f)
+        except json.JSONDecodeError:
+            # If file is empty or corrupted, start with an empty journal
+            records = []
+    tmp_path = path.with_name(path.name + '.migrating')
+    with open(tmp_path, 'w') as f:
+        for record in records:
+            f.write(json.dumps(record, separators=(',', ':')) + '\n')
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    return len(records)
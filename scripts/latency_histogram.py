@@ -0,0 +1,181 @@
+import threading
+from array import array
+
+PERCENTILES = (50.0, 90.0, 99.0, 99.9)
+
+class LatencyHistogram:
+    """
+    HDR-style log-linear histogram of non-negative integer values (nanoseconds).
+
+    Values below 2**sub_bucket_bits are counted exactly. Above that, every
+    power-of-two range is split into 2**(sub_bucket_bits - 1) linear
+    sub-buckets, so the relative error stays below 1 / 2**(sub_bucket_bits - 1)
+    at any magnitude. Counts live in one preallocated array, record() is a
+    couple of integer operations and an array increment.
+    """
+    def __init__(self, sub_bucket_bits=7, max_value_ns=1 << 36):
+        """
+        Args:
+            sub_bucket_bits (int): Precision; 7 gives < 1.6% relative error
+            max_value_ns (int): Largest trackable value (default ~68 s), larger values
+                land in the last bucket but still update max
+        """
+        self.sub_bucket_bits = sub_bucket_bits
+        self.half_count = 1 << (sub_bucket_bits - 1)
+        self.max_index = self.index_of(max_value_ns)
+        self.reset()
+
+    def reset(self):
+        """Zero all counts"""
+        self.counts = array('Q', bytes(8 * (self.max_index + 1)))
+        self.count = 0
+        self.total = 0
+        self.min = 0
+        self.max = 0
+
+    def index_of(self, value):
+        """Bucket index of a value"""
+        exponent = value.bit_length() - self.sub_bucket_bits
+        if exponent <= 0:
+            return value
+        return exponent * self.half_count + (value >> exponent)
+
+    def value_at(self, index):
+        """Highest value that maps to a bucket index"""
+        if index < 2 * self.half_count:
+            return index
+        exponent = index // self.half_count - 1
+        mantissa = index - exponent * self.half_count
+        return ((mantissa + 1) << exponent) - 1
+
+    def record(self, value):
+        """Count one value"""
+        index = self.index_of(value)
+        if index > self.max_index:
+            index = self.max_index
+        self.counts[index] += 1
+        if self.count == 0 or value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+        self.count += 1
+        self.total += value
+
+    def add_counts(self, counts, total, minimum, maximum):
+        """
+        Add bucket counts computed elsewhere, e.g. in bulk with the index_of rule
+
+        params:
+            counts: count per bucket index, at most max_index + 1 of them
+            total, minimum, maximum: sum, min and max of the values counted
+        """
+        added = 0
+        for index, bucket_count in enumerate(counts):
+            if bucket_count:
+                self.counts[index] += bucket_count
+                added += bucket_count
+        if not added:
+            return
+        if self.count == 0 or minimum < self.min:
+            self.min = minimum
+        if maximum > self.max:
+            self.max = maximum
+        self.count += added
+        self.total += total
+
+    def percentiles(self, percentiles=PERCENTILES):
+        """
+        Values at the given percentiles, computed in a single pass over the buckets
+
+        returns:
+            dict: percentile -> value (0 when the histogram is empty)
+        """
+        result = {p: 0 for p in percentiles}
+        if self.count == 0:
+            return result
+        targets = sorted((max(1, -(-p * self.count // 100)), p) for p in percentiles)
+        position = 0
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            if not bucket_count:
+                continue
+            seen += bucket_count
+            # The last bucket also holds every clamped value above the trackable range
+            value = self.max if index == self.max_index else min(self.value_at(index), self.max)
+            while position < len(targets) and seen >= targets[position][0]:
+                result[targets[position][1]] = value
+                position += 1
+            if position == len(targets):
+                break
+        return result
+
+    def summary(self):
+        """Count, mean, min, max and the standard percentiles"""
+        summary = {
+            "count": self.count,
+            "mean": self.total / self.count if self.count else 0.0,
+            "min": self.min,
+            "max": self.max,
+        }
+        for percentile, value in self.percentiles().items():
+            summary[f"p{percentile:g}"] = value
+        return summary
+
+class LatencyRecorder:
+    """
+    Latency histograms per symbol, per response type and overall.
+
+    Histograms are created the first time a symbol or response type is seen;
+    after that recording an ack only updates existing arrays.
+    """
+    def __init__(self, sub_bucket_bits=7, max_value_ns=1 << 36):
+        self.sub_bucket_bits = sub_bucket_bits
+        self.max_value_ns = max_value_ns
+        self.lock = threading.Lock()
+        self.overall = self._new_histogram()
+        self.by_symbol = {}
+        self.by_response_type = {}
+
+    def _new_histogram(self):
+        return LatencyHistogram(self.sub_bucket_bits, self.max_value_ns)
+
+    def record(self, symbol_id, response_type, latency_ns):
+        """Record the latency of one ack"""
+        self.record_many(((symbol_id, response_type, latency_ns),))
+
+    def record_many(self, samples):
+        """Record a batch of (symbol_id, response_type, latency_ns) under one lock acquisition"""
+        with self.lock:
+            for symbol_id, response_type, latency_ns in samples:
+                by_symbol = self.by_symbol.get(symbol_id)
+                if by_symbol is None:
+                    by_symbol = self.by_symbol[symbol_id] = self._new_histogram()
+                by_response_type = self.by_response_type.get(response_type)
+                if by_response_type is None:
+                    by_response_type = self.by_response_type[response_type] = self._new_histogram()
+                self.overall.record(latency_ns)
+                by_symbol.record(latency_ns)
+                by_response_type.record(latency_ns)
+
+    def snapshot(self, reset=False):
+        """
+        Summaries of every histogram. With reset, all histograms start a new
+        window atomically with respect to record().
+
+        returns:
+            dict: {"overall": summary, "by_symbol": {symbol: summary},
+                   "by_response_type": {response type: summary}}
+        """
+        with self.lock:
+            snapshot = {
+                "overall": self.overall.summary(),
+                "by_symbol": {symbol: h.summary() for symbol, h in self.by_symbol.items()},
+                "by_response_type": {rt: h.summary() for rt, h in self.by_response_type.items()},
+            }
+            if reset:
+                self.overall.reset()
+                for histogram in self.by_symbol.values():
+                    histogram.reset()
+                for histogram in self.by_response_type.values():
+                    histogram.reset()
+        return snapshot
@@ -0,0 +1,224 @@
+"""
+Asynchronous structured logger backed by a bounded ring buffer.
+
+Callers only capture a record (timestamp, level, thread, template, args)
+into the ring; a background thread formats the records and writes them to
+the stream in batches, so the hot path never touches stdout and lines from
+different threads never interleave. When the ring is full new records are
+dropped and counted instead of blocking. A call below the configured level
+returns after a single integer comparison.
+
+The ring is a deque whose append and popleft are atomic under the GIL, so
+producers take no lock; a lock costs several times more than the append.
+The capacity check is not atomic with the append, concurrent producers can
+overshoot it by one record each.
+
+Templates use %-style formatting and are only expanded on the drain thread,
+so arguments should be immutable values (IDs, prices, strings).
+
+    from scripts.logger import log
+    log.info("Order %d added to queue.", order_id)
+"""
+
+import atexit
+import sys
+import threading
+import time
+from collections import deque
+
+# Plain ints rather than an IntEnum, comparing enum members costs several times more
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+OFF = 100
+
+LEVEL_NAMES = {DEBUG: "DEBUG", INFO: "INFO", WARNING: "WARNING", ERROR: "ERROR"}
+
+_get_ident = threading.get_ident
+_time = time.time
+
+class Sampler:
+    """
+    Logs one in every `every` calls, for events too frequent to log in full.
+    Get one from RingLogger.sampled.
+    """
+    def __init__(self, logger, every=1):
+        self.logger = logger
+        self.every = every
+        self.calls = 0
+
+    def log(self, level, template, *args):
+        if level < self.logger.level:
+            return
+        self.calls += 1  # Racy across threads, only the sampling rate is approximate
+        if self.calls % self.every == 0:
+            self.logger._put((_time(), level, _get_ident(), template, args))
+
+    def debug(self, template, *args):
+        if self.logger.level <= DEBUG:
+            self.calls += 1
+            if self.calls % self.every == 0:
+                self.logger._put((_time(), DEBUG, _get_ident(), template, args))
+
+    def info(self, template, *args):
+        if self.logger.level <= INFO:
+            self.calls += 1
+            if self.calls % self.every == 0:
+                self.logger._put((_time(), INFO, _get_ident(), template, args))
+
+class RingLogger:
+    """
+    Leveled logger writing through a bounded ring buffer and a background
+    drain thread. See the module docstring.
+    """
+    IDLE_WAIT = 0.1  # Longest a record waits if its wakeup raced with the drain going idle
+
+    def __init__(self, capacity=65536, level=INFO, stream=None, batch_size=1024):
+        """
+        Args:
+            capacity (int): Records the ring holds before new ones are dropped
+            level (int): Minimum level that is recorded
+            stream (file | None): Where lines are written, the current sys.stdout when None
+            batch_size (int): Maximum records formatted per write
+        """
+        self.capacity = capacity
+        self.level = level
+        self.stream = stream
+        self.batch_size = batch_size
+        self.records = deque()
+        self.written = 0
+        self.dropped = 0
+        self.writing = False
+        self.samplers = {}
+        self.lock = threading.Lock()  # Drops, flush and stats only, never taken to log
+        self.drained = threading.Condition(self.lock)
+        self.wakeup = threading.Event()
+        self.running = True
+        self._second = None
+        self._prefix = ""
+        self.thread = threading.Thread(target=self._run, name="ring-logger", daemon=True)
+        self.thread.start()
+        atexit.register(self.close)
+
+    def set_level(self, level):
+        self.level = level
+
+    def is_enabled(self, level):
+        return level >= self.level
+
+    def sampled(self, name, every=1):
+        """
+        Returns the sampler registered under name, creating it on first use.
+        Its rate can be changed later with set_sampling.
+        """
+        sampler = self.samplers.get(name)
+        if sampler is None:
+            sampler = self.samplers.setdefault(name, Sampler(self, every))
+        return sampler
+
+    def set_sampling(self, name, every):
+        """Log one in every `every` events of the named sampler"""
+        self.sampled(name).every = every
+
+    def _put(self, record):
+        records = self.records
+        if len(records) >= self.capacity:
+            with self.lock:
+                self.dropped += 1
+            return
+        records.append(record)
+        if len(records) == 1:
+            self.wakeup.set()
+
+    def log(self, level, template, *args):
+        if level >= self.level:
+            self._put((_time(), level, _get_ident(), template, args))
+
+    def debug(self, template, *args):
+        if self.level <= DEBUG:
+            self._put((_time(), DEBUG, _get_ident(), template, args))
+
+    def info(self, template, *args):
+        if self.level <= INFO:
+            self._put((_time(), INFO, _get_ident(), template, args))
+
+    def warning(self, template, *args):
+        if self.level <= WARNING:
+            self._put((_time(), WARNING, _get_ident(), template, args))
+
+    def error(self, template, *args):
+        if self.level <= ERROR:
+            self._put((_time(), ERROR, _get_ident(), template, args))
+
+    def format(self, record, thread_names):
+        """One output line for a record"""
+        timestamp, level, ident, template, args = record
+        try:
+            message = template % args if args else template
+        except (TypeError, ValueError) as e:
+            message = f"{template} {args!r} (bad log format: {e})"
+        second = int(timestamp)
+        if second != self._second:
+            self._second = second
+            self._prefix = time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(second))
+        micros = int((timestamp - second) * 1e6)
+        return f"{self._prefix}.{micros:06d} {LEVEL_NAMES.get(level, level):<7} [{thread_names.get(ident, ident)}] {message}\n"
+
+    def _run(self):
+        records = self.records
+        while True:
+            self.wakeup.clear()
+            if not records:
+                with self.lock:
+                    self.drained.notify_all()
+                    if not self.running:
+                        return
+                self.wakeup.wait(self.IDLE_WAIT)
+                continue
+            self.writing = True
+            batch = []
+            try:
+                for _ in range(self.batch_size):
+                    batch.append(records.popleft())
+            except IndexError:
+                pass
+            self._write(batch)
+            with self.lock:
+                self.written += len(batch)
+                self.writing = False
+
+    def _write(self, records):
+        # Threads that have exited since logging show up by their ident
+        thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+        stream = self.stream if self.stream is not None else sys.stdout
+        try:
+            stream.write("".join([self.format(record, thread_names) for record in records]))
+            stream.flush()
+        except (OSError, ValueError):
+            pass  # Stream closed, nowhere left to report it
+
+    def flush(self, timeout=None):
+        """Block until every record logged before the call has been written"""
+        self.wakeup.set()
+        with self.lock:
+            return self.drained.wait_for(
+                lambda: (not self.records and not self.writing) or not self.thread.is_alive(), timeout)
+
+    def stats(self):
+        """Records written and dropped so far, and records waiting in the ring"""
+        with self.lock:
+            return {"written": self.written, "dropped": self.dropped, "pending": len(self.records)}
+
+    def close(self):
+        """Write what is left and stop the drain thread"""
+        with self.lock:
+            if not self.running:
+                return
+            self.running = False
+        self.wakeup.set()
+        self.thread.join()
+        atexit.unregister(self.close)
+
+# Shared logger for the OMS modules
+log = RingLogger()
@@ -0,0 +1,327 @@
+"""
+Metrics registry with counters, gauges and histograms.
+
+Counters and histograms are updated through per-thread cells: every thread
+increments its own cell without taking a lock, and cells are only summed
+when a snapshot is taken. inc() and observe() find the calling thread's cell
+through a threading.local on every call; code that always updates a metric
+from the same thread can keep the cell from cell() and update it directly,
+which skips that lookup. Gauges are plain attribute stores, or callbacks
+evaluated at snapshot time so the hot path pays nothing at all. The
+registry renders the Prometheus text exposition format, served over HTTP
+by start_http_server or written for a textfile collector by TextfileExporter.
+"""
+
+import bisect
+import math
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from scripts.logger import log
+
+# Time buckets in seconds, 10us to 10s
+DEFAULT_BUCKETS = (1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4, 1e-3, 2.5e-3, 5e-3,
+                   1e-2, 2.5e-2, 5e-2, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class _CounterCell:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+class _HistogramCell:
+    __slots__ = ("buckets", "counts", "sum")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # Last slot is +Inf
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+class Counter:
+    """Monotonic counter. inc() only touches the calling thread's cell."""
+    def __init__(self):
+        self._local = threading.local()
+        self._cells = []
+        self._lock = threading.Lock()  # Only taken when a thread creates its cell
+
+    def _new_cell(self):
+        cell = _CounterCell()
+        with self._lock:
+            self._cells.append(cell)
+        self._local.cell = cell
+        return cell
+
+    def inc(self, amount=1):
+        try:
+            self._local.cell.value += amount
+        except AttributeError:
+            self._new_cell().value += amount
+
+    def cell(self):
+        """
+        The calling thread's cell, with an inc() of its own. Only use it from
+        this thread: cells of different threads are summed, never locked.
+        """
+        try:
+            return self._local.cell
+        except AttributeError:
+            return self._new_cell()
+
+    def value(self):
+        with self._lock:
+            cells = list(self._cells)
+        return sum(cell.value for cell in cells)
+
+class Gauge:
+    """Point-in-time value, either set directly or read from a callback at snapshot time"""
+    def __init__(self, function=None):
+        self._value = 0
+        self._function = function
+
+    def set(self, value):
+        self._value = value
+
+    def inc(self, amount=1):
+        """Not atomic across threads, only use from a single writer"""
+        self._value += amount
+
+    def set_function(self, function):
+        self._function = function
+
+    def value(self):
+        if self._function is not None:
+            return self._function()
+        return self._value
+
+class Histogram:
+    """Bucketed distribution. observe() only touches the calling thread's cell."""
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self._local = threading.local()
+        self._cells = []
+        self._lock = threading.Lock()
+
+    def _new_cell(self):
+        cell = _HistogramCell(self.buckets)
+        with self._lock:
+            self._cells.append(cell)
+        self._local.cell = cell
+        return cell
+
+    def observe(self, value):
+        try:
+            cell = self._local.cell
+        except AttributeError:
+            cell = self._new_cell()
+        cell.counts[bisect.bisect_left(self.buckets, value)] += 1
+        cell.sum += value
+
+    def cell(self):
+        """The calling thread's cell, with an observe() of its own, see Counter.cell"""
+        try:
+            return self._local.cell
+        except AttributeError:
+            return self._new_cell()
+
+    def value(self):
+        """
+        returns:
+            dict: {"buckets": [(upper bound, cumulative count), ...], "sum": float, "count": int}
+        """
+        with self._lock:
+            cells = list(self._cells)
+        counts = [0] * (len(self.buckets) + 1)
+        total = 0.0
+        for cell in cells:
+            for i, count in enumerate(cell.counts):
+                counts[i] += count
+            total += cell.sum
+        cumulative = []
+        running = 0
+        for bound, count in zip(self.buckets + (math.inf,), counts):
+            running += count
+            cumulative.append((bound, running))
+        return {"buckets": cumulative, "sum": total, "count": running}
+
+class MetricFamily:
+    """
+    A named metric and its children, one per combination of label values.
+    Unlabelled families have a single child, which the family proxies.
+    """
+    def __init__(self, name, help, kind, factory, label_names=()):
+        self.name = name
+        self.help = help
+        self.kind = kind
+        self.label_names = tuple(label_names)
+        self._factory = factory
+        self._children = {}
+        self._lock = threading.Lock()
+        if not self.label_names:
+            self._default = self.labels()
+
+    def labels(self, *values):
+        """Returns the child for these label values, creating it on first use"""
+        values = tuple(str(value) for value in values)
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.label_names):
+                raise ValueError(f"{self.name} expects labels {self.label_names}, got {values}")
+            with self._lock:
+                child = self._children.setdefault(values, self._factory())
+        return child
+
+    def children(self):
+        with self._lock:
+            return list(self._children.items())
+
+    def __getattr__(self, attribute):
+        # inc/set/observe/value of an unlabelled family go to its only child
+        if attribute.startswith("_") or not self.__dict__.get("_default"):
+            raise AttributeError(attribute)
+        return getattr(self._default, attribute)
+
+class MetricsRegistry:
+    """
+    Named metric families. Asking for an existing name returns the family
+    already registered, so components sharing a registry share their metrics.
+    """
+    def __init__(self):
+        self.families = {}
+        self.lock = threading.Lock()
+
+    def _family(self, name, help, kind, factory, labels):
+        with self.lock:
+            family = self.families.get(name)
+            if family is None:
+                family = self.families[name] = MetricFamily(name, help, kind, factory, labels)
+            elif family.kind != kind:
+                raise ValueError(f"Metric {name} is already registered as a {family.kind}")
+            return family
+
+    def counter(self, name, help, labels=()):
+        return self._family(name, help, "counter", Counter, labels)
+
+    def gauge(self, name, help, labels=(), function=None):
+        family = self._family(name, help, "gauge", Gauge, labels)
+        if function is not None:
+            family.set_function(function)
+        return family
+
+    def histogram(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        return self._family(name, help, "histogram", lambda: Histogram(buckets), labels)
+
+    def snapshot(self):
+        """
+        Current value of every metric
+
+        returns:
+            dict: {name: value} for unlabelled metrics, {name: {label values: value}} otherwise
+        """
+        with self.lock:
+            families = list(self.families.values())
+        snapshot = {}
+        for family in families:
+            values = {labels: child.value() for labels, child in family.children()}
+            snapshot[family.name] = values[()] if not family.label_names else values
+        return snapshot
+
+    def exposition(self):
+        """Render every metric in the Prometheus text exposition format"""
+        with self.lock:
+            families = list(self.families.values())
+        lines = []
+        for family in families:
+            lines.append(f"# HELP {family.name} {family.help}")
+            lines.append(f"# TYPE {family.name} {family.kind}")
+            for values, child in family.children():
+                labels = list(zip(family.label_names, values))
+                if family.kind == "histogram":
+                    histogram = child.value()
+                    for bound, count in histogram["buckets"]:
+                        lines.append(f"{family.name}_bucket{_labels(labels + [('le', _number(bound))])} {count}")
+                    lines.append(f"{family.name}_sum{_labels(labels)} {_number(histogram['sum'])}")
+                    lines.append(f"{family.name}_count{_labels(labels)} {histogram['count']}")
+                else:
+                    lines.append(f"{family.name}{_labels(labels)} {_number(child.value())}")
+        return "\n".join(lines) + "\n"
+
+def _labels(pairs):
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+def _number(value):
+    if value == math.inf:
+        return "+Inf"
+    if value == -math.inf:
+        return "-Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+def start_http_server(registry, port, address="127.0.0.1"):
+    """
+    Serve the registry at http://address:port/metrics from a daemon thread
+
+    returns:
+        ThreadingHTTPServer: call shutdown() to stop it, server_address holds the bound port
+    """
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] not in ("/", "/metrics"):
+                self.send_error(404)
+                return
+            body = registry.exposition().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass  # Scrapes are not worth a line each
+
+    server = ThreadingHTTPServer((address, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def write_textfile(registry, path):
+    """Write the exposition atomically, for the node exporter textfile collector"""
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'w') as f:
+        f.write(registry.exposition())
+    os.replace(temp_path, path)
+
+class TextfileExporter:
+    """Rewrites a textfile exposition of the registry every interval seconds"""
+    def __init__(self, registry, path, interval=15.0):
+        self.registry = registry
+        self.path = path
+        self.interval = interval
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def _run(self):
+        while not self.stopped.wait(self.interval):
+            try:
+                write_textfile(self.registry, self.path)
+            except OSError as e:
+                log.error("Error writing metrics to %s: %s", self.path, e)
+
+    def stop(self):
+        """Stop the exporter, writing one last time"""
+        self.stopped.set()
+        self.thread.join()
+        write_textfile(self.registry, self.path)
@@ -0,0 +1,204 @@
+"""
+Local mock exchange listening on a loopback TCP port or a Unix socket.
+
+Accepts order requests in the binary wire format (scripts/codec.py) and answers each
+one asynchronously after a latency drawn from a configurable distribution,
+accepting or rejecting according to an accept ratio and a throttle. Can be
+embedded (MockExchange(...).start()) or run as its own process:
+
+    python scripts/mock_exchange.py --port 9100 --latency uniform:100:500 --accept-ratio 0.95 --throttle 5000
+"""
+
+import argparse
+import heapq
+import math
+import random
+import socket
+import threading
+import time
+
+import os, sys
+
+cwd = os.getcwd()
+if cwd.endswith("scripts"):
+    os.chdir("..")
+sys.path.append(os.getcwd())
+
+from scripts.codec import REQUEST, REQUEST_SIZE, RESPONSE, RESPONSE_KIND, FrameReader
+from scripts.order import ResponseType
+
+def parse_latency(spec):
+    """
+    Build a latency sampler (returns seconds) from a spec in microseconds:
+    fixed:US, uniform:LOW:HIGH, exp:MEAN or lognormal:MEDIAN:SIGMA
+    """
+    kind, *params = spec.split(":")
+    params = [float(p) for p in params]
+    if kind == "fixed" and len(params) == 1:
+        return lambda: params[0] / 1e6
+    if kind == "uniform" and len(params) == 2:
+        return lambda: random.uniform(params[0], params[1]) / 1e6
+    if kind == "exp" and len(params) == 1:
+        return lambda: random.expovariate(1 / params[0]) / 1e6
+    if kind == "lognormal" and len(params) == 2:
+        mu = math.log(params[0])
+        return lambda: random.lognormvariate(mu, params[1]) / 1e6
+    raise ValueError(f"Unknown latency distribution: {spec}")
+
+class MockExchange:
+    """
+    Mock exchange server. Every connection has a reader thread; responses are
+    released by one scheduler thread when their sampled latency has elapsed.
+    """
+    def __init__(self, address=("127.0.0.1", 0), latency="fixed:200", accept_ratio=1.0, throttle=None):
+        """
+        Args:
+            address (tuple | str): (host, port) to listen on, port 0 picks a free one,
+                or a Unix socket path
+            latency (str): Latency distribution spec, see parse_latency
+            accept_ratio (float): Probability a request is accepted
+            throttle (int | None): Requests per second accepted before rejecting
+        """
+        self.requested_address = address
+        self.sample_latency = parse_latency(latency)
+        self.accept_ratio = accept_ratio
+        self.throttle = throttle
+        self.tokens = throttle or 0
+        self.last_token_time = time.monotonic()
+        self.schedule = []  # heap of (due, sequence, connection, payload)
+        self.sequence = 0
+        self.lock = threading.Lock()
+        self.due = threading.Condition(self.lock)
+        self.running = False
+        self.received = 0
+        self.throttled = 0
+
+    def start(self):
+        """Bind, listen and start serving; returns self"""
+        if isinstance(self.requested_address, tuple):
+            self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self.server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        else:
+            if os.path.exists(self.requested_address):
+                os.unlink(self.requested_address)
+            self.server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.server.bind(self.requested_address)
+        self.server.listen()
+        self.address = self.server.getsockname()
+        self.running = True
+        self.connections = []
+        threading.Thread(target=self._accept_loop, daemon=True).start()
+        self.scheduler = threading.Thread(target=self._schedule_loop, daemon=True)
+        self.scheduler.start()
+        return self
+
+    def _accept_loop(self):
+        while self.running:
+            try:
+                connection, _ = self.server.accept()
+            except OSError:
+                return
+            if connection.family == socket.AF_INET:
+                connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self.connections.append(connection)
+            threading.Thread(target=self._serve, args=(connection,), daemon=True).start()
+
+    def _admit(self):
+        """Throttle check, refilling the token bucket lazily"""
+        if self.throttle is None:
+            return True
+        now = time.monotonic()
+        self.tokens = min(self.tokens + (now - self.last_token_time) * self.throttle, self.throttle)
+        self.last_token_time = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        self.throttled += 1
+        return False
+
+    def _serve(self, connection):
+        reader = FrameReader(connection, REQUEST_SIZE)
+        try:
+            while True:
+                frames = reader.read()
+                if frames is None:
+                    return
+                now = time.monotonic()
+                with self.lock:
+                    for _, _, _, _, order_id, _, _ in REQUEST.iter_unpack(frames):
+                        self.received += 1
+                        accepted = self._admit() and random.random() < self.accept_ratio
+                        response_type = ResponseType.Accept if accepted else ResponseType.Reject
+                        payload = RESPONSE.pack(RESPONSE_KIND, response_type.value, order_id)
+                        self.sequence += 1
+                        heapq.heappush(self.schedule, (now + self.sample_latency(), self.sequence, connection, payload))
+                        if self.schedule[0][1] == self.sequence:
+                            self.due.notify()
+        except OSError:
+            pass
+
+    def _schedule_loop(self):
+        while True:
+            with self.lock:
+                while self.running and (not self.schedule or self.schedule[0][0] > time.monotonic()):
+                    self.due.wait(self.schedule[0][0] - time.monotonic() if self.schedule else None)
+                if not self.running:
+                    return
+                # Release everything that is due, batched per connection
+                now = time.monotonic()
+                batches = {}
+                while self.schedule and self.schedule[0][0] <= now:
+                    _, _, connection, payload = heapq.heappop(self.schedule)
+                    batches.setdefault(connection, []).append(payload)
+            for connection, payloads in batches.items():
+                try:
+                    connection.sendall(b''.join(payloads))
+                except OSError:
+                    pass  # Client went away
+
+    def stop(self):
+        """Stop serving and close every connection"""
+        with self.lock:
+            self.running = False
+            self.due.notify()
+        try:
+            self.server.shutdown(socket.SHUT_RDWR)  # Wakes the accept loop
+        except OSError:
+            pass
+        self.server.close()
+        for connection in self.connections:
+            try:
+                connection.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            connection.close()
+        self.scheduler.join()
+        if not isinstance(self.requested_address, tuple) and os.path.exists(self.requested_address):
+            os.unlink(self.requested_address)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1", help="address to listen on")
+    parser.add_argument("--port", type=int, default=9100, help="TCP port to listen on")
+    parser.add_argument("--unix", help="listen on this Unix socket path instead of TCP")
+    parser.add_argument("--latency", default="fixed:200", help="latency distribution in microseconds")
+    parser.add_argument("--accept-ratio", type=float, default=1.0, help="probability of accepting")
+    parser.add_argument("--throttle", type=int, help="requests/s accepted before rejecting")
+    args = parser.parse_args()
+
+    exchange = MockExchange(
+        address=args.unix or (args.host, args.port),
+        latency=args.latency,
+        accept_ratio=args.accept_ratio,
+        throttle=args.throttle
+    ).start()
+    print(f"Mock exchange listening on {exchange.address}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        exchange.stop()
+        print(f"Received {exchange.received} requests, throttled {exchange.throttled}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+"""
+The OMS pipeline split over three processes connected by shared-memory rings,
+so that parsing, sequencing and persistence each get a GIL of their own.
+
+    gateway (the calling process)
+        encodes order requests with scripts/codec.py into the request ring
+    sequencer
+        decodes them into a ShardedOrderQueue, sends them through an
+        OrderProcessor and its transport, matches the exchange responses to
+        their orders and writes 32-byte ack records (the ResponseStore
+        layout) into the ack ring
+    persistence
+        appends the acks to the response journal, and to a ResponseStore
+        when one is configured, and keeps the latency histograms
+
+Each ring has one writer and one reader, see scripts/shm_ring.py.
+"""
+
+import multiprocessing
+import threading
+import time
+from pathlib import Path
+
+import os, sys
+
+cwd = os.getcwd()
+if cwd.endswith("scripts"):
+    os.chdir("..")
+sys.path.append(os.getcwd())
+
+from scripts import codec
+from scripts.order import RESPONSE_TYPES
+from scripts.shm_ring import ShmRing
+from scripts.sharded_order_queue import ShardedOrderQueue
+from scripts.order_processor import OrderProcessor
+from scripts.transport import SimulatedTransport
+from scripts.journal import Journal
+from scripts.response_store import ResponseStore, RECORD, RECORD_SIZE
+from scripts.latency_histogram import LatencyRecorder
+from scripts.logger import log
+
+_BATCH = 4096  # Records per ring read and per encoded gateway batch
+
+class MultiProcessPipeline:
+    """
+    Gateway end of the multi-process pipeline, see the module docstring.
+    Requests are not checked against a trading window, the caller owns the session.
+    """
+    def __init__(self, order_rate_limit, response_storage_path="responses.json", response_store_path=None,
+                 transport=None, max_in_flight=64, ring_slots=65536, drain_timeout=10.0):
+        """
+        Start the sequencer and persistence processes
+
+        Args:
+            order_rate_limit (int): Maximum orders per second for the whole session
+            response_storage_path (str): Path of the active response journal segment
+            response_store_path (str | None): Also keep the acks in a ResponseStore
+            transport (callable | None): Picklable factory called in the sequencer process to
+                build its transport, e.g. functools.partial(SocketTransport, address).
+                None uses a SimulatedTransport, which produces no responses.
+            max_in_flight (int): Maximum number of orders on the wire at once
+            ring_slots (int): Records each ring holds
+            drain_timeout (float): Seconds close() lets the sequencer wait for outstanding acks
+        """
+        context = multiprocessing.get_context("spawn")  # Forking would copy the parent's threads' locks
+        self.requests = ShmRing(ring_slots, codec.REQUEST_SIZE)
+        self.acks = ShmRing(ring_slots, RECORD_SIZE)
+        self.results, results = context.Pipe(duplex=False)
+        self.sequencer = context.Process(
+            target=_run_sequencer, name="oms-sequencer", daemon=True,
+            args=(self.requests, self.acks, order_rate_limit, transport, max_in_flight, drain_timeout, log.level))
+        self.persistence = context.Process(
+            target=_run_persistence, name="oms-persistence", daemon=True,
+            args=(self.acks, str(response_storage_path),
+                  None if response_store_path is None else str(response_store_path), results, log.level))
+        self.sequencer.start()
+        self.persistence.start()
+        results.close()
+        self.buffer = bytearray(_BATCH * codec.REQUEST_SIZE)
+        self.summary = None
+
+    def submit_many(self, order_requests):
+        """Encode a batch of order requests into the request ring, waiting for room as needed"""
+        order_requests = list(order_requests)
+        for start in range(0, len(order_requests), _BATCH):
+            self.requests.write(codec.encode_requests(order_requests[start:start + _BATCH], self.buffer))
+
+    def submit(self, order_request):
+        self.submit_many((order_request,))
+
+    def close(self):
+        """
+        Stop taking requests and wait until the sequencer has sent every order
+        and seen its ack (or drain_timeout passed) and persistence has stored them
+
+        returns:
+            dict: "responses" persisted and their "latency" snapshot, see LatencyRecorder.snapshot
+        """
+        if self.summary is not None:
+            return self.summary
+        self.requests.close_writer()
+        while not self.results.poll(0.1):
+            if not self.sequencer.is_alive() and self.sequencer.exitcode:
+                self.acks.close_writer()  # Let persistence finish what it has
+            if not self.persistence.is_alive():
+                break
+        self.summary = self.results.recv() if self.results.poll() else {"responses": 0, "latency": None}
+        self.sequencer.join()
+        self.persistence.join()
+        self.results.close()
+        self.requests.close()
+        self.acks.close()
+        return self.summary
+
+def _run_sequencer(requests, acks, order_rate_limit, transport_factory, max_in_flight, drain_timeout, log_level):
+    log.set_level(log_level)
+    order_queue = ShardedOrderQueue()
+    transport = transport_factory() if transport_factory is not None else SimulatedTransport()
+    processor = OrderProcessor(order_rate_limit, order_queue, max_in_flight=max_in_flight, transport=transport)
+    ack_lock = threading.Lock()  # Responses arrive on the transport's threads, the ring takes one writer
+
+    def on_response(response):
+        order = order_queue.orders.pop(response.m_orderId, None)
+        if order is None:
+            return
+        record = RECORD.pack(response.m_orderId, order.m_symbolId, response.m_responseType.value,
+                             time.perf_counter_ns() - order.timestamp_ns, time.time_ns())
+        with ack_lock:
+            acks.write(record)
+
+    transport.start(on_response)
+    thread = threading.Thread(target=processor.process_queue, daemon=True)
+    thread.start()
+    while True:
+        data = requests.read(_BATCH)
+        if data is None:
+            break
+        order_queue.handle_requests(codec.decode_requests(data))
+    # Orders stay in order_queue.orders from arrival until their ack
+    deadline = time.monotonic() + drain_timeout
+    while order_queue.orders and time.monotonic() < deadline:
+        time.sleep(0.001)
+    processor.stop()
+    thread.join()
+    processor.close()
+    transport.close()
+    with ack_lock:
+        acks.close_writer()
+    requests.close()
+    acks.close()
+
+def _run_persistence(acks, storage_path, store_path, results, log_level):
+    log.set_level(log_level)
+    journal = Journal(Path(storage_path))
+    store = ResponseStore(store_path) if store_path is not None else None
+    latency = LatencyRecorder()
+    count = 0
+    while True:
+        data = acks.read(_BATCH)
+        if data is None:
+            break
+        batch = [(order_id, symbol_id, RESPONSE_TYPES[response_type], latency_ns, timestamp_ns)
+                 for order_id, symbol_id, response_type, latency_ns, timestamp_ns in RECORD.iter_unpack(data)]
+        journal.append_many([{"order_id": order_id, "symbol_id": symbol_id, "response_type": str(response_type),
+                              "latency": latency_ns / 1e9, "timestamp": timestamp_ns / 1e9}
+                             for order_id, symbol_id, response_type, latency_ns, timestamp_ns in batch])
+        if store is not None:
+            store.append_many(batch)
+        latency.record_many([(symbol_id, response_type, latency_ns)
+                             for _, symbol_id, response_type, latency_ns, _ in batch])
+        count += len(batch)
+    journal.close()
+    if store is not None:
+        store.close()
+    acks.close()
+    results.send({"responses": count, "latency": latency.snapshot()})
+    results.close()
@@ -12,10 +12,21 @@ class ResponseType(Enum):
     Accept = 1
     Reject = 2
 
+# Small integer codes for compact (array / binary) representations
+SIDES = ('B', 'S')
+SIDE_CODES = {side: code for code, side in enumerate(SIDES)}
+REQUEST_TYPES = tuple(RequestType)
+RESPONSE_TYPES = tuple(ResponseType)
+# Prices are stored as integers in units of 1 / PRICE_SCALE
+PRICE_SCALE = 10000
+
 class OrderRequest:
     """
     Represents an order request to be sent to the exchange
     """
+    __slots__ = ('m_symbolId', 'm_price', 'm_qty', 'm_side', 'm_orderId', 'request_type', 'timestamp_ns',
+                 '_prev', '_next', '_list')
+
     def __init__(self, m_symbolId, m_price, m_qty, m_side, m_orderId, request_type=RequestType.New):
         self.m_symbolId = m_symbolId
         self.m_price = m_price
@@ -23,12 +34,18 @@ class OrderRequest:
         self.m_side = m_side
         self.m_orderId = m_orderId
         self.request_type = request_type
-        self.timestamp = time.time()
+        self.timestamp_ns = time.perf_counter_ns()  # Monotonic, only meaningful within this process
+        # Intrusive links used by OrderList while the order is queued
+        self._prev = None
+        self._next = None
+        self._list = None
 
 class OrderResponse:
     """
     Represents a response from the exchange to an order request
     """
+    __slots__ = ('m_orderId', 'm_responseType')
+
     def __init__(self, m_orderId, m_responseType):
         self.m_orderId = m_orderId
         self.m_responseType = m_responseType
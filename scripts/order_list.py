@@ -0,0 +1,62 @@
+class OrderList:
+    """
+    Intrusive doubly-linked FIFO of orders.
+
+    The links live on the orders themselves (`_prev`, `_next`, and `_list` for
+    the list an order currently belongs to), so an order found through the
+    `orders` dict can be unlinked in O(1) without scanning. Mirrors the parts
+    of the deque API the queue and processor use.
+    """
+    def __init__(self):
+        self.head = None
+        self.tail = None
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def __contains__(self, order):
+        return order._list is self
+
+    def __iter__(self):
+        order = self.head
+        while order is not None:
+            yield order
+            order = order._next
+
+    def append(self, order):
+        """Link an order at the tail"""
+        if order._list is not None:
+            raise ValueError(f"Order {order.m_orderId} is already queued")
+        order._prev = self.tail
+        order._next = None
+        order._list = self
+        if self.tail is None:
+            self.head = order
+        else:
+            self.tail._next = order
+        self.tail = order
+        self.size += 1
+
+    def popleft(self):
+        """Unlink and return the order at the head"""
+        order = self.head
+        if order is None:
+            raise IndexError("pop from an empty OrderList")
+        self.remove(order)
+        return order
+
+    def remove(self, order):
+        """Unlink an order from anywhere in the list"""
+        if order._list is not self:
+            raise ValueError(f"Order {order.m_orderId} is not in this list")
+        if order._prev is None:
+            self.head = order._next
+        else:
+            order._prev._next = order._next
+        if order._next is None:
+            self.tail = order._prev
+        else:
+            order._next._prev = order._prev
+        order._prev = order._next = order._list = None
+        self.size -= 1
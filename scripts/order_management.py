@@ -10,30 +10,85 @@ if cwd.endswith("scripts"):
 sys.path.append(os.getcwd())
 
 from scripts.order import OrderRequest, RequestType, OrderResponse, ResponseType
-from scripts.order_queue import OrderQueue
+from scripts.order_queue import RequestOutcome
+from scripts.sharded_order_queue import ShardedOrderQueue
 from scripts.order_processor import OrderProcessor
 from scripts.response_handler import ResponseHandler
+from scripts.response_writer import Durability
+from scripts.ingress_executor import IngressExecutor, Admission
+from scripts.transport import SimulatedTransport
+from scripts.trading_schedule import TradingSchedule, SessionScheduler
+from scripts.metrics import MetricsRegistry
+from scripts.request_log import RequestLog
+from scripts.logger import log
 
 class OrderManagement:
     """
     Manages the order queue and processes orders
     """
-    def __init__(self, start_time, end_time, order_rate_limit, response_storage_path="responses.json"):
+    def __init__(self, start_time, end_time, order_rate_limit, response_storage_path="responses.json", durability=Durability.Flush, num_workers=4, ingress_queue_depth=1024, max_in_flight=64, transport=None, rate_limiter=None, reserved_tokens=0, sessions=None, metrics=None, request_log_path=None, snapshot_interval=60.0, response_store_path=None, max_responses=None, max_response_age=None):
         """
         Initialize the order management system
         
         Args:
             start_time (time): Trading start time
-            end_time (time): Trading end time
-            order_rate_limit (int): Maximum orders per second
+            end_time (time): Trading end time, before start_time for a session crossing midnight
+            order_rate_limit (int): Maximum orders per second for the whole session
             response_storage_path (str): Path to store response data
+            durability (Durability | None): Durability of the background response writer,
+                None to persist responses inline
+            num_workers (int): Number of ingress worker threads
+            ingress_queue_depth (int): Pending messages per worker before requests are rejected as busy
+            max_in_flight (int): Maximum number of orders on the wire at once
+            transport (SimulatedTransport | SocketTransport): Carries orders to the exchange
+                and delivers its responses to handle_order_response
+            rate_limiter (HierarchicalRateLimiter | None): Per-symbol and per-side rate limits
+            reserved_tokens (float): Session tokens kept for cancels and modifies of sent orders
+            sessions (list | None): Further (start, end) trading sessions in the same day
+            metrics (MetricsRegistry | None): Registry every component reports to, see scripts/metrics.py
+            request_log_path (str | None): Write-ahead log of the order requests. Orders pending in it
+                are put back in the queue on startup. None keeps pending orders in memory only.
+            snapshot_interval (float | None): Seconds between snapshots of the request log, which
+                bounds how much of it has to be replayed on startup
+            response_store_path (str | None): Memory-mapped ack store indexed by order ID, see
+                ResponseHandler.find_responses
+            max_responses (int | None): Response records kept in memory, older ones are rolled
+                up per minute and symbol. None keeps every response of the session in memory.
+            max_response_age (float | None): Seconds a response record is kept in memory
         """
-        self.start_time = start_time
-        self.end_time = end_time
-        self.order_queue = OrderQueue()
-        self.order_processor = OrderProcessor(order_rate_limit, self.order_queue)
-        self.response_handler = ResponseHandler(self.order_queue, storage_path=response_storage_path)
+        self._start_time = start_time
+        self._end_time = end_time
+        self.sessions = list(sessions or ())
+        self.metrics = metrics if metrics is not None else MetricsRegistry()
+        rejected = self.metrics.counter("oms_rejected_total", "Order requests rejected by the OMS", ("reason",))
+        self._rejected_window = rejected.labels("outside_window")
+        self._rejected_busy = rejected.labels("busy")
+        self.request_log = None
+        if request_log_path is not None:
+            self.request_log = RequestLog(request_log_path, snapshot_interval=snapshot_interval)
+        self.order_queue = ShardedOrderQueue(metrics=self.metrics, request_log=self.request_log)
+        if self.request_log is not None:
+            self.order_queue.restore(self.request_log.pending())
+            self.request_log.start()
+        self.transport = transport if transport is not None else SimulatedTransport()
+        self.order_processor = OrderProcessor(order_rate_limit, self.order_queue, max_in_flight=max_in_flight,
+                                              transport=self.transport, rate_limiter=rate_limiter,
+                                              reserved_tokens=reserved_tokens, metrics=self.metrics)
+        self.response_handler = ResponseHandler(self.order_queue, storage_path=response_storage_path, durability=durability,
+                                                metrics=self.metrics, store_path=response_store_path,
+                                                max_responses=max_responses, max_response_age=max_response_age)
         self.is_logged_on = False
+        self.ingress = IngressExecutor(num_workers=num_workers, queue_depth=ingress_queue_depth)
+        self.transport.start(self.handle_order_response)
+        # Opens and closes the trading window, logging on and off at the boundaries
+        self.session = SessionScheduler(self._schedule(), on_open=self.logon, on_close=self.logout)
+        self.session.start()
+        self.metrics.gauge("oms_session_open", "1 while the trading window is open",
+                           function=lambda: int(self.session.open))
+        self.metrics.gauge("oms_messages_saved", "Exchange messages saved by coalescing amendments",
+                           function=lambda: self.order_queue.coalescing_stats()["messages_saved"])
+        self.metrics.gauge("oms_log_records_dropped", "Log records dropped because the log ring was full",
+                           function=lambda: log.dropped)
 
         # Add thread for order processing
         self.processing_thread = threading.Thread(
@@ -42,52 +97,132 @@ class OrderManagement:
         )
         self.processing_thread.start()
 
+    @property
+    def start_time(self):
+        return self._start_time
+
+    @start_time.setter
+    def start_time(self, value):
+        self._start_time = value
+        self.session.reschedule(self._schedule())
+
+    @property
+    def end_time(self):
+        return self._end_time
+
+    @end_time.setter
+    def end_time(self, value):
+        self._end_time = value
+        self.session.reschedule(self._schedule())
+
+    def _schedule(self):
+        return TradingSchedule([(self._start_time, self._end_time)] + self.sessions)
+
     def is_within_time_window(self):
         """
-        Checks if the current time is within the trading window
+        Checks if the current time is within the trading window. The session
+        scheduler keeps the flag up to date, so this is a single attribute read.
         """
-        current_time = datetime.now().time()
-        return self.start_time <= current_time <= self.end_time
+        return self.session.open
 
     def logon(self):
         if not self.is_logged_on and self.is_within_time_window():
             self.is_logged_on = True
-            # Thread-safe logon
-            threading.Thread(
-                target=lambda: print("Logon message sent to exchange"),
-                daemon=True
-            ).start()
+            self.ingress.submit("session", log.info, "Logon message sent to exchange", block=True)
 
     def logout(self):
         if self.is_logged_on and not self.is_within_time_window():
             self.is_logged_on = False
-            # Thread-safe logout
-            threading.Thread(
-                target=lambda: print("Logout message sent to exchange"),
-                daemon=True
-            ).start()
+            self.ingress.submit("session", log.info, "Logout message sent to exchange", block=True)
 
     def handle_order_request(self, order_request):
         """
-        Handles an order request in a separate thread
+        Queues an order request on the ingress worker owning its order ID
+
+        Returns:
+            Admission: Accepted, or Busy if the request was rejected because
+                the ingress queue is full
         """
         def process_request():
-            if not self.is_within_time_window():
-                print(f"Order {order_request.m_orderId} rejected: Outside time window")
+            if not self.session.open:
+                self._rejected_window.inc()
+                log.warning("Order %d rejected: Outside time window", order_request.m_orderId)
                 return
             else:
                 self.order_queue.handle_request(order_request)
 
-        threading.Thread(target=process_request, daemon=True).start()
+        admission = self.ingress.submit(order_request.m_orderId, process_request)
+        if admission == Admission.Busy:
+            self._rejected_busy.inc()
+            log.warning("Order %d rejected: System busy", order_request.m_orderId)
+        return admission
 
     def handle_order_response(self, response):
         """
-        Handles an order response in a separate thread
+        Queues an order response on the ingress worker owning its order ID,
+        waiting for room if its queue is full. A response arriving after
+        close() shut ingress down is handled on the calling thread instead,
+        so responses are never dropped.
         """
-        threading.Thread(
-            target=lambda: self.response_handler.handle_response(response),
-            daemon=True
-        ).start()
+        admission = self.ingress.submit(
+            response.m_orderId,
+            self.response_handler.handle_response,
+            response,
+            block=True
+        )
+        if admission == Admission.Busy:
+            # Only refused once ingress is shut down, its workers have run everything queued before
+            self.response_handler.handle_response(response)
+        return admission
+
+    def submit_many(self, order_requests):
+        """
+        Applies a batch of order requests on the calling thread: one trading
+        window check for the whole batch and one lock acquisition per symbol
+        shard. Requests for one order ID keep their order within the batch,
+        but are not ordered against requests sent through handle_order_request.
+
+        Returns:
+            list: the RequestOutcome of each request
+        """
+        order_requests = list(order_requests)
+        if not self.session.open:
+            self._rejected_window.inc(len(order_requests))
+            log.warning("Batch of %d orders rejected: Outside time window", len(order_requests))
+            return [RequestOutcome.Rejected] * len(order_requests)
+        return self.order_queue.handle_requests(order_requests)
+
+    def on_responses(self, responses):
+        """
+        Handles a batch of order responses on the calling thread with a
+        single persistence write
+
+        Returns:
+            list: True for each response matched to a pending order, False otherwise
+        """
+        return self.response_handler.handle_responses(list(responses))
+
+    def coalescing_stats(self):
+        """
+        Exchange messages and rate limit tokens saved by coalescing amendments,
+        see OrderQueue.coalescing_stats
+        """
+        return self.order_queue.coalescing_stats()
+
+    def close(self):
+        """
+        Stops order processing and persists every handled response
+        """
+        self.session.stop()
+        self.order_processor.stop()
+        self.processing_thread.join()
+        self.order_processor.close()
+        # Responses to the last sends still go through ingress, so it is shut down after the transport
+        self.transport.close()
+        self.ingress.shutdown()
+        self.response_handler.close()
+        if self.request_log is not None:
+            self.request_log.close()
 
 if __name__ == "__main__":
     import time
@@ -130,12 +265,13 @@ if __name__ == "__main__":
     accept_response = OrderResponse(1001, ResponseType.Accept)
     order_management.handle_order_response(accept_response)
     time.sleep(0.1)  # Wait for response processing
+    order_management.response_handler.flush()
 
     # Verify response storage
     print("\nVerifying stored responses...")
     if storage_path.exists():
         with open(storage_path, 'r') as f:
-            stored_data = json.load(f)
+            stored_data = [json.loads(line) for line in f]
             print(f"Stored responses: {json.dumps(stored_data, indent=2)}")
             
         # Create new system instance to verify loading
@@ -1,56 +1,191 @@
 import time
 import threading
-from queue import Empty
+
+import os, sys
+
+cwd = os.getcwd()
+if cwd.endswith("scripts"):
+    os.chdir("..")
+sys.path.append(os.getcwd())
+
+from scripts.order import RequestType
+from scripts.transport import SimulatedTransport
+from scripts.ingress_executor import IngressExecutor
+from scripts.metrics import MetricsRegistry
+from scripts.logger import log
 
 class OrderProcessor:
     """
     Processes orders from the queue at a rate-limited pace
     """
-    def __init__(self, order_rate_limit, order_queue):
+    def __init__(self, order_rate_limit, order_queue, max_in_flight=64, transport=None, rate_limiter=None,
+                 reserved_tokens=0, max_priority_streak=16, metrics=None):
+        """
+        Args:
+            order_rate_limit (int): Maximum orders per second for the whole session
+            order_queue (OrderQueue | ShardedOrderQueue): Queue to send orders from
+            max_in_flight (int): Maximum number of sends outstanding at once
+            transport (SimulatedTransport | SocketTransport): Carries orders to the
+                exchange, defaults to a SimulatedTransport
+            rate_limiter (HierarchicalRateLimiter | None): Per-symbol and per-side limits
+                applied below the session limit
+            reserved_tokens (float): Session tokens new orders may not use, kept for
+                cancels and modifies
+            max_priority_streak (int): Cancels and modifies sent in a row before a waiting
+                new order goes first regardless of the reservation, so new orders never starve
+            metrics (MetricsRegistry | None): Registry for the processor metrics
+        """
         self.order_rate_limit = order_rate_limit
         self.order_queue = order_queue
         self.tokens = order_rate_limit  # Start with full bucket
         self.max_tokens = order_rate_limit
-        self.last_token_time = time.time()
+        self.last_token_time = time.monotonic()  # Immune to wall clock steps
         self.lock = threading.Lock()
         self.running = True
+        self.max_in_flight = max_in_flight
+        self.transport = transport if transport is not None else SimulatedTransport()
+        self.rate_limiter = rate_limiter
+        self.reserved_tokens = reserved_tokens
+        self.max_priority_streak = max_priority_streak
+        self.priority_streak = 0
+        self.in_flight = 0
+        self.metrics = metrics if metrics is not None else MetricsRegistry()
+        sent = self.metrics.counter("oms_messages_sent_total", "Messages handed to the transport", ("type",))
+        self._sent_by_type = {request_type: sent.labels(request_type.name) for request_type in RequestType}
+        self._send_errors = self.metrics.counter("oms_send_errors_total", "Sends that raised").labels()
+        # Sampled at snapshot time, nothing to update on the hot path
+        self.metrics.gauge("oms_queue_depth", "Messages waiting in the order queue", function=lambda: len(self.order_queue))
+        self.metrics.gauge("oms_tokens", "Session rate limit tokens left", function=lambda: self._tokens)
+        self.metrics.gauge("oms_in_flight", "Sends outstanding", function=lambda: self.in_flight)
+        # One sender thread per window slot, keyed on the order ID so a cancel or modify
+        # is always sent after the New (or earlier amendment) it was popped after
+        self.sender = IngressExecutor(num_workers=max_in_flight, queue_depth=max_in_flight)
+
+    @property
+    def tokens(self):
+        """Current token level. The processor only wakes up when it has work,
+        so the bucket is refilled lazily whenever it is read."""
+        self.refill_tokens()
+        return self._tokens
+
+    @tokens.setter
+    def tokens(self, value):
+        self._tokens = value
 
     def refill_tokens(self):
         """Refill tokens based on elapsed time"""
-        now = time.time()
+        now = time.monotonic()
         time_passed = now - self.last_token_time
         new_tokens = time_passed * self.order_rate_limit
-        self.tokens = min(self.tokens + new_tokens, self.max_tokens)
+        self._tokens = min(self._tokens + new_tokens, self.max_tokens)
         self.last_token_time = now
 
+    def time_until_token(self):
+        """Seconds until the bucket holds at least one token"""
+        return max(0.0, (1 - self._tokens) / self.order_rate_limit)
+
     def process_queue(self):
-        """Process orders from the queue at the rate limit"""
+        """
+        Process orders from the queue at the rate limit.
+
+        Each wakeup takes as many orders as there are session tokens and free
+        window slots, cancels and modifies first and new orders only out of the
+        unreserved tokens, passing over symbols the rate limiter refuses, then
+        hands them to the sender pool outside the lock. Messages for one order
+        ID go out in the order they were popped. With orders left over,
+        the loop sleeps until the next token is due, or until a send completes
+        if the window is full. With an empty queue it blocks until an order is
+        queued.
+        """
+        # This thread is the only one counting sends, so it updates its counter cells directly
+        sent_by_type = {request_type: counter.cell() for request_type, counter in self._sent_by_type.items()}
         while self.running:
             try:
-                # Check if we have tokens available
+                # Clear before looking at the queue so a concurrent enqueue is never missed
+                self.order_queue.ready.clear()
+                batch = []
+                blocked = []  # Waits of the rate-limited symbols passed over
+                admit = None
+                if self.rate_limiter is not None:
+                    now = time.monotonic()
+
+                    def admit(order):
+                        wait = self.rate_limiter.acquire(order, now)
+                        if wait:
+                            blocked.append(wait)
+                        return not wait
+
+                refused = False
+                held_back = False
                 with self.lock:
                     self.refill_tokens()
-                    if self.tokens >= 1 and len(self.order_queue.queue) > 0:
-                        order = self.order_queue.queue.popleft()
-                        self.tokens -= 1
-                        self.send(order)
-                    
-                # Sleep briefly to prevent busy-waiting
-                time.sleep(0.1)
-                    
-            except Empty:
-                # No orders in queue, wait briefly
-                time.sleep(0.1)
+                    while self._tokens >= 1 and self.in_flight < self.max_in_flight:
+                        prefer_new = self.priority_streak >= self.max_priority_streak
+                        allow_new = prefer_new or self._tokens >= 1 + self.reserved_tokens
+                        order = self.order_queue.pop(admit, allow_new, prefer_new)
+                        if order is None:
+                            refused = bool(blocked)
+                            held_back = not allow_new
+                            break
+                        if order.request_type == RequestType.New:
+                            self.priority_streak = 0
+                        else:
+                            self.priority_streak += 1
+                        self._tokens -= 1
+                        self.in_flight += 1
+                        batch.append(order)
+                    backlog = len(self.order_queue) > 0
+                    window_full = self.in_flight >= self.max_in_flight
+                    delay = self.time_until_token()
+                    if held_back:
+                        # Only new orders are left and the reserve is not free for them
+                        delay = max(delay, (1 + self.reserved_tokens - self._tokens) / self.order_rate_limit)
+                    if refused:
+                        # Only rate-limited symbols are left
+                        delay = max(delay, min(blocked))
+
+                request_log = self.order_queue.request_log
+                if batch and request_log is not None:
+                    request_log.commit()  # One write for the batch, before any of it goes out
+
+                for order in batch:
+                    sent_by_type[order.request_type].inc()
+                    self.sender.submit(order.m_orderId, self._send, order, block=True)
+
+                if backlog and not window_full:
+                    # Until the next token is due, or earlier if an order for
+                    # another symbol is queued
+                    self.order_queue.ready.wait(delay)
+                else:
+                    # Woken by the next enqueue or by a send freeing its window slot
+                    self.order_queue.ready.wait()
+
             except Exception as e:
-                print(f"Error processing order: {e}")
+                log.error("Error processing order: %s", e)
                 time.sleep(0.1)
 
+    def _send(self, order):
+        """Runs on a sender thread: sends the order and frees its window slot"""
+        try:
+            self.send(order)
+        except Exception as e:
+            self._send_errors.inc()
+            log.error("Error sending order: %s", e)
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+            self.order_queue.ready.set()
+
     def send(self, order):
-        """Simulate sending order to exchange"""
-        print(f"Sending order {order.m_orderId} to exchange")
-        # Simulate network delay
-        time.sleep(0.05)
+        """Send an order to the exchange through the transport"""
+        self.transport.send(order)
 
     def stop(self):
         """Stop the processor"""
         self.running = False
+        self.order_queue.ready.set()  # Wake the loop if it is waiting for orders
+
+    def close(self):
+        """Stop the processor and wait for outstanding sends"""
+        self.stop()
+        self.sender.shutdown()
@@ -1,4 +1,6 @@
-from collections import deque
+import threading
+import time
+from enum import Enum
 import os, sys
 
 cwd = os.getcwd()
@@ -6,33 +8,288 @@ if cwd.endswith("scripts"):
     os.chdir("..")
 sys.path.append(os.getcwd())
 
-from scripts.order import RequestType
+from scripts.order import OrderRequest, RequestType
+from scripts.order_list import OrderList
+from scripts.metrics import MetricsRegistry
+from scripts.logger import log
+
+_order_log = log.sampled("orders")  # Order lifecycle lines, one per request
+
+class RequestOutcome(Enum):
+    Added = 1
+    Modified = 2
+    Canceled = 3
+    Ignored = 4     # New for an order ID that is already known
+    Rejected = 5    # Outside the trading window
 
 class OrderQueue:
     """
-    Represents the order queue
+    Represents the order queue.
+
+    Messages wait in three lanes: cancels, then modifies, then new orders.
+    Modifies and cancels for a queued order are applied to it in place;
+    only those for an order that was already sent become exchange messages
+    of their own, queued in the cancel or modify lane ahead of every new
+    order.
     """
-    def __init__(self):
-        self.orders = {}
-        self.queue = deque()
+    def __init__(self, orders=None, ready=None, activations=None, urgent_activations=None, metrics=None,
+                 request_log=None):
+        """
+        Args:
+            orders (dict): Order ID index, shared between the shards of a ShardedOrderQueue
+            ready (threading.Event): Event set on every enqueue, shared between shards
+            activations (deque): When given, the queue appends itself here each time it
+                goes from empty to non-empty so a ShardedOrderQueue can schedule it
+            urgent_activations (deque): When given, the queue appends itself here each time
+                its cancel and modify lanes go from empty to non-empty
+            metrics (MetricsRegistry | None): Registry for the queue metrics, shared between shards
+            request_log (RequestLog | None): Write-ahead log every applied request and every
+                message sent is recorded in, shared between shards
+        """
+        self.orders = {} if orders is None else orders
+        self.queue = OrderList()  # New orders. O(1) append, popleft and removal of any queued order
+        self.cancels = OrderList()  # Cancels of sent orders
+        self.modifies = OrderList()  # Modifies of sent orders
+        self.lock = threading.Lock()  # Guards the queue links
+        # Set whenever an order is queued so the processor can sleep while idle
+        self.ready = threading.Event() if ready is None else ready
+        self.activations = activations
+        self.urgent_activations = urgent_activations
+        self.scheduled = False
+        self.urgent = False
+        self.pending_modifies = {}  # Order ID -> its modify message still in the modify lane
+        self.request_log = request_log
+        # Exchange messages that never had to be sent, see coalescing_stats
+        self.modifies_in_place = 0
+        self.modifies_merged = 0
+        self.modifies_dropped = 0
+        self.cancels_annihilated = 0
+        metrics = metrics if metrics is not None else MetricsRegistry()
+        requests = metrics.counter("oms_requests_total", "Order requests applied to the queue", ("type",))
+        self._requests_by_type = {request_type: requests.labels(request_type.name) for request_type in RequestType}
+        self._time_in_queue = metrics.histogram(
+            "oms_time_in_queue_seconds", "Time from request creation until it leaves the queue for the exchange").labels()
 
     def __len__(self):
         """
-        Returns the number of orders in the queue.
+        Returns the number of messages in the queue, over all lanes.
+        """
+        return len(self.queue) + len(self.cancels) + len(self.modifies)
+
+    def pop(self, admit=None, allow_new=True, prefer_new=False):
+        """
+        Removes and returns the next message to send, or None if the queue is
+        empty or admit refused it. See pop_scheduled.
+        """
+        return self.pop_scheduled(admit, allow_new, prefer_new)[0]
+
+    def pop_scheduled(self, admit=None, allow_new=True, prefer_new=False):
+        """
+        Pops the next message and reports whether the queue still has messages,
+        atomically with respect to producers. Cancels go first, then modifies,
+        then new orders. Its sent record is only staged in the request log,
+        the caller commits the log before handing the message to the exchange.
+
+        params:
+            admit: optional predicate called with the message about to be popped;
+                when it returns False the message stays queued and nothing is popped
+            allow_new: whether the new order lane may be popped
+            prefer_new: pop a new order ahead of cancels and modifies, if there is one
+
+        returns:
+            tuple: (message or None, True if the queue stays scheduled)
+        """
+        with self.lock:
+            if allow_new and prefer_new and self.queue.head is not None:
+                lane = self.queue
+            elif self.cancels.head is not None:
+                lane = self.cancels
+            elif self.modifies.head is not None:
+                lane = self.modifies
+            elif allow_new:
+                lane = self.queue
+            else:
+                lane = None
+            order = lane.head if lane is not None else None
+            if order is not None:
+                if admit is not None and not admit(order):
+                    return None, self.scheduled
+                lane.remove(order)
+                if lane is self.modifies:
+                    del self.pending_modifies[order.m_orderId]
+                if self.request_log is not None:
+                    self.request_log.sent(order)
+            if self.queue.head is None and self.cancels.head is None and self.modifies.head is None:
+                self.scheduled = False
+            scheduled = self.scheduled
+        if order is not None:
+            self._time_in_queue.observe((time.perf_counter_ns() - order.timestamp_ns) / 1e9)
+        return order, scheduled
+
+    def pop_urgent(self, admit=None):
         """
-        return len(self.queue)
+        Pops the next cancel or modify only, see pop_scheduled
+
+        returns:
+            tuple: (message or None, True if cancels or modifies remain)
+        """
+        with self.lock:
+            lane = self.cancels if self.cancels.head is not None else self.modifies
+            order = lane.head
+            if order is not None:
+                if admit is not None and not admit(order):
+                    return None, True
+                lane.remove(order)
+                if lane is self.modifies:
+                    del self.pending_modifies[order.m_orderId]
+                if self.request_log is not None:
+                    self.request_log.sent(order)
+            if self.cancels.head is None and self.modifies.head is None:
+                self.urgent = False
+            urgent = self.urgent
+        if order is not None:
+            self._time_in_queue.observe((time.perf_counter_ns() - order.timestamp_ns) / 1e9)
+        return order, urgent
+
+    def _schedule(self, urgent=False):
+        """Registers the queue with its ShardedOrderQueue, the caller holds the lock"""
+        if self.activations is not None and not self.scheduled:
+            self.scheduled = True
+            self.activations.append(self)
+        if urgent and self.urgent_activations is not None and not self.urgent:
+            self.urgent = True
+            self.urgent_activations.append(self)
+
+    def _modify(self, order, modify_request):
+        """
+        Applies a modify, the caller holds the lock
+
+        returns:
+            bool: True if a modify message was queued for the exchange
+        """
+        order.m_price = modify_request.m_price
+        order.m_qty = modify_request.m_qty
+        if order in self.queue:
+            self.modifies_in_place += 1
+            return False  # Still queued, goes out with the new values
+        pending = self.pending_modifies.get(modify_request.m_orderId)
+        if pending is not None:
+            # The previous modify has not been sent yet, it carries the latest values instead
+            pending.m_price = modify_request.m_price
+            pending.m_qty = modify_request.m_qty
+            self.modifies_merged += 1
+            return False
+        self.modifies.append(modify_request)
+        self.pending_modifies[modify_request.m_orderId] = modify_request
+        self._schedule(urgent=True)
+        return True
+
+    def _cancel(self, order, cancel_request):
+        """
+        Applies a cancel, the caller holds the lock
+
+        returns:
+            bool: True if a cancel message was queued for the exchange
+        """
+        self.orders.pop(cancel_request.m_orderId, None)
+        if order in self.queue:
+            # Still queued, neither the order nor the cancel reaches the exchange
+            self.queue.remove(order)
+            self.cancels_annihilated += 1
+            return False
+        pending = self.pending_modifies.pop(cancel_request.m_orderId, None)
+        if pending is not None:
+            # A modify of an order about to be canceled is pointless
+            self.modifies.remove(pending)
+            self.modifies_dropped += 1
+        self.cancels.append(cancel_request)
+        self._schedule(urgent=True)
+        return True
+
+    def coalescing_stats(self):
+        """
+        Counts of amendments that were absorbed instead of becoming exchange
+        messages. Every message that is not sent also saves its rate limit token.
+
+        returns:
+            dict: modifies_in_place (applied to a still-queued order), modifies_merged
+                (folded into a modify not sent yet), modifies_dropped (superseded by a
+                cancel), cancels_annihilated (canceled before the order was sent, saving
+                both messages), messages_saved and tokens_saved
+        """
+        with self.lock:
+            stats = {
+                "modifies_in_place": self.modifies_in_place,
+                "modifies_merged": self.modifies_merged,
+                "modifies_dropped": self.modifies_dropped,
+                "cancels_annihilated": self.cancels_annihilated,
+            }
+        stats["messages_saved"] = (stats["modifies_in_place"] + stats["modifies_merged"]
+                                   + stats["modifies_dropped"] + 2 * stats["cancels_annihilated"])
+        stats["tokens_saved"] = stats["messages_saved"]
+        return stats
 
     def handle_request(self, order_request):
         """
-        Handles an order request
+        Handles an order request. The order is looked up and the request applied
+        under one lock acquisition, so an ack removing the order in between
+        cannot break a modify or cancel.
+
+        returns:
+            RequestOutcome: what the request did
+        """
+        return self.handle_requests((order_request,))[0]
+
+    def handle_requests(self, order_requests):
         """
-        if order_request.m_orderId in self.orders:
-            if order_request.request_type == RequestType.Modify:
-                self.modify_order(order_request)
-            elif order_request.request_type == RequestType.Cancel:
-                self.cancel_order(order_request)
-        else:
-            self.add_order(order_request)
+        Handles a batch of order requests under a single lock acquisition,
+        with the same semantics as calling handle_request on each in turn
+
+        params:
+            order_requests: sequence of order requests
+
+        returns:
+            list: the RequestOutcome of each request
+        """
+        queued = False
+        with self.lock:
+            outcomes = []
+            for order_request in order_requests:
+                outcome, sent = self._apply(order_request)
+                outcomes.append(outcome)
+                queued = queued or sent
+            if self.request_log is not None:
+                self.request_log.applied(outcomes, order_requests)
+        if self.request_log is not None:
+            self.request_log.commit()  # Outside the lock, other shards go on meanwhile
+        if queued:
+            self.ready.set()
+        return outcomes
+
+    def _apply(self, order_request):
+        """
+        Applies one request of a batch, the caller holds the lock
+
+        returns:
+            tuple: (RequestOutcome, True if a message was queued)
+        """
+        self._requests_by_type[order_request.request_type].inc()
+        order = self.orders.get(order_request.m_orderId)
+        if order is None:
+            self.queue.append(order_request)
+            self._schedule()
+            self.orders[order_request.m_orderId] = order_request
+            _order_log.info("Order %d added to queue.", order_request.m_orderId)
+            return RequestOutcome.Added, True
+        if order_request.request_type == RequestType.Modify:
+            queued = self._modify(order, order_request)
+            _order_log.info("Order %d modified.", order_request.m_orderId)
+            return RequestOutcome.Modified, queued
+        if order_request.request_type == RequestType.Cancel:
+            queued = self._cancel(order, order_request)
+            _order_log.info("Order %d canceled.", order_request.m_orderId)
+            return RequestOutcome.Canceled, queued
+        return RequestOutcome.Ignored, False
 
     def add_order(self, order_request):
         """
@@ -41,34 +298,84 @@ class OrderQueue:
         params:
             order_request: the order request to add
         """
-        self.queue.append(order_request)
-        self.orders[order_request.m_orderId] = order_request
-        print(f"Order {order_request.m_orderId} added to queue.")
+        self._requests_by_type[order_request.request_type].inc()
+        with self.lock:
+            # Indexed before the processor can see it, so its ack always finds it
+            self.orders[order_request.m_orderId] = order_request
+            self.queue.append(order_request)
+            self._schedule()
+            if self.request_log is not None:
+                self.request_log.applied((RequestOutcome.Added,), (order_request,))
+        if self.request_log is not None:
+            self.request_log.commit()
+        self.ready.set()
+        _order_log.info("Order %d added to queue.", order_request.m_orderId)
 
     def modify_order(self, modify_request):
         """
-        modify an order in the queue through the dict
+        modify an order through the dict, in place if it is still queued
+        and through the modify lane if it was already sent
         
         params:
             modify_request: the modify request to process
         """
-        order = self.orders[modify_request.m_orderId]
-        order.m_price = modify_request.m_price
-        order.m_qty = modify_request.m_qty
-        print(f"Order {modify_request.m_orderId} modified.")
+        self._requests_by_type[RequestType.Modify].inc()
+        with self.lock:
+            order = self.orders.get(modify_request.m_orderId)
+            if order is None:
+                return  # Acked or canceled meanwhile
+            queued = self._modify(order, modify_request)
+            if self.request_log is not None:
+                self.request_log.applied((RequestOutcome.Modified,), (modify_request,))
+        if self.request_log is not None:
+            self.request_log.commit()
+        if queued:
+            self.ready.set()
+        _order_log.info("Order %d modified.", modify_request.m_orderId)
 
     def cancel_order(self, cancel_request):
         """Cancel an existing order"""
-        if cancel_request.m_orderId in self.orders:
-            # Remove from orders dictionary
-            order = self.orders[cancel_request.m_orderId]
-            del self.orders[cancel_request.m_orderId]
-            
-            # Try to remove from queue if it's still there
-            try:
-                self.queue.remove(order)
-            except ValueError:
-                # Order might have already been processed/removed from queue
-                pass
-            
-            print(f"Order {cancel_request.m_orderId} canceled.")
+        self._requests_by_type[RequestType.Cancel].inc()
+        with self.lock:
+            order = self.orders.get(cancel_request.m_orderId)
+            if order is None:
+                return  # Acked or canceled meanwhile
+            # Unlinked if it's still queued, sent through the cancel lane if it was already sent
+            queued = self._cancel(order, cancel_request)
+            if self.request_log is not None:
+                self.request_log.applied((RequestOutcome.Canceled,), (cancel_request,))
+        if self.request_log is not None:
+            self.request_log.commit()
+        if queued:
+            self.ready.set()
+        _order_log.info("Order %d canceled.", cancel_request.m_orderId)
+
+    def restore(self, orders):
+        """
+        Puts orders recovered from a RequestLog back in place, without logging them again
+
+        params:
+            orders: OrderRequest objects from RequestLog.pending, each with request_type
+                set to the message it still has to send
+        """
+        with self.lock:
+            for order in orders:
+                pending = order.request_type
+                fields = (order.m_symbolId, order.m_price, order.m_qty, order.m_side, order.m_orderId)
+                if pending == RequestType.Cancel:
+                    # The order itself already left the index when it was canceled
+                    self.cancels.append(OrderRequest(*fields, RequestType.Cancel))
+                    self._schedule(urgent=True)
+                    continue
+                order.request_type = RequestType.New
+                self.orders[order.m_orderId] = order
+                if pending == RequestType.New:
+                    self.queue.append(order)
+                    self._schedule()
+                elif pending == RequestType.Modify:
+                    modify = OrderRequest(*fields, RequestType.Modify)
+                    self.modifies.append(modify)
+                    self.pending_modifies[order.m_orderId] = modify
+                    self._schedule(urgent=True)
+        if len(self):
+            self.ready.set()
@@ -0,0 +1,144 @@
+from array import array
+import struct
+
+import os, sys
+
+cwd = os.getcwd()
+if cwd.endswith("scripts"):
+    os.chdir("..")
+sys.path.append(os.getcwd())
+
+from scripts.order import OrderRequest, SIDES, SIDE_CODES, REQUEST_TYPES, PRICE_SCALE
+
+class PendingOrderStore:
+    """
+    Struct-of-arrays store for pending orders.
+
+    Every field lives in its own typed array column indexed by slot, with the
+    side and request type kept as small integer codes and the price as a
+    scaled integer. Freed slots are reused, so the columns only ever grow to
+    the peak number of pending orders. Costs a few dozen bytes per order
+    instead of a full Python object.
+    """
+    COLUMNS = ("order_ids", "symbol_ids", "prices", "qtys", "sides", "request_types", "timestamps_ns")
+
+    def __init__(self):
+        self.index = {}  # order ID -> slot, in the order the orders were added
+        self.free_slots = array('q')
+        self.order_ids = array('q')
+        self.symbol_ids = array('q')
+        self.prices = array('q')
+        self.qtys = array('q')
+        self.sides = array('b')
+        self.request_types = array('b')
+        self.timestamps_ns = array('q')
+
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, order_id):
+        return order_id in self.index
+
+    def add(self, order):
+        """
+        Store an order, returning its slot
+        """
+        if order.m_orderId in self.index:
+            raise KeyError(f"Order {order.m_orderId} is already stored")
+        price = round(order.m_price * PRICE_SCALE)
+        side = SIDE_CODES[order.m_side]
+        request_type = order.request_type.value
+        if self.free_slots:
+            slot = self.free_slots.pop()
+            self.order_ids[slot] = order.m_orderId
+            self.symbol_ids[slot] = order.m_symbolId
+            self.prices[slot] = price
+            self.qtys[slot] = order.m_qty
+            self.sides[slot] = side
+            self.request_types[slot] = request_type
+            self.timestamps_ns[slot] = order.timestamp_ns
+        else:
+            slot = len(self.order_ids)
+            self.order_ids.append(order.m_orderId)
+            self.symbol_ids.append(order.m_symbolId)
+            self.prices.append(price)
+            self.qtys.append(order.m_qty)
+            self.sides.append(side)
+            self.request_types.append(request_type)
+            self.timestamps_ns.append(order.timestamp_ns)
+        self.index[order.m_orderId] = slot
+        return slot
+
+    def modify(self, order_id, price, qty):
+        """Update the price and quantity of a stored order"""
+        slot = self.index[order_id]
+        self.prices[slot] = round(price * PRICE_SCALE)
+        self.qtys[slot] = qty
+
+    def remove(self, order_id):
+        """Drop an order, making its slot available for reuse"""
+        self.free_slots.append(self.index.pop(order_id))
+
+    def get(self, order_id):
+        """
+        Materialize a stored order as an OrderRequest, or None if unknown
+        """
+        slot = self.index.get(order_id)
+        if slot is None:
+            return None
+        order = OrderRequest(
+            m_symbolId=self.symbol_ids[slot],
+            m_price=self.prices[slot] / PRICE_SCALE,
+            m_qty=self.qtys[slot],
+            m_side=SIDES[self.sides[slot]],
+            m_orderId=order_id,
+            request_type=REQUEST_TYPES[self.request_types[slot]]
+        )
+        order.timestamp_ns = self.timestamps_ns[slot]
+        return order
+
+    def request_type(self, order_id):
+        """Request type of a stored order, None if unknown"""
+        slot = self.index.get(order_id)
+        return None if slot is None else REQUEST_TYPES[self.request_types[slot]]
+
+    def set_request_type(self, order_id, request_type):
+        self.request_types[self.index[order_id]] = request_type.value
+
+    def copy(self):
+        """Independent copy of the store, the columns are copied in bulk"""
+        store = PendingOrderStore()
+        store.index = self.index.copy()
+        for name in self.COLUMNS + ("free_slots",):
+            setattr(store, name, array(getattr(self, name).typecode, getattr(self, name)))
+        return store
+
+    def dump(self, f):
+        """
+        Write the stored orders to a binary file in the order they were added,
+        compacting away the free slots. Read back with load.
+        """
+        slots = array('q', self.index.values())
+        f.write(_STORE_HEADER.pack(_STORE_MAGIC, len(slots)))
+        for name in self.COLUMNS:
+            column = getattr(self, name)
+            f.write(array(column.typecode, [column[slot] for slot in slots]).tobytes())
+
+    @classmethod
+    def load(cls, f):
+        """Read a store written by dump"""
+        magic, count = _STORE_HEADER.unpack(f.read(_STORE_HEADER.size))
+        if magic != _STORE_MAGIC:
+            raise ValueError("Not a pending order store dump")
+        store = cls()
+        for name in cls.COLUMNS:
+            column = getattr(store, name)
+            data = f.read(count * column.itemsize)
+            if len(data) != count * column.itemsize:
+                raise ValueError("Truncated pending order store dump")
+            column.frombytes(data)
+        store.index = dict(zip(store.order_ids, range(count)))
+        return store
+
+_STORE_MAGIC = b'POSTORE1'
+_STORE_HEADER = struct.Struct('<8sq')
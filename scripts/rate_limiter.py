@@ -0,0 +1,93 @@
+class TokenBucket:
+    """
+    Token bucket refilled lazily from the time passed in by the caller, so
+    checking it is O(1) and nothing has to tick while it is idle.
+    """
+    __slots__ = ("rate", "capacity", "tokens", "last_refill")
+
+    def __init__(self, rate, capacity=None, now=0.0):
+        """
+        Args:
+            rate (float): Tokens added per second
+            capacity (float | None): Maximum burst, defaults to one second worth of tokens
+            now (float): Current time, the bucket starts full
+        """
+        self.rate = rate
+        self.capacity = rate if capacity is None else capacity
+        self.tokens = self.capacity
+        self.last_refill = now
+
+    def refill(self, now):
+        """Add the tokens earned since the last refill"""
+        if now > self.last_refill:
+            self.tokens = min(self.tokens + (now - self.last_refill) * self.rate, self.capacity)
+            self.last_refill = now
+
+    def time_until_token(self):
+        """Seconds until the bucket holds at least one token, as of the last refill"""
+        return max(0.0, (1 - self.tokens) / self.rate)
+
+
+class HierarchicalRateLimiter:
+    """
+    Per-symbol and optionally per-side rate limits, checked below the
+    session-wide bucket of the OrderProcessor.
+
+    Buckets are created the first time a symbol (or symbol and side) is
+    seen. An order is admitted only if every level it belongs to has a
+    token, and then takes one from each, so a refusal never leaks tokens.
+    """
+    def __init__(self, symbol_rate=None, side_rate=None, symbol_rates=None):
+        """
+        Args:
+            symbol_rate (float | None): Default orders per second per symbol, None for no limit
+            side_rate (float | None): Orders per second per symbol and side, None for no limit
+            symbol_rates (dict | None): Per-symbol overrides of symbol_rate, {symbol_id: rate}
+        """
+        self.symbol_rate = symbol_rate
+        self.side_rate = side_rate
+        self.symbol_rates = symbol_rates or {}
+        self.symbol_buckets = {}
+        self.side_buckets = {}
+        self.refused = 0
+
+    def _buckets(self, order, now):
+        buckets = []
+        rate = self.symbol_rates.get(order.m_symbolId, self.symbol_rate)
+        if rate is not None:
+            bucket = self.symbol_buckets.get(order.m_symbolId)
+            if bucket is None:
+                bucket = self.symbol_buckets[order.m_symbolId] = TokenBucket(rate, now=now)
+            buckets.append(bucket)
+        if self.side_rate is not None:
+            key = (order.m_symbolId, order.m_side)
+            bucket = self.side_buckets.get(key)
+            if bucket is None:
+                bucket = self.side_buckets[key] = TokenBucket(self.side_rate, now=now)
+            buckets.append(bucket)
+        return buckets
+
+    def acquire(self, order, now):
+        """
+        Take a token for the order from every level it belongs to
+
+        params:
+            order: the order about to be sent
+            now: current time.monotonic(), on the same clock as every other call
+
+        returns:
+            float: 0.0 if admitted, otherwise seconds until its most limiting
+                bucket has a token again
+        """
+        buckets = self._buckets(order, now)
+        wait = 0.0
+        for bucket in buckets:
+            bucket.refill(now)
+            if bucket.tokens < 1:
+                wait = max(wait, bucket.time_until_token())
+        if wait:
+            self.refused += 1
+            return wait
+        for bucket in buckets:
+            bucket.tokens -= 1
+        return 0.0
@@ -0,0 +1,238 @@
+"""
+Write-ahead log of the requests applied to the order queue, with periodic
+snapshots of the pending state, so a restarted OMS gets its orders back.
+
+Every accepted New, Modify and Cancel, every message handed to the exchange
+and every acked order is appended to a Journal before it is acknowledged,
+sent or forgotten. The order queue stages the records under its shard lock,
+which keeps them in order for each order, and commits them after releasing
+it, so the shards never wait on one another or on the journal.
+The log keeps a columnar PendingOrderStore of the orders it describes,
+together with the message each one still has to send, and a snapshot
+writes that store out in bulk and drops the journal segments it covers.
+Recovery loads the latest snapshot and replays only the journal written
+after it, so it takes time proportional to the snapshot interval rather
+than to the length of the session.
+"""
+
+import struct
+import threading
+import time
+from collections import deque
+from pathlib import Path
+
+import os, sys
+
+cwd = os.getcwd()
+if cwd.endswith("scripts"):
+    os.chdir("..")
+sys.path.append(os.getcwd())
+
+from scripts.journal import Journal
+from scripts.order import OrderRequest, RequestType
+from scripts.order_queue import RequestOutcome
+from scripts.order_store import PendingOrderStore
+from scripts.logger import log
+
+_SNAPSHOT_MAGIC = b'REQSNAP1'
+_SNAPSHOT_HEADER = struct.Struct('<8sq')  # Magic, newest journal segment the snapshot covers
+
+class RequestLog:
+    """
+    Write-ahead request log and snapshots, see the module docstring.
+
+    Every record has an "op" and the order "id":
+        N  new order queued, with "sym", "px", "qty" and "side"
+        M  modify applied, with "px" and "qty"
+        C  cancel applied
+        S  message sent to the exchange, with its request "type" value
+        D  order acked, nothing left to do
+    """
+    def __init__(self, path, snapshot_interval=60.0, segment_size=64 * 1024 * 1024, fsync_interval=None):
+        """
+        Open the log and recover the pending state it holds
+
+        Args:
+            path (str | Path): Path of the active journal segment, the snapshot is kept next to it
+            snapshot_interval (float | None): Seconds between snapshots once started, None for
+                snapshots on close only
+            segment_size (int): Rotate journal segments past this many bytes
+            fsync_interval (float | None): Journal group-commit window, see Journal
+        """
+        self.path = Path(path)
+        self.snapshot_path = self.path.with_name(self.path.name + ".snapshot")
+        self.snapshot_interval = snapshot_interval
+        self.lock = threading.Lock()  # Keeps the store in step with the journal
+        self.staged = deque()  # Records waiting for the next commit, appended without a lock
+        self.snapshot_lock = threading.Lock()
+        self.store, self.snapshot_index = self._load_snapshot()
+        self.journal = Journal(self.path, segment_size=segment_size, fsync_interval=fsync_interval)
+        # Segments sealed before the snapshot are covered by it, new ones must be numbered past it
+        self.journal.remove_sealed(self.snapshot_index)
+        self.journal.next_index = max(self.journal.next_index, self.snapshot_index + 1)
+        self.replayed = 0
+        for record in self.journal.replay(after=self.snapshot_index):
+            self._apply(record)
+            self.replayed += 1
+        self.snapshots_taken = 0
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def _load_snapshot(self):
+        if not self.snapshot_path.exists():
+            return PendingOrderStore(), 0
+        with open(self.snapshot_path, 'rb') as f:
+            magic, index = _SNAPSHOT_HEADER.unpack(f.read(_SNAPSHOT_HEADER.size))
+            if magic != _SNAPSHOT_MAGIC:
+                raise ValueError(f"{self.snapshot_path} is not a request log snapshot")
+            return PendingOrderStore.load(f), index
+
+    def __len__(self):
+        return len(self.store)
+
+    def _apply(self, record):
+        """Applies a record to the store, the caller holds the lock or has not shared the log yet"""
+        op, order_id = record["op"], record["id"]
+        store = self.store
+        if op == "N":
+            if order_id not in store:
+                store.add(OrderRequest(record["sym"], record["px"], record["qty"], record["side"], order_id))
+            return
+        pending = store.request_type(order_id)
+        if pending is None:
+            return
+        if op == "M":
+            store.modify(order_id, record["px"], record["qty"])
+            if pending == RequestType.Unknown:
+                store.set_request_type(order_id, RequestType.Modify)
+        elif op == "C":
+            if pending == RequestType.New:
+                store.remove(order_id)  # Never reached the exchange
+            else:
+                store.set_request_type(order_id, RequestType.Cancel)
+        elif op == "S":
+            if record["type"] == RequestType.Cancel.value:
+                store.remove(order_id)
+            else:
+                store.set_request_type(order_id, RequestType.Unknown)
+        elif op == "D":
+            store.remove(order_id)
+
+    def commit(self):
+        """
+        Write the staged records to the journal with a single write. Returns
+        once every record staged before the call is written, by this call or
+        by a concurrent one that took it first, so the lock is taken even
+        when nothing seems staged.
+        """
+        with self.lock:
+            self._write_staged()
+
+    def _write_staged(self):
+        """The caller holds the lock"""
+        staged = self.staged
+        records = []
+        try:
+            while True:
+                records.append(staged.popleft())
+        except IndexError:
+            pass
+        if records:
+            self.journal.append_many(records)
+            for record in records:
+                self._apply(record)
+
+    def applied(self, outcomes, requests):
+        """
+        Stage a batch of requests applied to the queue, written by the next commit.
+        Called under the queue shard lock, so it only builds and queues the records.
+
+        params:
+            outcomes: the RequestOutcome of each request
+            requests: the requests, in the order they were applied
+        """
+        records = []
+        for outcome, request in zip(outcomes, requests):
+            if outcome == RequestOutcome.Added:
+                records.append({"op": "N", "id": request.m_orderId, "sym": request.m_symbolId,
+                                "px": request.m_price, "qty": request.m_qty, "side": request.m_side})
+            elif outcome == RequestOutcome.Modified:
+                records.append({"op": "M", "id": request.m_orderId, "px": request.m_price, "qty": request.m_qty})
+            elif outcome == RequestOutcome.Canceled:
+                records.append({"op": "C", "id": request.m_orderId})
+        self.staged.extend(records)
+
+    def sent(self, message):
+        """Stage a message leaving the queue, the sender commits before it goes out"""
+        self.staged.append({"op": "S", "id": message.m_orderId, "type": message.request_type.value})
+
+    def done(self, order_ids):
+        """Log orders whose response was handled"""
+        self.staged.extend([{"op": "D", "id": order_id} for order_id in order_ids])
+        self.commit()
+
+    def pending(self):
+        """
+        The recovered orders in the order they arrived, each with request_type set
+        to the message it still has to send: New (never sent), Modify, Cancel, or
+        Unknown when it is at the exchange awaiting a response
+
+        returns:
+            list: OrderRequest objects
+        """
+        with self.lock:
+            orders = [self.store.get(order_id) for order_id in self.store.index]
+        now_ns = time.perf_counter_ns()
+        for order in orders:
+            order.timestamp_ns = now_ns  # Timestamps of the previous process mean nothing here
+        return orders
+
+    def snapshot(self):
+        """
+        Write the pending state out and drop the journal segments it covers.
+        The state is copied under the lock, the file is written outside of it.
+
+        returns:
+            int: number of orders in the snapshot
+        """
+        with self.snapshot_lock:
+            with self.lock:
+                self._write_staged()
+                store = self.store.copy()
+                index = self.journal.rotate()
+            temp_path = self.snapshot_path.with_name(self.snapshot_path.name + ".tmp")
+            with open(temp_path, 'wb') as f:
+                f.write(_SNAPSHOT_HEADER.pack(_SNAPSHOT_MAGIC, index))
+                store.dump(f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, self.snapshot_path)
+            self.journal.remove_sealed(index)
+            self.snapshot_index = index
+            self.snapshots_taken += 1
+            return len(store)
+
+    def start(self):
+        """Take a snapshot every snapshot_interval seconds from a daemon thread"""
+        if self.snapshot_interval is not None:
+            self.thread = threading.Thread(target=self._run, daemon=True)
+            self.thread.start()
+        return self
+
+    def _run(self):
+        while not self.stopped.wait(self.snapshot_interval):
+            try:
+                self.snapshot()
+            except OSError as e:
+                log.error("Error writing request log snapshot: %s", e)
+
+    def close(self, snapshot=True):
+        """Stop the snapshot thread, take a last snapshot so a restart replays nothing, close the journal"""
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+        if snapshot:
+            self.snapshot()
+        else:
+            self.commit()
+        self.journal.close()
@@ -0,0 +1,320 @@
+"""
+Post-trade analytics over the response history, computed with NumPy.
+
+The history is read in chunks of columns (order ID, symbol ID, response
+type, latency and timestamp in ns) from any of the formats the OMS has
+written: the response journal and its sealed segments, the original
+single JSON array responses.json, or a ResponseStore data file. Every
+chunk is folded into running totals with vectorized operations, so one
+pass over the data gives:
+- latency percentiles, through the same log-linear buckets as LatencyHistogram
+- the accept / reject ratio
+- throughput per symbol and per time bucket
+- the N slowest acks
+
+Memory is bounded by the chunk size and the number of symbols and time
+buckets, whatever the length of the history.
+
+    python scripts/response_analytics.py responses.json --bucket 60 --worst 10
+"""
+
+import argparse
+import itertools
+import json
+from pathlib import Path
+
+import numpy as np
+
+import os, sys
+
+cwd = os.getcwd()
+if cwd.endswith("scripts"):
+    os.chdir("..")
+sys.path.append(os.getcwd())
+
+from scripts.journal import sealed_segments
+from scripts.latency_histogram import LatencyHistogram
+from scripts.order import ResponseType
+from scripts.response_store import HEADER, MAGIC
+
+COLUMNS = ("order_id", "symbol_id", "response_type", "latency_ns", "timestamp_ns")
+# ResponseStore record layout, see RECORD in scripts/response_store.py
+STORE_DTYPE = np.dtype({
+    "names": list(COLUMNS),
+    "formats": ['<i8', '<i4', 'u1', '<i8', '<i8'],
+    "offsets": [0, 8, 12, 16, 24],
+    "itemsize": 32,
+})
+# Journal records carry str(ResponseType); accept bare names too
+_RESPONSE_TYPE_VALUES = {str(response_type): response_type.value for response_type in ResponseType}
+_RESPONSE_TYPE_VALUES.update({response_type.name: response_type.value for response_type in ResponseType})
+_UNKNOWN_SYMBOL = -1  # The legacy format did not record the symbol
+
+def _columns(records):
+    """Turn a list of journal records into a chunk of column arrays"""
+    types = _RESPONSE_TYPE_VALUES
+    return {
+        "order_id": np.array([record.get("order_id", 0) for record in records], dtype=np.int64),
+        "symbol_id": np.array([record.get("symbol_id", _UNKNOWN_SYMBOL) for record in records], dtype=np.int64),
+        "response_type": np.array([types.get(record.get("response_type"), 0) for record in records], dtype=np.uint8),
+        "latency_ns": np.rint(np.array([record.get("latency", 0.0) for record in records],
+                                       dtype=np.float64) * 1e9).astype(np.int64),
+        "timestamp_ns": np.rint(np.array([record.get("timestamp", 0.0) for record in records],
+                                         dtype=np.float64) * 1e9).astype(np.int64),
+    }
+
+def _iter_json_array(f, chunk_chars=1 << 20):
+    """Stream the records of a file holding one JSON array without loading it whole"""
+    decoder = json.JSONDecoder()
+    buffer = f.read(chunk_chars).lstrip()
+    if not buffer.startswith('['):
+        return
+    position = 1
+    eof = False
+    while True:
+        while position < len(buffer) and buffer[position] in ' \t\r\n,':
+            position += 1
+        if position < len(buffer) and buffer[position] == ']':
+            return
+        try:
+            record, position = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            if eof:
+                return  # Truncated or corrupted tail
+            chunk = f.read(chunk_chars)
+            eof = not chunk
+            buffer = buffer[position:] + chunk
+            position = 0
+            continue
+        yield record
+
+def _parse_lines(lines):
+    """Decode journal lines with one json.loads call, line by line only if one of them is torn"""
+    try:
+        return json.loads(b'[' + b','.join(lines) + b']')
+    except ValueError:
+        records = []
+        for line in lines:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                continue  # Torn last line, as in Journal.replay
+        return records
+
+def _iter_journal_chunks(path, chunk_size):
+    """Lists of up to chunk_size records of a journal segment, or of a file in the legacy JSON array format"""
+    with open(path, 'rb') as f:
+        legacy = f.read(64).lstrip().startswith(b'[')
+    if legacy:
+        with open(path, 'r') as f:
+            records = []
+            for record in _iter_json_array(f):
+                records.append(record)
+                if len(records) == chunk_size:
+                    yield records
+                    records = []
+            yield records
+        return
+    with open(path, 'rb') as f:
+        while True:
+            lines = [line for line in itertools.islice(f, chunk_size) if line.strip()]
+            if not lines:
+                return
+            yield _parse_lines(lines)
+
+def read_journal(path, chunk_size=65536):
+    """
+    Stream a response journal, its sealed segments first, as chunks of columns.
+    The files are only read, a legacy file is not migrated.
+
+    params:
+        path: active segment of the journal, or a legacy responses.json
+
+    returns:
+        iterator of dicts of COLUMNS -> arrays
+    """
+    path = Path(path)
+    for segment in sealed_segments(path) + [path]:
+        if not segment.exists():
+            continue
+        for records in _iter_journal_chunks(segment, chunk_size):
+            if records:
+                yield _columns(records)
+
+def read_store(path, chunk_size=1 << 20):
+    """
+    Stream a ResponseStore data file through a memory map as chunks of columns
+
+    returns:
+        iterator of dicts of COLUMNS -> arrays
+    """
+    path = Path(path)
+    count = (path.stat().st_size - HEADER.size) // STORE_DTYPE.itemsize
+    if count <= 0:
+        return
+    records = np.memmap(path, dtype=STORE_DTYPE, mode='r', offset=HEADER.size, shape=(count,))
+    for start in range(0, count, chunk_size):
+        chunk = records[start:start + chunk_size]
+        yield {column: np.array(chunk[column], dtype=np.uint8 if column == "response_type" else np.int64)
+               for column in COLUMNS}
+
+def read_responses(path, chunk_size=None):
+    """Stream any response history file as chunks of columns, picking the reader by content"""
+    with open(path, 'rb') as f:
+        is_store = f.read(len(MAGIC)) == MAGIC
+    if is_store:
+        return read_store(path, chunk_size or 1 << 20)
+    return read_journal(path, chunk_size or 65536)
+
+class ResponseAnalytics:
+    """
+    Running statistics over chunks of ack columns, see the module docstring.
+    Feed chunks with add(), read the results with report().
+    """
+    def __init__(self, bucket_seconds=60, worst=10, sub_bucket_bits=7, max_value_ns=1 << 36):
+        """
+        Args:
+            bucket_seconds (float): Width of the throughput time buckets
+            worst (int): Slowest acks to keep
+            sub_bucket_bits (int), max_value_ns (int): Latency buckets, see LatencyHistogram
+        """
+        self.bucket_ns = int(bucket_seconds * 1e9)
+        self.worst = worst
+        self.sub_bucket_bits = sub_bucket_bits
+        self.max_value_ns = max_value_ns
+        self.histogram = LatencyHistogram(sub_bucket_bits, max_value_ns)  # Bucket layout for _bucket_indexes
+        self.latency_counts = np.zeros(self.histogram.max_index + 1, dtype=np.int64)
+        self.latency_total = 0
+        self.latency_min = None
+        self.latency_max = None
+        self.count = 0
+        self.by_type = np.zeros(len(ResponseType), dtype=np.int64)
+        self.by_symbol = {}
+        self.by_bucket = {}
+        self.first_ns = None
+        self.last_ns = None
+        self.slowest = {column: np.empty(0, dtype=np.int64) for column in COLUMNS}
+
+    def _bucket_indexes(self, values):
+        """LatencyHistogram.index_of for a whole array of non-negative values"""
+        bits = self.histogram.sub_bucket_bits
+        half = self.histogram.half_count
+        # frexp's exponent is the bit length, exactly for values below 2**53
+        exponent = np.frexp(values.astype(np.float64))[1].astype(np.int64) - bits
+        shift = np.maximum(exponent, 0)
+        indexes = np.where(exponent <= 0, values, exponent * half + (values >> shift))
+        return np.minimum(indexes, self.histogram.max_index)
+
+    def add(self, chunk):
+        """Fold a chunk of columns into the totals"""
+        latency = np.maximum(chunk["latency_ns"], 0)
+        if not len(latency):
+            return
+        self.count += len(latency)
+        self.by_type += np.bincount(chunk["response_type"], minlength=len(ResponseType))[:len(ResponseType)]
+        self.latency_counts += np.bincount(self._bucket_indexes(latency), minlength=len(self.latency_counts))
+        self.latency_total += int(latency.sum())
+        low, high = int(latency.min()), int(latency.max())
+        self.latency_min = low if self.latency_min is None else min(self.latency_min, low)
+        self.latency_max = high if self.latency_max is None else max(self.latency_max, high)
+
+        timestamps = chunk["timestamp_ns"]
+        first, last = int(timestamps.min()), int(timestamps.max())
+        self.first_ns = first if self.first_ns is None else min(self.first_ns, first)
+        self.last_ns = last if self.last_ns is None else max(self.last_ns, last)
+        for symbol_id, count in zip(*np.unique(chunk["symbol_id"], return_counts=True)):
+            self.by_symbol[int(symbol_id)] = self.by_symbol.get(int(symbol_id), 0) + int(count)
+        for bucket, count in zip(*np.unique(timestamps // self.bucket_ns, return_counts=True)):
+            self.by_bucket[int(bucket)] = self.by_bucket.get(int(bucket), 0) + int(count)
+
+        if self.worst:
+            candidates = {column: np.concatenate((self.slowest[column], chunk[column].astype(np.int64)))
+                          for column in COLUMNS}
+            candidates["latency_ns"] = np.maximum(candidates["latency_ns"], 0)
+            if len(candidates["latency_ns"]) > self.worst:
+                keep = np.argpartition(candidates["latency_ns"], -self.worst)[-self.worst:]
+                candidates = {column: values[keep] for column, values in candidates.items()}
+            self.slowest = candidates
+
+    def report(self):
+        """
+        The statistics of everything added so far
+
+        returns:
+            dict: "responses", "accepts", "rejects", "accept_ratio", "reject_ratio",
+                "latency_ns" (a LatencyHistogram summary), "span_s", "per_s",
+                "by_symbol" (symbol ID -> count and per_s over the span),
+                "by_bucket" (start time, count and per_s of each time bucket) and
+                "worst" (the slowest acks, slowest first)
+        """
+        histogram = LatencyHistogram(self.sub_bucket_bits, self.max_value_ns)
+        if self.count:
+            histogram.add_counts(self.latency_counts.tolist(), self.latency_total, self.latency_min, self.latency_max)
+        span = (self.last_ns - self.first_ns) / 1e9 if self.count else 0.0
+        accepts = int(self.by_type[ResponseType.Accept.value])
+        rejects = int(self.by_type[ResponseType.Reject.value])
+        bucket_seconds = self.bucket_ns / 1e9
+        order = np.argsort(-self.slowest["latency_ns"], kind="stable")
+        return {
+            "responses": self.count,
+            "accepts": accepts,
+            "rejects": rejects,
+            "accept_ratio": accepts / self.count if self.count else 0.0,
+            "reject_ratio": rejects / self.count if self.count else 0.0,
+            "latency_ns": histogram.summary(),
+            "span_s": span,
+            "per_s": self.count / span if span else 0.0,
+            "by_symbol": {symbol_id: {"count": count, "per_s": count / span if span else 0.0}
+                          for symbol_id, count in sorted(self.by_symbol.items())},
+            "by_bucket": [{"start": bucket * bucket_seconds, "count": count, "per_s": count / bucket_seconds}
+                          for bucket, count in sorted(self.by_bucket.items())],
+            "worst": [{column: int(self.slowest[column][i]) for column in COLUMNS} for i in order],
+        }
+
+def analyze(path, bucket_seconds=60, worst=10, chunk_size=None):
+    """
+    Read a response history file in one pass and report on it, see ResponseAnalytics.report
+
+    params:
+        path: response journal, legacy responses.json or ResponseStore data file
+    """
+    analytics = ResponseAnalytics(bucket_seconds=bucket_seconds, worst=worst)
+    for chunk in read_responses(path, chunk_size):
+        analytics.add(chunk)
+    return analytics.report()
+
+def print_report(report, file=None):
+    print(f"responses      {report['responses']} over {report['span_s']:.1f}s ({report['per_s']:.1f}/s)", file=file)
+    print(f"accept/reject  {report['accepts']} / {report['rejects']} "
+          f"({100 * report['accept_ratio']:.2f}% / {100 * report['reject_ratio']:.2f}%)", file=file)
+    latency = report["latency_ns"]
+    print("latency (us)   " + "  ".join(f"{key} {latency[key] / 1e3:.1f}" for key in
+                                       ("min", "mean", "p50", "p90", "p99", "p99.9", "max")), file=file)
+    print(f"\n{'symbol':>8} {'count':>10} {'per s':>10}", file=file)
+    for symbol_id, stats in report["by_symbol"].items():
+        print(f"{symbol_id:>8} {stats['count']:>10} {stats['per_s']:>10.1f}", file=file)
+    print(f"\n{'bucket start (UTC)':<20} {'count':>10} {'per s':>10}", file=file)
+    for bucket in report["by_bucket"]:
+        start = np.datetime64(int(bucket["start"]), 's')
+        print(f"{str(start):<20} {bucket['count']:>10} {bucket['per_s']:>10.1f}", file=file)
+    print(f"\n{'worst order':>12} {'symbol':>8} {'type':>6} {'latency (us)':>13}", file=file)
+    for ack in report["worst"]:
+        print(f"{ack['order_id']:>12} {ack['symbol_id']:>8} {ResponseType(ack['response_type']).name:>6} "
+              f"{ack['latency_ns'] / 1e3:>13.1f}", file=file)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Latency, reject ratio and throughput of a response history")
+    parser.add_argument("path", help="response journal, legacy responses.json or ResponseStore data file")
+    parser.add_argument("--bucket", type=float, default=60, help="throughput bucket width in seconds")
+    parser.add_argument("--worst", type=int, default=10, help="slowest acks to list")
+    parser.add_argument("--chunk-size", type=int, default=None, help="records per chunk")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args(argv)
+    report = analyze(args.path, bucket_seconds=args.bucket, worst=args.worst, chunk_size=args.chunk_size)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
+if __name__ == "__main__":
+    main()
@@ -1,55 +1,190 @@
 import time
-import json
 from pathlib import Path
 
+import os, sys
+
+cwd = os.getcwd()
+if cwd.endswith("scripts"):
+    os.chdir("..")
+sys.path.append(os.getcwd())
+
+from scripts.journal import Journal
+from scripts.response_store import ResponseStore
+from scripts.response_window import ResponseWindow
+from scripts.response_writer import ResponseWriter
+from scripts.latency_histogram import LatencyRecorder
+from scripts.metrics import MetricsRegistry
+from scripts.order import ResponseType
+from scripts.logger import log
+
+_response_log = log.sampled("responses")
+
 class ResponseHandler:
-    def __init__(self, order_queue, storage_path="responses.json"):
+    def __init__(self, order_queue, storage_path="responses.json", segment_size=64 * 1024 * 1024, fsync_interval=None, durability=None, metrics=None, store_path=None, max_responses=None, max_response_age=None):
+        """
+        Args:
+            order_queue (OrderQueue): Queue holding the orders awaiting a response
+            storage_path (str): Path of the active response journal segment
+            segment_size (int): Journal segment rotation threshold in bytes
+            fsync_interval (float | None): Journal group-commit fsync window in seconds
+            durability (Durability | None): Persist through a background ResponseWriter
+                with this durability mode. None appends inline on the calling thread.
+            metrics (MetricsRegistry | None): Registry for the response metrics
+            store_path (str | None): Also keep the acks in a memory-mapped ResponseStore
+                indexed by order ID, see find_responses
+            max_responses (int | None): Response records kept in memory, older ones are
+                rolled up per minute and symbol, see ResponseWindow. None keeps them all.
+            max_response_age (float | None): Seconds a response record is kept in memory
+        """
         self.order_queue = order_queue
-        self.responses = []
+        self.responses = ResponseWindow(max_responses=max_responses, max_age=max_response_age)
+        self.latency = LatencyRecorder()
+        metrics = metrics if metrics is not None else MetricsRegistry()
+        responses = metrics.counter("oms_responses_total", "Exchange responses matched to an order", ("type",))
+        self._responses_by_type = {response_type: responses.labels(response_type.name) for response_type in ResponseType}
+        self._unmatched = metrics.counter("oms_unmatched_responses_total",
+                                          "Exchange responses for no pending order").labels()
+        self._ack_latency = metrics.histogram("oms_ack_latency_seconds",
+                                              "Time from request creation until its response").labels()
         self.storage_path = Path(storage_path)
+        # Opening the journal migrates a legacy JSON array file in place
+        self.journal = Journal(self.storage_path, segment_size=segment_size, fsync_interval=fsync_interval)
         self._load_responses()  # Load existing responses on initialization
+        self.writer = ResponseWriter(self.journal, durability=durability) if durability is not None else None
+        self.store = ResponseStore(store_path) if store_path is not None else None
 
     def _load_responses(self):
-        """Load existing responses from storage file"""
-        if self.storage_path.exists():
-            try:
-                with open(self.storage_path, 'r') as f:
-                    self.responses = json.load(f)
-            except json.JSONDecodeError:
-                # If file is empty or corrupted, start with empty list
-                self.responses = []
-        else:
-            # Create the file with an empty list
-            self._save_responses()
-
-    def _save_responses(self):
-        """Save responses to persistent storage"""
-        # Ensure directory exists
-        self.storage_path.parent.mkdir(parents=True, exist_ok=True)
-        with open(self.storage_path, 'w') as f:
-            # Convert responses to JSON-serializable format
-            serializable_responses = []
-            for response in self.responses:
-                serializable_response = response.copy()
-                # Convert ResponseType enum to string
-                if 'response_type' in serializable_response:
-                    serializable_response['response_type'] = str(serializable_response['response_type'])
-                serializable_responses.append(serializable_response)
-            json.dump(serializable_responses, f, indent=4)
+        """Rebuild in-memory responses by streaming the journal segments through the window"""
+        self.responses.extend(self.journal.replay())
+
+    def _serialize(self, response_data):
+        """Convert a response record to its JSON-serializable form"""
+        serializable_response = response_data.copy()
+        # Convert ResponseType enum to string
+        if 'response_type' in serializable_response:
+            serializable_response['response_type'] = str(serializable_response['response_type'])
+        return serializable_response
 
     def handle_response(self, response):
         """
         Handles a response from the exchange and stores it persistently
         """
-        if response.m_orderId in self.order_queue.orders:
-            latency = time.time() - self.order_queue.orders[response.m_orderId].timestamp
+        record = self.record_response(response)
+        if record is not None:
+            if self.writer is not None:
+                self.writer.submit(record)  # Persisted off the ack path
+            else:
+                self.journal.append(record)  # Append one record to the journal
+
+    def handle_responses(self, responses):
+        """
+        Handles a batch of responses from the exchange with one persistence
+        write for the whole batch
+
+        returns:
+            list: True for each response matched to a pending order, False otherwise
+        """
+        records = self.record_responses(responses)
+        batch = [record for record in records if record is not None]
+        if batch:
+            if self.writer is not None:
+                self.writer.submit_many(batch)
+            else:
+                self.journal.append_many(batch)
+        return [record is not None for record in records]
+
+    def record_response(self, response):
+        """
+        Matches a response to its order and records it in memory
+
+        Returns:
+            dict: the serialized record to persist, or None for an unknown order
+        """
+        return self.record_responses((response,))[0]
+
+    def record_responses(self, responses):
+        """
+        Matches a batch of responses to their orders and records them in memory,
+        updating the latency histograms once for the whole batch
+
+        Returns:
+            list: the serialized record to persist for each response, None for unknown orders
+        """
+        records = []
+        samples = []
+        acks = []
+        window = []
+        now_ns = time.perf_counter_ns()
+        now = time.time()
+        for response in responses:
+            order = self.order_queue.orders.pop(response.m_orderId, None)
+            if order is None:
+                self._unmatched.inc()
+                records.append(None)
+                continue
+            latency_ns = now_ns - order.timestamp_ns
+            samples.append((order.m_symbolId, response.m_responseType, latency_ns))
+            acks.append((response.m_orderId, order.m_symbolId, response.m_responseType, latency_ns, int(now * 1e9)))
+            latency = latency_ns / 1e9
+            self._responses_by_type[response.m_responseType].inc()
+            self._ack_latency.observe(latency)
             response_data = {
                 "order_id": response.m_orderId,
+                "symbol_id": order.m_symbolId,
                 "response_type": response.m_responseType,
                 "latency": latency,
-                "timestamp": time.time()
+                "timestamp": now
             }
-            self.responses.append(response_data)
-            self._save_responses()  # Save to persistent storage
-            del self.order_queue.orders[response.m_orderId]
-            print(f"Processed response for Order {response.m_orderId}. Latency: {latency:.2f}s")
+            window.append(response_data)
+            _response_log.info("Processed response for Order %d. Latency: %.2fs", response.m_orderId, latency)
+            records.append(self._serialize(response_data))
+        if samples:
+            self.responses.extend(window, now)
+            self.latency.record_many(samples)
+            if self.store is not None:
+                self.store.append_many(acks)
+            if self.order_queue.request_log is not None:
+                self.order_queue.request_log.done(
+                    [response.m_orderId for response, record in zip(responses, records) if record is not None])
+        return records
+
+    def latency_snapshot(self, reset=False):
+        """
+        Latency percentiles (ns) of the acks handled since the last reset,
+        overall, per symbol and per response type. See LatencyRecorder.snapshot.
+        """
+        return self.latency.snapshot(reset=reset)
+
+    def response_rollups(self):
+        """Per-minute, per-symbol rollups of the responses rolled out of memory, see ResponseWindow"""
+        self.responses.expire()
+        return self.responses.rollup_snapshot()
+
+    def find_responses(self, order_id):
+        """
+        Responses recorded for an order. Answered from the ResponseStore index when
+        there is one, otherwise by scanning the in-memory responses, which only
+        hold the current window when a retention limit is set.
+
+        returns:
+            list: AckRecord tuples from the store, or response dicts
+        """
+        if self.store is not None:
+            return self.store.lookup(order_id)
+        return [response for response in self.responses if response["order_id"] == order_id]
+
+    def flush(self):
+        """Block until every handled response is persisted"""
+        if self.writer is not None:
+            self.writer.flush()
+        else:
+            self.journal.flush(fsync=False)
+
+    def close(self):
+        """Persist pending responses and close the response journal"""
+        if self.writer is not None:
+            self.writer.close()
+        else:
+            self.journal.close()
+        if self.store is not None:
+            self.store.close()
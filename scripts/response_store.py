@@ -0,0 +1,386 @@
+"""
+Memory-mapped store of fixed-size binary ack records with an order ID index.
+
+Acks are appended to a data file as 32-byte records and read back through
+an mmap, so a point lookup or a time-range scan only touches the records it
+returns. The order ID index is a set of sorted runs next to the data file:
+every run_size appended records are sorted by order ID and written out as
+a run of (order ID, record number) columns, and runs are merged pairwise
+while the newest is at least as large as the one before it, which keeps
+O(log n) runs. A lookup bisects the mmapped order ID column of each run and
+checks a dict over the unindexed tail. Opening a store reads the run headers and
+the unindexed tail only, whatever the size of the file.
+
+Records keep the timestamp they were appended with. Time ranges are
+bisected on a column of keys in a file next to the data, the running
+maximum of the timestamps, which is sorted even when an ack arrives with
+an older timestamp than the one before it. The keys file also holds the
+largest such lag, so a scan widens its key range by it and then filters
+on the record timestamps.
+"""
+
+import bisect
+import mmap
+import struct
+import threading
+from array import array
+from collections import namedtuple
+from pathlib import Path
+
+import os, sys
+
+cwd = os.getcwd()
+if cwd.endswith("scripts"):
+    os.chdir("..")
+sys.path.append(os.getcwd())
+
+from scripts.order import RESPONSE_TYPES
+
+HEADER = struct.Struct('<8sII')  # Magic, record size, reserved
+MAGIC = b'OMSACKS1'
+# Order ID, symbol ID, response type, latency in ns, timestamp in ns since the epoch
+RECORD = struct.Struct('<qiB3xqq')
+RECORD_SIZE = RECORD.size
+
+RUN_HEADER = struct.Struct('<8sqqq')  # Magic, first record, end record, entries
+RUN_MAGIC = b'OMSRUN01'
+
+KEYS_HEADER = struct.Struct('<8sq')  # Magic, largest lag of a timestamp behind its key in ns
+KEYS_MAGIC = b'OMSKEYS1'
+
+AckRecord = namedtuple("AckRecord", "order_id symbol_id response_type latency_ns timestamp_ns")
+
+def _record(fields):
+    order_id, symbol_id, response_type, latency_ns, timestamp_ns = fields
+    return AckRecord(order_id, symbol_id, RESPONSE_TYPES[response_type], latency_ns, timestamp_ns)
+
+class _Run:
+    """One sorted index run, read through an mmap"""
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.start, self.end, self.count = RUN_HEADER.unpack_from(self.map)
+        if magic != RUN_MAGIC:
+            raise ValueError(f"{path} is not an index run")
+        view = memoryview(self.map)
+        ids_end = RUN_HEADER.size + 8 * self.count
+        self.order_ids = view[RUN_HEADER.size:ids_end].cast('q')
+        self.positions = view[ids_end:ids_end + 8 * self.count].cast('q')
+
+    def find(self, order_id):
+        """Record numbers stored for an order ID"""
+        i = bisect.bisect_left(self.order_ids, order_id)
+        positions = []
+        while i < self.count and self.order_ids[i] == order_id:
+            positions.append(self.positions[i])
+            i += 1
+        return positions
+
+    def columns(self):
+        return array('q', self.order_ids), array('q', self.positions)
+
+    def close(self):
+        self.order_ids.release()
+        self.positions.release()
+        self.map.close()
+
+class ResponseStore:
+    """
+    Append-only ack store, see the module docstring. Appends are buffered;
+    lookups and scans flush them first, so they always see every append.
+    """
+    def __init__(self, path, run_size=65536):
+        """
+        Open (or create) the store
+
+        Args:
+            path (str | Path): Data file, index runs are kept next to it as <path>.run.<first>.<end>
+                and the time keys as <path>.keys
+            run_size (int): Appended records per index run
+        """
+        self.path = Path(path)
+        self.keys_path = self.path.with_name(self.path.name + '.keys')
+        self.run_size = run_size
+        self.lock = threading.RLock()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        if not self.path.exists() or self.path.stat().st_size < HEADER.size:
+            with open(self.path, 'wb') as f:
+                f.write(HEADER.pack(MAGIC, RECORD_SIZE, 0))
+        with open(self.path, 'rb+') as f:
+            magic, record_size, _ = HEADER.unpack(f.read(HEADER.size))
+            if magic != MAGIC or record_size != RECORD_SIZE:
+                raise ValueError(f"{self.path} is not a response store")
+            size = f.seek(0, os.SEEK_END)
+            self.count = (size - HEADER.size) // RECORD_SIZE
+            if HEADER.size + self.count * RECORD_SIZE != size:
+                f.truncate(HEADER.size + self.count * RECORD_SIZE)  # Torn last record
+        self.last_key_ns, self.max_lag_ns = self._open_keys()
+        self.file = open(self.path, 'ab', buffering=1024 * 1024)
+        self.keys_file = open(self.keys_path, 'ab', buffering=256 * 1024)
+        self.map = None
+        self.keys_map = None
+        self.mapped = 0  # Records covered by the current mappings
+        self.late = 0  # Acks appended since opening with a timestamp older than the last key
+        self.runs = self._open_runs()
+        self.indexed = self.runs[-1].end if self.runs else 0
+        # Record numbers by order ID of the records not covered by a run yet
+        self.tail = {}
+        for position, fields in enumerate(self._iter_fields(self.indexed, self.count), self.indexed):
+            self.tail.setdefault(fields[0], []).append(position)
+
+    def _open_runs(self):
+        """Load the runs that chain from record 0, dropping leftovers of an interrupted merge"""
+        by_start = {}
+        for candidate in self.path.parent.glob(self.path.name + '.run.*'):
+            parts = candidate.name[len(self.path.name) + 5:].split('.')
+            if len(parts) == 2 and all(part.isdigit() for part in parts):
+                by_start.setdefault(int(parts[0]), []).append((int(parts[1]), candidate))
+        runs = []
+        start = 0
+        while start in by_start:
+            # The widest run wins, narrower ones were merged into it; none may reach past the data
+            ends = sorted(by_start.pop(start), reverse=True)
+            usable = [(end, path) for end, path in ends if end <= self.count]
+            for _, path in ends[:len(ends) - len(usable)] + usable[1:]:
+                path.unlink()
+            if not usable:
+                break
+            end, path = usable[0]
+            runs.append(_Run(path))
+            start = end
+        for stale in by_start.values():
+            for _, path in stale:
+                path.unlink()
+        return runs
+
+    def _open_keys(self):
+        """
+        Bring the keys file in line with the data, creating it for a store written
+        before it existed and rebuilding the keys a crash left out
+
+        returns:
+            tuple: (last key, largest lag) in ns
+        """
+        if not self.keys_path.exists() or self.keys_path.stat().st_size < KEYS_HEADER.size:
+            with open(self.keys_path, 'wb') as f:
+                f.write(KEYS_HEADER.pack(KEYS_MAGIC, 0))
+        with open(self.keys_path, 'rb+') as f:
+            magic, max_lag = KEYS_HEADER.unpack(f.read(KEYS_HEADER.size))
+            if magic != KEYS_MAGIC:
+                raise ValueError(f"{self.keys_path} is not a response store keys file")
+            keys = (f.seek(0, os.SEEK_END) - KEYS_HEADER.size) // 8
+            if keys > self.count:
+                keys = self.count
+            f.truncate(KEYS_HEADER.size + keys * 8)
+            last = 0
+            if keys:
+                f.seek(KEYS_HEADER.size + (keys - 1) * 8)
+                last = struct.unpack('<q', f.read(8))[0]
+            if keys < self.count:
+                rebuilt = array('q')
+                with open(self.path, 'rb') as data:
+                    data.seek(HEADER.size + keys * RECORD_SIZE)
+                    for fields in RECORD.iter_unpack(data.read((self.count - keys) * RECORD_SIZE)):
+                        timestamp_ns = fields[4]
+                        if timestamp_ns >= last:
+                            last = timestamp_ns
+                        elif last - timestamp_ns > max_lag:
+                            max_lag = last - timestamp_ns
+                        rebuilt.append(last)
+                f.seek(0, os.SEEK_END)
+                f.write(rebuilt.tobytes())
+                f.seek(0)
+                f.write(KEYS_HEADER.pack(KEYS_MAGIC, max_lag))
+        return last, max_lag
+
+    def _save_max_lag(self, max_lag):
+        """Records a new largest lag in the keys header, before the keys it covers are written"""
+        with open(self.keys_path, 'rb+') as f:
+            f.write(KEYS_HEADER.pack(KEYS_MAGIC, max_lag))
+        self.max_lag_ns = max_lag
+
+    def __len__(self):
+        return self.count
+
+    def _run_path(self, start, end):
+        return self.path.with_name(f"{self.path.name}.run.{start:012d}.{end:012d}")
+
+    def append(self, order_id, symbol_id, response_type, latency_ns, timestamp_ns):
+        """Append one ack, see append_many"""
+        self.append_many(((order_id, symbol_id, response_type, latency_ns, timestamp_ns),))
+
+    def append_many(self, acks):
+        """
+        Append acks in one buffered write
+
+        params:
+            acks: (order ID, symbol ID, ResponseType, latency ns, timestamp ns) tuples,
+                stored as given. One older than an earlier ack is counted in late.
+        """
+        with self.lock:
+            data = bytearray()
+            keys = array('q')
+            last = self.last_key_ns
+            max_lag = self.max_lag_ns
+            tail = self.tail
+            position = self.count
+            for order_id, symbol_id, response_type, latency_ns, timestamp_ns in acks:
+                if timestamp_ns >= last:
+                    last = timestamp_ns
+                else:
+                    self.late += 1
+                    if last - timestamp_ns > max_lag:
+                        max_lag = last - timestamp_ns
+                keys.append(last)
+                data += RECORD.pack(order_id, symbol_id, response_type.value, latency_ns, timestamp_ns)
+                positions = tail.get(order_id)
+                if positions is None:
+                    tail[order_id] = [position]
+                else:
+                    positions.append(position)
+                position += 1
+            if max_lag > self.max_lag_ns:
+                self._save_max_lag(max_lag)
+            self.file.write(data)
+            self.keys_file.write(keys.tobytes())
+            self.count = position
+            self.last_key_ns = last
+            if self.count - self.indexed >= self.run_size:
+                self._write_run()
+
+    def _write_run(self):
+        """Sorts the unindexed tail into a new run and merges runs, the caller holds the lock"""
+        self.file.flush()  # A run never points past the data on disk
+        order_ids = array('q')
+        positions = array('q')
+        for order_id, tail_positions in sorted(self.tail.items()):
+            order_ids.extend([order_id] * len(tail_positions))
+            positions.extend(tail_positions)
+        self.runs.append(self._save_run(self.indexed, self.count, order_ids, positions))
+        self.indexed = self.count
+        self.tail = {}
+        while len(self.runs) > 1 and self.runs[-1].count >= self.runs[-2].count:
+            older, newer = self.runs[-2], self.runs[-1]
+            older_ids, older_positions = older.columns()
+            newer_ids, newer_positions = newer.columns()
+            ids = older_ids + newer_ids
+            positions = older_positions + newer_positions
+            order = sorted(range(len(ids)), key=ids.__getitem__)  # Two sorted runs, Timsort merges them
+            merged = self._save_run(older.start, newer.end, array('q', [ids[i] for i in order]),
+                                    array('q', [positions[i] for i in order]))
+            for stale in (older, newer):
+                stale.close()
+                stale.path.unlink()
+            self.runs[-2:] = [merged]
+
+    def _save_run(self, start, end, order_ids, positions):
+        path = self._run_path(start, end)
+        temp_path = path.with_name(path.name + '.tmp')
+        with open(temp_path, 'wb') as f:
+            f.write(RUN_HEADER.pack(RUN_MAGIC, start, end, len(order_ids)))
+            f.write(order_ids.tobytes())
+            f.write(positions.tobytes())
+        os.replace(temp_path, path)
+        return _Run(path)
+
+    def _view(self):
+        """Flushes appends and returns a memoryview over every record, the caller holds the lock"""
+        if self.mapped < self.count:
+            self.file.flush()
+            self.keys_file.flush()
+            if self.map is not None:
+                self.map.close()
+                self.keys_map.close()
+            with open(self.path, 'rb') as f:
+                self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            with open(self.keys_path, 'rb') as f:
+                self.keys_map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self.mapped = self.count
+        if self.map is None:
+            return memoryview(b'')
+        return memoryview(self.map)[HEADER.size:HEADER.size + self.mapped * RECORD_SIZE]
+
+    def _keys_view(self):
+        """The time keys of the records _view covers, the caller holds the lock"""
+        if self.keys_map is None:
+            return memoryview(array('q'))
+        return memoryview(self.keys_map)[KEYS_HEADER.size:KEYS_HEADER.size + self.mapped * 8].cast('q')
+
+    def _iter_fields(self, start, end):
+        with self.lock:
+            view = self._view()
+            try:
+                yield from RECORD.iter_unpack(view[start * RECORD_SIZE:end * RECORD_SIZE])
+            finally:
+                view.release()
+
+    def record(self, i):
+        """The i-th record in append order"""
+        with self.lock:
+            if not 0 <= i < self.count:
+                raise IndexError(i)
+            view = self._view()
+            try:
+                return _record(RECORD.unpack_from(view, i * RECORD_SIZE))
+            finally:
+                view.release()
+
+    def lookup(self, order_id):
+        """
+        Every ack stored for an order ID, in append order
+
+        returns:
+            list: AckRecord tuples
+        """
+        with self.lock:
+            # Runs cover consecutive record ranges and keep equal IDs in record order
+            positions = []
+            for run in self.runs:
+                positions.extend(run.find(order_id))
+            positions.extend(self.tail.get(order_id, ()))
+            return [self.record(position) for position in positions]
+
+    def scan(self, start_ns=None, end_ns=None):
+        """
+        Acks with start_ns <= timestamp < end_ns, in append order. Each bound may be None.
+
+        returns:
+            list: AckRecord tuples
+        """
+        with self.lock:
+            view = self._view()
+            keys = self._keys_view()
+            try:
+                # A timestamp is at most max_lag_ns behind its key and never ahead of it
+                first = 0 if start_ns is None else bisect.bisect_left(keys, start_ns)
+                last = self.mapped if end_ns is None else bisect.bisect_left(keys, end_ns + self.max_lag_ns)
+                fields = RECORD.iter_unpack(view[first * RECORD_SIZE:last * RECORD_SIZE])
+                if self.max_lag_ns:
+                    fields = [f for f in fields
+                              if (start_ns is None or f[4] >= start_ns) and (end_ns is None or f[4] < end_ns)]
+                return [_record(f) for f in fields]
+            finally:
+                keys.release()
+                view.release()
+
+    def flush(self, fsync=False):
+        """Hand buffered appends to the OS, and optionally to the disk"""
+        with self.lock:
+            self.file.flush()
+            if fsync:
+                os.fsync(self.file.fileno())
+
+    def close(self):
+        with self.lock:
+            if self.file.closed:
+                return
+            self.file.close()
+            self.keys_file.close()
+            if self.map is not None:
+                self.map.close()
+                self.keys_map.close()
+                self.map = None
+                self.keys_map = None
+            for run in self.runs:
+                run.close()
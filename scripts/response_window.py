@@ -0,0 +1,131 @@
+"""
+Bounded window of recent responses with per-minute rollups of older ones.
+
+The window keeps the raw response records of the last max_responses acks
+and/or max_age seconds. A record leaving the window is folded into the
+rollup of its minute and symbol (count, accepts, rejects and latency sum,
+min and max) and its raw form is dropped from memory. It stays on disk in
+the response journal, which every handled response is written to anyway.
+Memory then depends on the window and on the number of minutes and symbols
+seen, not on the number of acks.
+"""
+
+import threading
+import time
+from collections import deque
+
+import os, sys
+
+cwd = os.getcwd()
+if cwd.endswith("scripts"):
+    os.chdir("..")
+sys.path.append(os.getcwd())
+
+from scripts.order import ResponseType
+
+# Records replayed from the journal carry the response type as a string
+_ACCEPTS = {ResponseType.Accept, str(ResponseType.Accept)}
+_REJECTS = {ResponseType.Reject, str(ResponseType.Reject)}
+_UNKNOWN_SYMBOL = -1  # Legacy records and journals older than the symbol column have no symbol_id
+
+class ResponseWindow:
+    """
+    Recent response records, indexable and iterable oldest first like the list
+    it replaces. Without limits it keeps everything and never rolls up.
+    """
+    def __init__(self, max_responses=None, max_age=None):
+        """
+        Args:
+            max_responses (int | None): Raw records kept in memory
+            max_age (float | None): Seconds a raw record is kept after its timestamp
+        """
+        self.max_responses = max_responses
+        self.max_age = max_age
+        self.bounded = max_responses is not None or max_age is not None
+        self.records = deque()
+        self.lock = threading.Lock()
+        # (minute start in epoch seconds, symbol ID) -> [count, accepts, rejects, latency sum, min, max]
+        self.rollups = {}
+        self.evicted = 0
+
+    def __len__(self):
+        return len(self.records)
+
+    def __getitem__(self, i):
+        return self.records[i]
+
+    def __iter__(self):
+        return iter(self.records.copy())
+
+    def __bool__(self):
+        return bool(self.records)
+
+    def append(self, record):
+        self.extend((record,))
+
+    def extend(self, records, now=None):
+        """
+        Add records and roll up the ones that fall out of the window
+
+        params:
+            records: response dicts with "response_type", "latency", "timestamp" and,
+                except in old histories, "symbol_id"
+            now (float | None): Current time.time(), for the max_age limit
+        """
+        if not self.bounded:
+            self.records.extend(records)
+            return
+        with self.lock:
+            self.records.extend(records)
+            self._evict(now)
+
+    def expire(self, now=None):
+        """Roll up records older than max_age without waiting for the next append"""
+        if self.max_age is not None:
+            with self.lock:
+                self._evict(now)
+
+    def _evict(self, now):
+        """Folds records that left the window into the rollups, the caller holds the lock"""
+        records = self.records
+        excess = 0 if self.max_responses is None else len(records) - self.max_responses
+        oldest = None
+        if self.max_age is not None:
+            oldest = (now if now is not None else time.time()) - self.max_age
+        rollups = self.rollups
+        while records and (excess > 0 or (oldest is not None and records[0]["timestamp"] < oldest)):
+            record = records.popleft()
+            excess -= 1
+            timestamp = record["timestamp"]
+            key = (int(timestamp // 60) * 60, record.get("symbol_id", _UNKNOWN_SYMBOL))
+            latency = record["latency"]
+            rollup = rollups.get(key)
+            if rollup is None:
+                rollup = rollups[key] = [0, 0, 0, 0.0, latency, latency]
+            rollup[0] += 1
+            response_type = record["response_type"]
+            if response_type in _ACCEPTS:
+                rollup[1] += 1
+            elif response_type in _REJECTS:
+                rollup[2] += 1
+            rollup[3] += latency
+            if latency < rollup[4]:
+                rollup[4] = latency
+            if latency > rollup[5]:
+                rollup[5] = latency
+            self.evicted += 1
+
+    def rollup_snapshot(self):
+        """
+        The per-minute rollups of the records that left the window, by minute then symbol
+
+        returns:
+            list: dicts with "minute" (epoch seconds), "symbol_id", "count", "accepts",
+                "rejects", "latency_sum", "latency_min" and "latency_max"
+        """
+        with self.lock:
+            items = sorted((key, tuple(rollup)) for key, rollup in self.rollups.items())
+        return [{"minute": minute, "symbol_id": symbol_id, "count": count, "accepts": accepts,
+                 "rejects": rejects, "latency_sum": latency_sum, "latency_min": latency_min,
+                 "latency_max": latency_max}
+                for (minute, symbol_id), (count, accepts, rejects, latency_sum, latency_min, latency_max) in items]
@@ -0,0 +1,153 @@
+import time
+import queue
+import atexit
+import threading
+from enum import Enum
+
+from scripts.logger import log
+
+class Durability(Enum):
+    FireAndForget = 0   # Write batches into the file buffer, let the OS decide when
+    Flush = 1           # Flush every batch to the OS
+    Fsync = 2           # Flush and fsync every batch
+
+_STOP = object()
+
+def write_batch(journal, batch, durability):
+    """Append a batch of records to the journal with the given durability"""
+    try:
+        if durability == Durability.FireAndForget:
+            journal.append_many(batch, fsync=False, flush=False)
+        elif durability == Durability.Fsync:
+            journal.append_many(batch, fsync=True)
+        else:
+            journal.append_many(batch)
+    except Exception as e:
+        log.error("Error persisting %d responses: %s", len(batch), e)
+
+class ResponseWriter:
+    """
+    Persists response records on a dedicated thread.
+
+    Records are handed over through a bounded queue and appended to the
+    journal in batches, so the ack path never waits on disk I/O unless the
+    queue is full (backpressure).
+    """
+    def __init__(self, journal, durability=Durability.Flush, max_pending=10000, batch_size=512, flush_interval=0.005):
+        """
+        Args:
+            journal (Journal): Journal the records are appended to
+            durability (Durability): What happens to each batch once written
+            max_pending (int): Queue capacity; submit blocks once it is reached
+            batch_size (int): Maximum records per journal write
+            flush_interval (float): Maximum seconds a record waits for its batch to fill
+        """
+        self.journal = journal
+        self.durability = durability
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue = queue.Queue(maxsize=max_pending)
+        self.closed = False
+        self.close_lock = threading.Lock()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        # Daemon threads are killed at exit, drain whatever is still pending first
+        atexit.register(self.close)
+
+    def submit(self, record, block=True, timeout=None):
+        """
+        Queue a record for persistence
+
+        params:
+            record: JSON-serializable dict
+            block: wait for room when the queue is full
+            timeout: maximum seconds to wait for room
+
+        returns:
+            bool: True if queued, False if the queue stayed full
+        """
+        if self.closed:
+            raise RuntimeError("Response writer is closed")
+        try:
+            self.queue.put(record, block=block, timeout=timeout)
+            return True
+        except queue.Full:
+            return False
+
+    def submit_many(self, records, block=True, timeout=None):
+        """
+        Queue a batch of records for persistence as a single queue entry,
+        they are written together. See submit.
+
+        returns:
+            bool: True if queued, False if the queue stayed full
+        """
+        if self.closed:
+            raise RuntimeError("Response writer is closed")
+        try:
+            self.queue.put(list(records), block=block, timeout=timeout)
+            return True
+        except queue.Full:
+            return False
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            record = self.queue.get()
+            if record is _STOP:
+                self.queue.task_done()
+                break
+            entries = 1
+            batch = record if isinstance(record, list) else [record]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    record = self.queue.get(timeout=remaining) if remaining > 0 else self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if record is _STOP:
+                    stopping = True
+                    break
+                entries += 1
+                if isinstance(record, list):
+                    batch.extend(record)
+                else:
+                    batch.append(record)
+            self._write(batch)
+            for _ in range(entries + stopping):
+                self.queue.task_done()
+
+    def _write(self, batch):
+        write_batch(self.journal, batch, self.durability)
+
+    def flush(self):
+        """Block until every submitted record has been written and made durable"""
+        if not self.closed:
+            self.queue.join()
+        if not self.journal.file.closed:
+            self.journal.flush(fsync=self.durability == Durability.Fsync)
+
+    def close(self):
+        """Drain the queue, stop the writer thread and close the journal"""
+        with self.close_lock:
+            if self.closed:
+                return
+            self.closed = True
+        self.queue.put(_STOP)
+        self.thread.join()
+        # Records that raced with close land behind the stop marker
+        leftover = []
+        while True:
+            try:
+                record = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if isinstance(record, list):
+                leftover.extend(record)
+            else:
+                leftover.append(record)
+        if leftover:
+            self._write(leftover)
+        self.journal.close()
+        atexit.unregister(self.close)
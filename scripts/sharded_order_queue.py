@@ -0,0 +1,179 @@
+import threading
+from collections import deque
+
+import os, sys
+
+cwd = os.getcwd()
+if cwd.endswith("scripts"):
+    os.chdir("..")
+sys.path.append(os.getcwd())
+
+from scripts.order_queue import OrderQueue
+
+class ShardedOrderQueue:
+    """
+    Order queue partitioned by m_symbolId.
+
+    Each symbol gets its own OrderQueue shard with its own lock, so ingress
+    for different symbols never contends. Orders keep FIFO order within a
+    symbol, and pop() round-robins across the symbols that have orders.
+    Cancels and modifies of sent orders go ahead of every new order of every
+    symbol: shards holding them are kept in a separate urgent ring that
+    pop() serves first.
+    The order ID index is shared by all shards so responses, which carry
+    no symbol, can still find their order.
+    """
+    def __init__(self, metrics=None, request_log=None):
+        """
+        Args:
+            metrics (MetricsRegistry | None): Registry the shards report their metrics to
+            request_log (RequestLog | None): Write-ahead log the shards record requests in
+        """
+        self.metrics = metrics
+        self.request_log = request_log
+        self.orders = {}
+        self.ready = threading.Event()
+        self.shards = {}
+        self.shards_lock = threading.Lock()  # Only taken to create a shard
+        self.activations = deque()  # Shards that went from empty to non-empty
+        self.ring = deque()  # Round robin of scheduled shards, owned by the consumer
+        self.urgent_activations = deque()  # Shards whose cancel and modify lanes became non-empty
+        self.urgent_ring = deque()  # Round robin of shards with cancels or modifies, owned by the consumer
+
+    def __len__(self):
+        """
+        Returns the number of orders in the queue.
+        """
+        return sum(len(shard) for shard in list(self.shards.values()))
+
+    def shard(self, symbol_id):
+        """
+        Returns the shard for a symbol, creating it on first use
+        """
+        shard = self.shards.get(symbol_id)
+        if shard is None:
+            with self.shards_lock:
+                shard = self.shards.get(symbol_id)
+                if shard is None:
+                    shard = OrderQueue(orders=self.orders, ready=self.ready, activations=self.activations,
+                                       urgent_activations=self.urgent_activations, metrics=self.metrics,
+                                       request_log=self.request_log)
+                    self.shards[symbol_id] = shard
+        return shard
+
+    def shard_for(self, order_request):
+        """
+        Returns the shard owning a request. Follow-up requests are routed by
+        the symbol of the original order so they always meet it.
+        """
+        order = self.orders.get(order_request.m_orderId)
+        symbol_id = order.m_symbolId if order is not None else order_request.m_symbolId
+        return self.shard(symbol_id)
+
+    def coalescing_stats(self):
+        """
+        Amendments absorbed instead of sent, summed over the shards. See
+        OrderQueue.coalescing_stats.
+        """
+        totals = dict.fromkeys(("modifies_in_place", "modifies_merged", "modifies_dropped",
+                                "cancels_annihilated", "messages_saved", "tokens_saved"), 0)
+        for shard in list(self.shards.values()):
+            for key, value in shard.coalescing_stats().items():
+                totals[key] += value
+        return totals
+
+    def handle_request(self, order_request):
+        """
+        Handles an order request on the shard owning it
+
+        returns:
+            RequestOutcome: what the request did
+        """
+        return self.shard_for(order_request).handle_request(order_request)
+
+    def handle_requests(self, order_requests):
+        """
+        Handles a batch of order requests, taking each shard lock it touches
+        once. Requests keep their relative order within a shard.
+
+        returns:
+            list: the RequestOutcome of each request
+        """
+        batches = {}  # shard -> (positions, requests)
+        new_symbols = {}  # Symbol of orders first seen in this batch, so follow-ups meet them
+        for position, order_request in enumerate(order_requests):
+            order = self.orders.get(order_request.m_orderId)
+            if order is not None:
+                symbol_id = order.m_symbolId
+            else:
+                symbol_id = new_symbols.setdefault(order_request.m_orderId, order_request.m_symbolId)
+            positions, requests = batches.setdefault(self.shard(symbol_id), ([], []))
+            positions.append(position)
+            requests.append(order_request)
+        outcomes = [None] * len(order_requests)
+        for shard, (positions, requests) in batches.items():
+            for position, outcome in zip(positions, shard.handle_requests(requests)):
+                outcomes[position] = outcome
+        return outcomes
+
+    def add_order(self, order_request):
+        self.shard(order_request.m_symbolId).add_order(order_request)
+
+    def restore(self, orders):
+        """
+        Puts orders recovered from a RequestLog back on their shards, see OrderQueue.restore
+        """
+        by_symbol = {}
+        for order in orders:
+            by_symbol.setdefault(order.m_symbolId, []).append(order)
+        for symbol_id, symbol_orders in by_symbol.items():
+            self.shard(symbol_id).restore(symbol_orders)
+
+    def modify_order(self, modify_request):
+        self.shard_for(modify_request).modify_order(modify_request)
+
+    def cancel_order(self, cancel_request):
+        self.shard_for(cancel_request).cancel_order(cancel_request)
+
+    def pop(self, admit=None, allow_new=True, prefer_new=False):
+        """
+        Removes and returns the next message to send, or None if there is
+        none. Cancels and modifies of any symbol go first, then new orders,
+        one per scheduled shard in turn. Single consumer only.
+
+        params:
+            admit: optional predicate called with the message about to be
+                popped; a shard whose message is refused is passed over for
+                this turn, so a rate-limited symbol never holds up the others
+            allow_new: whether new orders may be popped
+            prefer_new: pop a new order ahead of cancels and modifies, if there is one
+        """
+        if not prefer_new:
+            order = self._pop_urgent(admit)
+            if order is not None or not allow_new:
+                return order
+        activations = self.activations
+        while activations:
+            self.ring.append(activations.popleft())
+        for _ in range(len(self.ring)):
+            shard = self.ring.popleft()
+            order, scheduled = shard.pop_scheduled(admit, allow_new, prefer_new)
+            if scheduled:
+                self.ring.append(shard)
+            if order is not None:
+                return order
+        return self._pop_urgent(admit) if prefer_new else None
+
+    def _pop_urgent(self, admit):
+        """Pops the next cancel or modify, round robin over the shards holding them"""
+        activations = self.urgent_activations
+        while activations:
+            self.urgent_ring.append(activations.popleft())
+        for _ in range(len(self.urgent_ring)):
+            shard = self.urgent_ring.popleft()
+            order, urgent = shard.pop_urgent(admit)
+            if urgent:
+                self.urgent_ring.append(shard)
+            if order is not None:
+                return order
+        return None
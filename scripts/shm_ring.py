@@ -0,0 +1,242 @@
+"""
+Single-producer single-consumer ring of fixed-size records in shared memory.
+
+The ring lives in a multiprocessing.shared_memory block: three 64-byte
+header lines (the producer's write count, the consumer's read count, and
+the record size, slot count and closed flag) followed by the slots. Each
+side only ever stores to its own counter, so no lock is needed. The
+producer copies records in and then publishes its count; the consumer
+copies them out and then publishes its own. On x86 (total store order)
+stores become visible to the other process in program order, so that is
+all it takes. Weaker architectures such as aarch64 may reorder them, so
+there each side loads and stores the other side's counters while holding
+a shared multiprocessing lock, whose acquire and release are full memory
+barriers. Python has no cheaper fence.
+
+Records move in batches, one slice copy per batch (two when it wraps), so
+the per-record cost is the encoding and decoding on either side, see
+scripts/codec.py. An empty or full ring is waited out by polling, spinning
+briefly and then sleeping for a growing interval.
+"""
+
+import multiprocessing
+import platform
+import time
+from multiprocessing.shared_memory import SharedMemory
+
+_LINE = 64
+_HEAD = 0                  # Records written, in units of the first header line
+_TAIL = _LINE // 8         # Records read
+_INFO = 2 * _LINE // 8     # Record size, slot count, closed flag, fenced flag
+_DATA = 3 * _LINE
+
+_SPINS = 64
+_MAX_SLEEP = 0.001
+
+# platform.machine() names of hosts with total store order, lowercased
+_ORDERED_STORES = {"x86_64", "amd64", "i386", "i486", "i586", "i686", "x86"}
+
+class ShmRing:
+    """
+    SPSC ring of fixed-size records, see the module docstring. Create it in one
+    process and pass it as an argument to a process started by multiprocessing,
+    which shares the creator's resource tracker and so leaves unlinking the
+    block to the creator, and receives the ring's fence along with it. One
+    process may write the ring and one may read it.
+    """
+    def __init__(self, slots=65536, record_size=32, name=None, fenced=None):
+        """
+        Create a ring
+
+        Args:
+            slots (int): Records the ring holds, rounded up to a power of two
+            record_size (int): Size of every record in bytes
+            name (str | None): Name of the shared memory block, chosen when None
+            fenced (bool | None): Access the counters under the fence lock, see the
+                module docstring. None fences on hosts without x86 store ordering.
+        """
+        if fenced is None:
+            fenced = platform.machine().lower() not in _ORDERED_STORES
+        slots = 1 << max(slots - 1, 1).bit_length()
+        self.shm = SharedMemory(name=name, create=True, size=_DATA + slots * record_size)
+        self.owner = True
+        # A spawn context lock, so it can be passed to processes of any start method
+        self.fence = multiprocessing.get_context("spawn").Lock() if fenced else None
+        self._map()
+        self.header[_INFO] = record_size
+        self.header[_INFO + 1] = slots
+        self.header[_INFO + 3] = int(fenced)
+        self._init_sides()
+
+    @classmethod
+    def attach(cls, name, fence=None):
+        """
+        Open a ring created by another process
+
+        params:
+            name (str): Name of the ring's shared memory block
+            fence (multiprocessing.Lock | None): The creating ring's fence, required if it has one
+        """
+        ring = cls.__new__(cls)
+        ring.shm = SharedMemory(name=name)
+        ring.owner = False
+        ring._map()
+        if ring.header[_INFO + 3] and fence is None:
+            ring.header.release()
+            ring.shm.close()
+            raise ValueError(f"Ring {name} is fenced, attach it with the creating ring's fence")
+        ring.fence = fence if ring.header[_INFO + 3] else None
+        ring._init_sides()
+        return ring
+
+    def __reduce__(self):
+        return ShmRing.attach, (self.name, self.fence)
+
+    def _map(self):
+        self.buffer = self.shm.buf
+        self.header = self.buffer[:_DATA].cast('Q')
+
+    def _init_sides(self):
+        self.record_size = self.header[_INFO]
+        self.slots = self.header[_INFO + 1]
+        self.mask = self.slots - 1
+        self.data = self.buffer[_DATA:_DATA + self.slots * self.record_size]
+        # Last value seen of the other side's counter, reread only when it looks short
+        self.tail_seen = self._load(_TAIL)
+        self.head_seen = self._load(_HEAD)
+
+    def _load(self, index):
+        """Reads a header word written by the other side"""
+        if self.fence is None:
+            return self.header[index]
+        with self.fence:
+            return self.header[index]
+
+    def _store(self, index, value):
+        """Publishes a header word to the other side"""
+        if self.fence is None:
+            self.header[index] = value
+        else:
+            with self.fence:
+                self.header[index] = value
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def __len__(self):
+        """Records written and not read yet"""
+        return self._load(_HEAD) - self._load(_TAIL)
+
+    @property
+    def closed(self):
+        return bool(self._load(_INFO + 2))
+
+    # Producer side
+
+    def try_write(self, data):
+        """
+        Copy as many whole records from data as there is room for
+
+        params:
+            data: bytes-like holding a whole number of records
+
+        returns:
+            int: number of records written
+        """
+        size = self.record_size
+        count = len(data) // size
+        head = self.header[_HEAD]
+        free = self.slots - (head - self.tail_seen)
+        if free < count:
+            self.tail_seen = self._load(_TAIL)
+            free = self.slots - (head - self.tail_seen)
+        count = min(count, free)
+        if count:
+            start = (head & self.mask) * size
+            first = min(count * size, len(self.data) - start)
+            self.data[start:start + first] = data[:first]
+            if first < count * size:
+                self.data[:count * size - first] = data[first:count * size]
+            self._store(_HEAD, head + count)  # Publish after the records are in place
+        return count
+
+    def write(self, data):
+        """Copy every record in data, waiting for room as needed"""
+        view = memoryview(data)
+        size = self.record_size
+        waits = 0
+        while view:
+            written = self.try_write(view)
+            if written:
+                view = view[written * size:]
+                waits = 0
+            else:
+                waits = _backoff(waits)
+
+    def close_writer(self):
+        """Tell the reader no more records follow"""
+        self._store(_INFO + 2, 1)
+
+    # Consumer side
+
+    def try_read(self, max_records=4096):
+        """
+        Copy out up to max_records records
+
+        returns:
+            bytes: whole records, empty when there are none
+        """
+        size = self.record_size
+        tail = self.header[_TAIL]
+        available = self.head_seen - tail
+        if available < max_records:
+            self.head_seen = self._load(_HEAD)
+            available = self.head_seen - tail
+        count = min(available, max_records)
+        if not count:
+            return b''
+        start = (tail & self.mask) * size
+        end = start + count * size
+        if end <= len(self.data):
+            records = bytes(self.data[start:end])
+        else:
+            records = bytes(self.data[start:]) + bytes(self.data[:end - len(self.data)])
+        self._store(_TAIL, tail + count)  # The slots may be reused once this is published
+        return records
+
+    def read(self, max_records=4096, timeout=None):
+        """
+        Wait for records
+
+        returns:
+            bytes | None: whole records, empty on timeout, None once the writer
+                closed the ring and every record was read
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        waits = 0
+        while True:
+            closed = self.closed  # Checked before reading so a last write is never missed
+            records = self.try_read(max_records)
+            if records:
+                return records
+            if closed:
+                return None
+            if deadline is not None and time.monotonic() >= deadline:
+                return b''
+            waits = _backoff(waits)
+
+    def close(self):
+        """Unmap the ring, and free it in the process that created it"""
+        self.header.release()
+        self.data.release()
+        self.buffer = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+def _backoff(waits):
+    """Spin, then sleep for up to _MAX_SLEEP; returns the next wait count"""
+    if waits >= _SPINS:
+        time.sleep(min(_MAX_SLEEP, 1e-6 * (waits - _SPINS + 1) ** 2))
+    return waits + 1
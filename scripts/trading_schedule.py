@@ -0,0 +1,167 @@
+import threading
+import time
+from datetime import datetime, timedelta
+
+from scripts.logger import log
+
+class TradingSchedule:
+    """
+    Daily trading sessions as (start, end) wall-clock times, both ends
+    inclusive. A session whose end is before its start crosses midnight.
+    Sessions may overlap or touch, they are merged.
+    """
+    def __init__(self, sessions):
+        """
+        Args:
+            sessions (list): (start time, end time) pairs
+        """
+        self.sessions = list(sessions)
+
+    def intervals(self, moment, days=2):
+        """
+        Merged open intervals around moment, as [open, close) datetimes,
+        from the day before moment up to days after it
+        """
+        intervals = []
+        first_day = moment.date() - timedelta(days=1)
+        for offset in range(days + 2):
+            day = first_day + timedelta(days=offset)
+            for start, end in self.sessions:
+                opens = datetime.combine(day, start)
+                closes = datetime.combine(day if end >= start else day + timedelta(days=1), end)
+                # The end time is inclusive
+                intervals.append((opens, closes + timedelta(microseconds=1)))
+        intervals.sort()
+        merged = []
+        for opens, closes in intervals:
+            if merged and opens <= merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], closes)
+            else:
+                merged.append([opens, closes])
+        return merged
+
+    def is_open_at(self, moment):
+        """Whether a session is open at a naive local datetime"""
+        return any(opens <= moment < closes for opens, closes in self.intervals(moment, days=0))
+
+    def transitions(self, moment, horizon=timedelta(days=1)):
+        """
+        State at moment and the boundaries that follow it within horizon
+
+        returns:
+            tuple: (open at moment, [(datetime, True when a session opens there), ...])
+        """
+        is_open = False
+        boundaries = []
+        limit = moment + horizon
+        for opens, closes in self.intervals(moment, days=horizon.days + 1):
+            if opens <= moment < closes:
+                is_open = True
+            if moment < opens <= limit:
+                boundaries.append((opens, True))
+            if moment < closes <= limit:
+                boundaries.append((closes, False))
+        return is_open, boundaries
+
+
+class SessionScheduler:
+    """
+    Keeps an `open` flag in step with a TradingSchedule and fires callbacks
+    at the session boundaries.
+
+    The schedule is compiled into monotonic deadlines, so checking whether
+    trading is open is a plain attribute read. A background thread sleeps
+    until the next deadline, flips the flag and calls on_open or on_close,
+    then compiles the following boundaries from the wall clock again so
+    clock adjustments are picked up.
+    """
+    MAX_WAIT = 3600.0  # Recompile at least this often, in seconds
+
+    def __init__(self, schedule, on_open=None, on_close=None):
+        """
+        Args:
+            schedule (TradingSchedule): Sessions to follow
+            on_open (callable | None): Called when a session opens
+            on_close (callable | None): Called when the last open session closes
+        """
+        self.schedule = schedule
+        self.on_open = on_open
+        self.on_close = on_close
+        self.open = False
+        self.deadlines = []  # (monotonic deadline, opens, wall-clock moment), soonest first
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        """Compile the schedule, fire on_open if a session is open right now, start the thread"""
+        self.running = True
+        self.reschedule(self.schedule)
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        return self
+
+    def reschedule(self, schedule):
+        """Switch to a new schedule, firing a callback right away if that changes the state"""
+        with self.lock:
+            self.schedule = schedule
+            changed = self._compile()
+        self.wakeup.set()
+        if changed is not None:
+            self._fire(changed)
+
+    def _compile(self, after=None):
+        """
+        Rebuild the monotonic deadlines from the wall clock, the caller holds the lock
+
+        params:
+            after: boundary datetime just reached; the state is taken as of then, so a
+                wall clock slightly behind the monotonic one cannot replay it
+
+        returns:
+            bool | None: the new state if it changed, None otherwise
+        """
+        now = datetime.now()
+        now_monotonic = time.monotonic()
+        reference = max(now, after) if after is not None else now
+        is_open, boundaries = self.schedule.transitions(reference)
+        self.deadlines = [(now_monotonic + (moment - now).total_seconds(), opens, moment)
+                          for moment, opens in boundaries]
+        if is_open != self.open:
+            self.open = is_open
+            return is_open
+        return None
+
+    def _fire(self, opened):
+        callback = self.on_open if opened else self.on_close
+        if callback is not None:
+            try:
+                callback()
+            except Exception as e:
+                log.error("Error in session %s callback: %s", "open" if opened else "close", e)
+
+    def _run(self):
+        while self.running:
+            with self.lock:
+                deadline = self.deadlines[0][0] if self.deadlines else None
+            timeout = self.MAX_WAIT if deadline is None else min(deadline - time.monotonic(), self.MAX_WAIT)
+            if timeout > 0 and self.wakeup.wait(timeout):
+                self.wakeup.clear()
+                continue  # Rescheduled or stopped
+            if not self.running:
+                return
+            with self.lock:
+                if self.deadlines and self.deadlines[0][0] <= time.monotonic():
+                    changed = self._compile(after=self.deadlines[0][2])
+                else:
+                    changed = self._compile()  # Periodic resync with the wall clock
+            if changed is not None:
+                self._fire(changed)
+
+    def stop(self):
+        """Stop the scheduler thread"""
+        self.running = False
+        self.wakeup.set()
+        if self.thread is not None:
+            self.thread.join()
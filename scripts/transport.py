@@ -0,0 +1,168 @@
+import socket
+import threading
+import time
+
+import os, sys
+
+cwd = os.getcwd()
+if cwd.endswith("scripts"):
+    os.chdir("..")
+sys.path.append(os.getcwd())
+
+from scripts.codec import encode_request, decode_responses, FrameReader, RESPONSE_SIZE
+from scripts.logger import log
+
+_send_log = log.sampled("sends")
+
+def connect(address):
+    """
+    Open a stream socket to a (host, port) tuple or a Unix socket path
+    """
+    if isinstance(address, (str, bytes, os.PathLike)):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    else:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    sock.connect(address)
+    return sock
+
+class SimulatedTransport:
+    """
+    Transport that pretends to send: prints and sleeps for a fixed round trip.
+    No responses are produced, they have to be fed in by hand.
+    """
+    def __init__(self, delay=0.05):
+        self.delay = delay
+
+    def start(self, on_response):
+        pass
+
+    def send(self, order):
+        """Simulate sending order to exchange"""
+        _send_log.info("Sending order %d to exchange", order.m_orderId)
+        # Simulate network delay
+        time.sleep(self.delay)
+
+    def close(self):
+        pass
+
+class _Connection:
+    """
+    One persistent connection. Writes are buffered and flushed by a writer
+    thread, so every send() syscall carries everything queued since the last.
+    """
+    def __init__(self, address, on_response):
+        self.sock = connect(address)
+        self.on_response = on_response
+        self.pending = []
+        self.lock = threading.Lock()
+        self.has_data = threading.Condition(self.lock)
+        self.closed = False
+        self.bytes_sent = 0
+        self.writes = 0
+        self.writer = threading.Thread(target=self._write_loop, daemon=True)
+        self.reader = threading.Thread(target=self._read_loop, daemon=True)
+        self.writer.start()
+        self.reader.start()
+
+    def write(self, data):
+        with self.lock:
+            if self.closed:
+                raise ConnectionError("Connection to exchange is closed")
+            self.pending.append(data)
+            if len(self.pending) == 1:
+                self.has_data.notify()
+
+    def _write_loop(self):
+        while True:
+            with self.lock:
+                while not self.pending and not self.closed:
+                    self.has_data.wait()
+                if not self.pending:
+                    return
+                batch, self.pending = self.pending, []
+            data = b''.join(batch)
+            try:
+                self.sock.sendall(data)
+            except OSError as e:
+                log.error("Error writing to exchange: %s", e)
+                self._mark_closed()
+                return
+            self.bytes_sent += len(data)
+            self.writes += 1
+
+    def _read_loop(self):
+        reader = FrameReader(self.sock, RESPONSE_SIZE)
+        try:
+            while True:
+                frames = reader.read()
+                if frames is None:
+                    self._mark_closed()  # The exchange hung up
+                    return
+                try:
+                    responses = decode_responses(frames)
+                except (ValueError, IndexError) as e:
+                    log.warning("Malformed response from exchange: %s", e)
+                    continue
+                for response in responses:
+                    self.on_response(response)
+        except OSError:
+            pass  # Socket closed
+
+    def _mark_closed(self):
+        """Fail every later write instead of queueing data nobody will send"""
+        with self.lock:
+            self.closed = True
+            self.pending = []
+            self.has_data.notify()
+
+    def close(self):
+        with self.lock:
+            self.closed = True
+            self.has_data.notify()
+        self.writer.join()
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+        self.reader.join(1.0)
+
+class SocketTransport:
+    """
+    Transport to an exchange over persistent stream sockets (TCP or Unix).
+
+    Keeps a small pool of connections. Orders are routed to a connection by
+    order ID, so all messages for one order travel in order on one
+    connection. Each connection batches its writes and reads responses on
+    its own thread, handing them to the on_response callback given to start().
+    """
+    def __init__(self, address, pool_size=2):
+        """
+        Args:
+            address (tuple | str): (host, port) for TCP or a Unix socket path
+            pool_size (int): Number of persistent connections
+        """
+        self.address = address
+        self.pool_size = pool_size
+        self.connections = []
+
+    def start(self, on_response):
+        """Open the connection pool, delivering responses to on_response"""
+        self.connections = [_Connection(self.address, on_response) for _ in range(self.pool_size)]
+
+    def send(self, order):
+        """Queue an order on its connection; returns once it is buffered"""
+        self.connections[hash(order.m_orderId) % len(self.connections)].write(encode_request(order))
+
+    def stats(self):
+        """Bytes and write syscalls issued so far, summed over the pool"""
+        return {
+            "bytes_sent": sum(c.bytes_sent for c in self.connections),
+            "writes": sum(c.writes for c in self.connections),
+        }
+
+    def close(self):
+        """Flush pending writes and close every connection"""
+        for connection in self.connections:
+            connection.close()
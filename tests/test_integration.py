@@ -1,4 +1,5 @@
 import unittest
+import socket
 import time
 from datetime import datetime, timedelta
 
@@ -14,6 +15,13 @@ sys.path.append(os.getcwd())
 
 from scripts.order_management import OrderManagement
 from scripts.order import OrderRequest, OrderResponse, RequestType, ResponseType
+from scripts.mock_exchange import MockExchange
+from scripts.transport import SocketTransport
+from scripts.logger import log, WARNING
+
+# The shared logger drains to sys.stdout on its own thread, keep the per-order,
+# send and response lines out of the test output
+log.set_level(WARNING)
 
 class TestOrderManagementIntegration(unittest.TestCase):
     def setUp(self):
@@ -61,6 +69,7 @@ class TestOrderManagementIntegration(unittest.TestCase):
             request_type=RequestType.Modify
         )
         self.system.handle_order_request(modify_order)
+        time.sleep(0.1)  # Allow time for async processing
         self.assertEqual(self.system.order_queue.orders[1001].m_price, 101.5)
         self.assertEqual(self.system.order_queue.orders[1001].m_qty, 15)
 
@@ -74,6 +83,7 @@ class TestOrderManagementIntegration(unittest.TestCase):
             request_type=RequestType.Cancel
         )
         self.system.handle_order_request(cancel_order)
+        time.sleep(0.1)  # Allow time for async processing
         self.assertNotIn(1001, self.system.order_queue.orders)
 
     def test_rate_limiting(self):
@@ -151,12 +161,14 @@ class TestOrderManagementIntegration(unittest.TestCase):
         # Test during trading hours
         if self.system.is_within_time_window():
             self.system.handle_order_request(order)
+            time.sleep(0.1)  # Allow time for async processing
             self.assertIn(4001, self.system.order_queue.orders)
 
         # Force outside trading hours scenario
         self.system.end_time = (datetime.now() - timedelta(hours=1)).time()
         order.m_orderId = 4002
         self.system.handle_order_request(order)
+        time.sleep(0.1)  # Allow time for async processing
         self.assertNotIn(4002, self.system.order_queue.orders)
 
     def test_multiple_orders_and_responses(self):
@@ -225,5 +237,82 @@ class TestOrderManagementIntegration(unittest.TestCase):
             self.storage_path.unlink()
         os.rmdir(self.temp_dir)
 
+class TestMockExchangeIntegration(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.storage_path = Path(self.temp_dir) / "test_responses.json"
+
+    def tearDown(self):
+        for path in Path(self.temp_dir).iterdir():
+            path.unlink()
+        os.rmdir(self.temp_dir)
+
+    def run_round_trip(self, address, accept_ratio):
+        exchange = MockExchange(address=address, latency="uniform:100:2000", accept_ratio=accept_ratio).start()
+        transport = SocketTransport(exchange.address, pool_size=2)
+        system = OrderManagement(
+            start_time=datetime.min.time(),
+            end_time=datetime.max.time(),
+            order_rate_limit=1000,
+            response_storage_path=self.storage_path,
+            transport=transport
+        )
+        for i in range(50):
+            system.handle_order_request(OrderRequest(i % 3, 100.0 + i, 10, 'B', 7000 + i))
+        deadline = time.time() + 5
+        while len(system.response_handler.responses) < 50 and time.time() < deadline:
+            time.sleep(0.01)
+        system.close()
+        exchange.stop()
+        return system
+
+    def test_tcp_round_trip(self):
+        system = self.run_round_trip(("127.0.0.1", 0), accept_ratio=1.0)
+        self.assertEqual(len(system.response_handler.responses), 50)
+        self.assertEqual(len(system.order_queue.orders), 0)
+        self.assertTrue(all(r['response_type'] == ResponseType.Accept for r in system.response_handler.responses))
+        self.assertGreater(system.transport.stats()["bytes_sent"], 0)
+
+    def test_unix_socket_rejects(self):
+        system = self.run_round_trip(str(Path(self.temp_dir) / "exchange.sock"), accept_ratio=0.0)
+        self.assertEqual(len(system.response_handler.responses), 50)
+        self.assertTrue(all(r['response_type'] == ResponseType.Reject for r in system.response_handler.responses))
+
+    def test_throttled_requests_rejected(self):
+        exchange = MockExchange(latency="fixed:50", throttle=10).start()
+        transport = SocketTransport(exchange.address, pool_size=1)
+        responses = []
+        transport.start(responses.append)
+        for i in range(30):
+            transport.send(OrderRequest(1, 100.0, 10, 'B', i))
+        deadline = time.time() + 5
+        while len(responses) < 30 and time.time() < deadline:
+            time.sleep(0.01)
+        transport.close()
+        exchange.stop()
+        rejects = sum(r.m_responseType == ResponseType.Reject for r in responses)
+        self.assertEqual(len(responses), 30)
+        self.assertGreaterEqual(rejects, 15)
+        self.assertEqual(exchange.throttled, rejects)
+
+    def test_send_fails_after_exchange_hangs_up(self):
+        server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        server.bind(("127.0.0.1", 0))
+        server.listen(1)
+        transport = SocketTransport(server.getsockname(), pool_size=1)
+        transport.start(lambda response: None)
+        peer, _ = server.accept()
+        peer.close()
+        server.close()
+        # The next sends are refused instead of being queued on a dead connection
+        deadline = time.time() + 5
+        with self.assertRaises(ConnectionError):
+            while time.time() < deadline:
+                transport.send(OrderRequest(1, 100.0, 10, 'B', 1))
+                time.sleep(0.01)
+        self.assertEqual(transport.connections[0].pending, [])
+        transport.close()
+
+
 if __name__ == "__main__":
     unittest.main()
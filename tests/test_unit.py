@@ -10,30 +10,70 @@ if cwd.endswith("tests"):
     os.chdir("..")
 sys.path.append(os.getcwd())
 
-from datetime import datetime, time
+from datetime import datetime, time, timedelta
 from unittest.mock import patch
 from scripts.order import OrderRequest, OrderResponse, RequestType, ResponseType
-from scripts.order_queue import OrderQueue
+from scripts.order_queue import OrderQueue, RequestOutcome
+from scripts.order_store import PendingOrderStore
+from scripts.latency_histogram import LatencyHistogram, LatencyRecorder
+from scripts.sharded_order_queue import ShardedOrderQueue
 from scripts.order_processor import OrderProcessor
+from scripts.rate_limiter import TokenBucket, HierarchicalRateLimiter
+from scripts.trading_schedule import TradingSchedule, SessionScheduler
+from scripts.metrics import MetricsRegistry, start_http_server, write_textfile
+from scripts.logger import RingLogger, WARNING, log
+from scripts.request_log import RequestLog
+from scripts.response_store import ResponseStore
+from scripts.response_window import ResponseWindow
+from scripts.shm_ring import ShmRing
+from scripts.multiprocess_pipeline import MultiProcessPipeline
+try:
+    import numpy
+    from scripts import response_analytics
+except ImportError:
+    numpy = None
 from scripts.response_handler import ResponseHandler
 from scripts.order_management import OrderManagement
+from scripts.journal import Journal, migrate_legacy_json
+from scripts.response_writer import ResponseWriter, Durability
+from scripts.ingress_executor import IngressExecutor, Admission
+from scripts.async_order_management import AsyncOrderManagement, AsyncTokenBucket
+from scripts import codec
+from scripts.mock_exchange import MockExchange
+from scripts.transport import SocketTransport
+import asyncio
+import socket
+import threading
+import time as time_module
 from unittest.mock import Mock
+import io
+import json
+import math
+import random
+import shutil
+import struct
+import functools
+import urllib.request
+
+# The shared logger drains to sys.stdout on its own thread, keep the per-order,
+# send and response lines out of the test output
+log.set_level(WARNING)
 
 class TestOrderSystem(unittest.TestCase):
     def setUp(self):
         self.order_queue = OrderQueue()
         self.start_time = time(10, 0)
         self.end_time = time(18, 0)
-        self.order_management = OrderManagement(self.start_time, self.end_time, 5)
         # Create a temporary file for response storage
         self.temp_dir = tempfile.mkdtemp()
         self.storage_path = Path(self.temp_dir) / "test_responses.json"
+        self.order_management = OrderManagement(self.start_time, self.end_time, 5,
+                                                response_storage_path=Path(self.temp_dir) / "responses.json")
 
     def tearDown(self):
-        # Clean up temporary files
-        if self.storage_path.exists():
-            self.storage_path.unlink()
-        os.rmdir(self.temp_dir)
+        # Stop the system's threads and clean up temporary files
+        self.order_management.close()
+        shutil.rmtree(self.temp_dir)
 
     def create_sample_order(self):
         return OrderRequest(
@@ -91,6 +131,29 @@ class TestOrderSystem(unittest.TestCase):
         self.assertEqual(len(self.order_queue.orders), 0)
         self.assertEqual(len(self.order_queue.queue), 0)
 
+    def test_order_queue_cancel_keeps_fifo_order(self):
+        for i in range(5):
+            self.order_queue.add_order(OrderRequest(1, 100.5, 10, 'B', i))
+        # Cancel head, middle and tail
+        for order_id in (0, 2, 4):
+            self.order_queue.cancel_order(OrderRequest(1, 0, 0, 'B', order_id, RequestType.Cancel))
+        self.assertEqual([o.m_orderId for o in self.order_queue.queue], [1, 3])
+        self.assertEqual(self.order_queue.pop().m_orderId, 1)
+        self.assertEqual(self.order_queue.pop().m_orderId, 3)
+        self.assertIsNone(self.order_queue.pop())
+
+    def test_order_queue_cancel_after_send(self):
+        order = self.create_sample_order()
+        self.order_queue.add_order(order)
+        self.assertIs(self.order_queue.pop(), order)
+        cancel = OrderRequest(1, 0, 0, 'B', 123, RequestType.Cancel)
+        self.order_queue.cancel_order(cancel)
+        self.assertNotIn(123, self.order_queue.orders)
+        # The order is already at the exchange, the cancel has to follow it
+        self.assertEqual(len(self.order_queue.queue), 0)
+        self.assertIs(self.order_queue.pop(), cancel)
+        self.assertEqual(len(self.order_queue), 0)
+
     # OrderProcessor Tests
     def test_order_processor_initialization(self):
         processor = OrderProcessor(5, self.order_queue)
@@ -98,7 +161,7 @@ class TestOrderSystem(unittest.TestCase):
         self.assertEqual(processor.tokens, 5)  # Should start with full bucket
         self.assertEqual(processor.max_tokens, 5)
 
-    @patch('time.time')
+    @patch('time.monotonic')
     def test_order_processor_rate_limiting(self, mock_time):
         # Set initial time
         mock_time.return_value = 1000.0
@@ -125,7 +188,7 @@ class TestOrderSystem(unittest.TestCase):
         self.assertEqual(processor.tokens, 0)  # Should have used all tokens
         self.assertEqual(processor.send.call_count, 2)  # Send should have been called twice
 
-    @patch('time.time')
+    @patch('time.monotonic')
     def test_token_refill(self, mock_time):
         mock_time.return_value = 1000.0
         processor = OrderProcessor(2, self.order_queue)  # 2 tokens per second
@@ -139,6 +202,18 @@ class TestOrderSystem(unittest.TestCase):
         
         self.assertEqual(processor.tokens, 1)  # Should have gained 1 token (2 tokens/sec * 0.5 sec)
 
+    @patch('time.monotonic')
+    def test_tokens_ignore_wall_clock_steps(self, mock_monotonic):
+        mock_monotonic.return_value = 1000.0
+        processor = OrderProcessor(2, self.order_queue)
+        processor.tokens = 0
+        # An hour back and then a day forward on the wall clock, 0.5 s of real time
+        with patch('time.time', return_value=1000.0 - 3600):
+            processor.refill_tokens()
+        mock_monotonic.return_value = 1000.5
+        with patch('time.time', return_value=1000.0 + 86400):
+            self.assertEqual(processor.tokens, 1)
+
     # ResponseHandler Tests
     def test_response_handler(self):
         handler = ResponseHandler(self.order_queue, storage_path=self.storage_path)
@@ -163,6 +238,1334 @@ class TestOrderSystem(unittest.TestCase):
         self.assertEqual(len(new_handler.responses), 1)
         self.assertEqual(new_handler.responses[0]['order_id'], 123)
 
+class TestLatencyHistogram(unittest.TestCase):
+    def test_percentiles_within_precision(self):
+        histogram = LatencyHistogram()
+        for value in range(1, 100001):
+            histogram.record(value * 1000)  # 1 us .. 100 ms
+        percentiles = histogram.percentiles()
+        for percentile, expected in ((50.0, 50000000), (90.0, 90000000), (99.0, 99000000), (99.9, 99900000)):
+            self.assertAlmostEqual(percentiles[percentile] / expected, 1.0, delta=1 / 64)
+        self.assertEqual(histogram.max, 100000000)
+        self.assertEqual(histogram.summary()["count"], 100000)
+
+    def test_small_values_are_exact_and_overflow_clamped(self):
+        histogram = LatencyHistogram(max_value_ns=1 << 20)
+        histogram.record(3)
+        histogram.record(1 << 30)
+        self.assertEqual(histogram.percentiles((50.0,))[50.0], 3)
+        self.assertEqual(histogram.percentiles((100.0,))[100.0], 1 << 30)
+
+    def test_recorder_breakdown_and_reset(self):
+        recorder = LatencyRecorder()
+        recorder.record(1, ResponseType.Accept, 1000)
+        recorder.record(1, ResponseType.Reject, 3000)
+        recorder.record(2, ResponseType.Accept, 2000)
+        snapshot = recorder.snapshot(reset=True)
+        self.assertEqual(snapshot["overall"]["count"], 3)
+        self.assertEqual(snapshot["by_symbol"][1]["count"], 2)
+        self.assertEqual(snapshot["by_symbol"][2]["max"], 2000)
+        self.assertEqual(snapshot["by_response_type"][ResponseType.Reject]["p50"], 3000)
+        self.assertEqual(recorder.snapshot()["overall"]["count"], 0)
+
+    def test_response_handler_records_latency(self):
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir)
+        order_queue = OrderQueue()
+        handler = ResponseHandler(order_queue, storage_path=Path(temp_dir) / "responses.json")
+        order_queue.add_order(OrderRequest(5, 100.5, 10, 'B', 1))
+        handler.handle_response(OrderResponse(1, ResponseType.Accept))
+        snapshot = handler.latency_snapshot()
+        self.assertEqual(snapshot["by_symbol"][5]["count"], 1)
+        self.assertGreater(snapshot["by_response_type"][ResponseType.Accept]["max"], 0)
+        self.assertEqual(handler.responses[0]["symbol_id"], 5)
+        handler.close()
+
+
+class TestCompactOrders(unittest.TestCase):
+    def test_orders_have_no_instance_dict(self):
+        order = OrderRequest(1, 100.5, 10, 'B', 1)
+        self.assertFalse(hasattr(order, '__dict__'))
+        self.assertFalse(hasattr(OrderResponse(1, ResponseType.Accept), '__dict__'))
+
+    def test_pending_order_store_round_trip(self):
+        store = PendingOrderStore()
+        order = OrderRequest(7, 100.25, 10, 'S', 42, RequestType.Modify)
+        slot = store.add(order)
+        stored = store.get(42)
+        self.assertEqual((stored.m_symbolId, stored.m_price, stored.m_qty, stored.m_side, stored.request_type),
+                         (7, 100.25, 10, 'S', RequestType.Modify))
+        self.assertEqual(stored.timestamp_ns, order.timestamp_ns)
+
+        store.modify(42, 101.5, 3)
+        self.assertEqual((store.get(42).m_price, store.get(42).m_qty), (101.5, 3))
+
+        store.remove(42)
+        self.assertNotIn(42, store)
+        self.assertIsNone(store.get(42))
+        # Freed slots are reused
+        self.assertEqual(store.add(OrderRequest(7, 99.0, 1, 'B', 43)), slot)
+        self.assertEqual(len(store), 1)
+
+
+class TestShardedOrderQueue(unittest.TestCase):
+    def setUp(self):
+        self.order_queue = ShardedOrderQueue()
+
+    def test_round_robin_across_symbols_fifo_within(self):
+        for order_id, symbol in enumerate([1, 1, 1, 2, 2, 3]):
+            self.order_queue.handle_request(OrderRequest(symbol, 100.0, 10, 'B', order_id))
+        self.assertEqual(len(self.order_queue), 6)
+        popped = []
+        while True:
+            order = self.order_queue.pop()
+            if order is None:
+                break
+            popped.append((order.m_symbolId, order.m_orderId))
+        self.assertEqual(popped, [(1, 0), (2, 3), (3, 5), (1, 1), (2, 4), (1, 2)])
+
+    def test_follow_ups_routed_to_original_symbol(self):
+        self.order_queue.handle_request(OrderRequest(1, 100.0, 10, 'B', 7))
+        # Modify and cancel carrying the wrong symbol still reach the order
+        self.order_queue.handle_request(OrderRequest(9, 101.0, 5, 'B', 7, RequestType.Modify))
+        self.assertEqual(self.order_queue.orders[7].m_price, 101.0)
+        self.order_queue.handle_request(OrderRequest(9, 0, 0, 'B', 7, RequestType.Cancel))
+        self.assertNotIn(7, self.order_queue.orders)
+        self.assertIsNone(self.order_queue.pop())
+
+    def test_shard_rescheduled_after_draining(self):
+        self.order_queue.add_order(OrderRequest(1, 100.0, 10, 'B', 1))
+        self.assertEqual(self.order_queue.pop().m_orderId, 1)
+        self.assertIsNone(self.order_queue.pop())
+        self.order_queue.add_order(OrderRequest(1, 100.0, 10, 'B', 2))
+        self.assertTrue(self.order_queue.ready.is_set())
+        self.assertEqual(self.order_queue.pop().m_orderId, 2)
+
+
+class TestEventDrivenProcessor(unittest.TestCase):
+    def start_processor(self, rate):
+        order_queue = OrderQueue()
+        processor = OrderProcessor(rate, order_queue)
+        processor.sent = []
+        processor.send = lambda order: processor.sent.append((order.m_orderId, time_module.monotonic()))
+        thread = threading.Thread(target=processor.process_queue, daemon=True)
+        thread.start()
+        self.addCleanup(thread.join, 1.0)
+        self.addCleanup(processor.stop)
+        return order_queue, processor
+
+    def wait_for(self, processor, count, timeout=2.0):
+        deadline = time_module.monotonic() + timeout
+        while len(processor.sent) < count and time_module.monotonic() < deadline:
+            time_module.sleep(0.001)
+
+    def test_wakes_immediately_on_enqueue(self):
+        order_queue, processor = self.start_processor(5)
+        time_module.sleep(0.05)  # Let the processor block on the empty queue
+        queued_at = time_module.monotonic()
+        order_queue.add_order(OrderRequest(1, 100.5, 10, 'B', 1))
+        self.wait_for(processor, 1)
+        self.assertLess(processor.sent[0][1] - queued_at, 0.05)
+
+    def test_throughput_follows_rate_limit(self):
+        order_queue, processor = self.start_processor(2000)
+        for i in range(2000):
+            order_queue.add_order(OrderRequest(1, 100.5, 10, 'B', i))
+        self.wait_for(processor, 2000)
+        self.assertEqual(len(processor.sent), 2000)
+
+    def test_waits_for_next_token(self):
+        order_queue, processor = self.start_processor(10)
+        for i in range(12):
+            order_queue.add_order(OrderRequest(1, 100.5, 10, 'B', i))
+        self.wait_for(processor, 12)
+        # The first 10 use the full bucket, the rest are paced at 10/s
+        self.assertGreaterEqual(processor.sent[11][1] - processor.sent[0][1], 0.15)
+
+
+class TestPipelinedSends(unittest.TestCase):
+    def run_processor(self, max_in_flight, count):
+        order_queue = OrderQueue()
+        processor = OrderProcessor(1000, order_queue, max_in_flight=max_in_flight)
+        processor.sent = []
+        processor.peak = 0
+
+        def send(order):
+            processor.peak = max(processor.peak, processor.in_flight)
+            time_module.sleep(0.05)  # Round trip
+            processor.sent.append(order.m_orderId)
+        processor.send = send
+        for i in range(count):
+            order_queue.add_order(OrderRequest(1, 100.5, 10, 'B', i))
+        thread = threading.Thread(target=processor.process_queue, daemon=True)
+        start = time_module.monotonic()
+        thread.start()
+        deadline = start + 5.0
+        while len(processor.sent) < count and time_module.monotonic() < deadline:
+            time_module.sleep(0.005)
+        elapsed = time_module.monotonic() - start
+        processor.close()
+        thread.join(1.0)
+        return processor, elapsed
+
+    def test_window_overlaps_round_trips(self):
+        processor, elapsed = self.run_processor(max_in_flight=20, count=40)
+        self.assertEqual(sorted(processor.sent), list(range(40)))
+        # Serially this would take 40 round trips (2 s)
+        self.assertLess(elapsed, 1.0)
+        self.assertLessEqual(processor.peak, 20)
+        self.assertEqual(processor.in_flight, 0)
+
+    def test_window_of_one_is_serial(self):
+        processor, elapsed = self.run_processor(max_in_flight=1, count=4)
+        self.assertEqual(processor.sent, [0, 1, 2, 3])
+        self.assertEqual(processor.peak, 1)
+        self.assertGreaterEqual(elapsed, 0.2)
+
+
+class TestJournal(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.path = Path(self.temp_dir) / "journal.json"
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_append_and_replay(self):
+        journal = Journal(self.path)
+        for i in range(3):
+            journal.append({"order_id": i})
+        journal.close()
+
+        reopened = Journal(self.path)
+        self.assertEqual([r["order_id"] for r in reopened.replay()], [0, 1, 2])
+        reopened.close()
+
+    def test_segment_rotation(self):
+        journal = Journal(self.path, segment_size=64)
+        for i in range(20):
+            journal.append({"order_id": i, "response_type": "ResponseType.Accept"})
+        self.assertGreater(len(journal.sealed_segments()), 1)
+        # Replay streams sealed segments first, in order, then the active one
+        self.assertEqual([r["order_id"] for r in journal.replay()], list(range(20)))
+        journal.close()
+
+    def test_legacy_json_migration(self):
+        with open(self.path, 'w') as f:
+            json.dump([{"order_id": 1}, {"order_id": 2}], f, indent=4)
+        self.assertEqual(migrate_legacy_json(self.path), 2)
+        self.assertIsNone(migrate_legacy_json(self.path))  # Already migrated
+
+        journal = Journal(self.path)
+        journal.append({"order_id": 3})
+        self.assertEqual([r["order_id"] for r in journal.replay()], [1, 2, 3])
+        journal.close()
+
+    def test_torn_tail_is_dropped(self):
+        with open(self.path, 'w') as f:
+            f.write('{"order_id":1}\n{"order_id":')
+        journal = Journal(self.path)
+        journal.append({"order_id": 2})
+        self.assertEqual([r["order_id"] for r in journal.replay()], [1, 2])
+        journal.close()
+
+class TestResponseWriter(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.path = Path(self.temp_dir) / "responses.json"
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_flush_persists_all_records(self):
+        for durability in Durability:
+            journal = Journal(self.path)
+            writer = ResponseWriter(journal, durability=durability, batch_size=7)
+            for i in range(100):
+                writer.submit({"order_id": i})
+            writer.flush()
+            self.assertEqual(len(list(journal.replay())), 100)
+            writer.close()
+            self.path.unlink()
+
+    def test_close_drains_queue(self):
+        journal = Journal(self.path)
+        writer = ResponseWriter(journal, flush_interval=1.0)
+        for i in range(50):
+            writer.submit({"order_id": i})
+        writer.close()
+        self.assertEqual([r["order_id"] for r in Journal(self.path).replay()], list(range(50)))
+        with self.assertRaises(RuntimeError):
+            writer.submit({"order_id": 50})
+
+    def test_backpressure_when_full(self):
+        journal = Journal(self.path)
+        writer = ResponseWriter(journal, max_pending=1, batch_size=1)
+        # Stall the writer so the queue stays full
+        with journal.lock:
+            writer.submit({"order_id": 1})
+            while not writer.queue.empty():
+                pass
+            writer.submit({"order_id": 2})
+            self.assertFalse(writer.submit({"order_id": 3}, timeout=0.01))
+        writer.close()
+        self.assertEqual(len(list(Journal(self.path).replay())), 2)
+
+    def test_handler_with_background_writer(self):
+        order_queue = OrderQueue()
+        handler = ResponseHandler(order_queue, storage_path=self.path, durability=Durability.Flush)
+        order_queue.add_order(OrderRequest(1, 100.5, 10, 'B', 7))
+        handler.handle_response(OrderResponse(7, ResponseType.Accept))
+        handler.flush()
+        reloaded = ResponseHandler(order_queue, storage_path=self.path)
+        self.assertEqual(reloaded.responses[0]['order_id'], 7)
+        self.assertEqual(reloaded.responses[0]['response_type'], str(ResponseType.Accept))
+        handler.close()
+        reloaded.close()
+
+class TestIngressExecutor(unittest.TestCase):
+    def test_same_key_runs_in_order(self):
+        executor = IngressExecutor(num_workers=4, queue_depth=10000)
+        seen = {key: [] for key in range(8)}
+        for i in range(500):
+            for key in seen:
+                executor.submit(key, seen[key].append, i)
+        executor.join()
+        for key in seen:
+            self.assertEqual(seen[key], list(range(500)))
+        executor.shutdown()
+
+    def test_busy_when_queue_full(self):
+        executor = IngressExecutor(num_workers=1, queue_depth=1)
+        gate = threading.Event()
+        self.assertEqual(executor.submit(1, gate.wait), Admission.Accepted)
+        while not executor.queues[0].empty():
+            pass  # Wait for the worker to pick up the blocking task
+        self.assertEqual(executor.submit(1, print, "queued"), Admission.Accepted)
+        self.assertEqual(executor.submit(1, print, "rejected"), Admission.Busy)
+        gate.set()
+        executor.shutdown()
+
+    def test_busy_after_shutdown(self):
+        executor = IngressExecutor(num_workers=2)
+        executor.shutdown()
+        self.assertEqual(executor.submit(1, print, "dropped", block=True), Admission.Busy)
+        self.assertTrue(all(task_queue.empty() for task_queue in executor.queues))
+        executor.shutdown()
+
+    def test_close_handles_responses_to_last_sends(self):
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir)
+        order_management = OrderManagement(time(0, 0), time(23, 59, 59), 5,
+                                           response_storage_path=Path(temp_dir) / "responses.json")
+        order_management.order_queue.add_order(OrderRequest(1, 100.5, 10, 'B', 1))
+        # The exchange answers while the transport is being closed, after the processor stopped
+        transport_close = order_management.transport.close
+        def close():
+            order_management.handle_order_response(OrderResponse(1, ResponseType.Accept))
+            transport_close()
+        order_management.transport.close = close
+        order_management.close()
+        self.assertEqual([response["order_id"] for response in order_management.response_handler.responses], [1])
+
+    def test_response_after_ingress_shutdown_is_handled(self):
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir)
+        order_management = OrderManagement(time(0, 0), time(23, 59, 59), 5,
+                                           response_storage_path=Path(temp_dir) / "responses.json")
+        self.addCleanup(order_management.close)
+        order_management.order_queue.add_order(OrderRequest(1, 100.5, 10, 'B', 1))
+        order_management.ingress.shutdown()  # As close() does once the transport is closed
+        order_management.handle_order_response(OrderResponse(1, ResponseType.Accept))
+        self.assertEqual([response["order_id"] for response in order_management.response_handler.responses], [1])
+        self.assertNotIn(1, order_management.order_queue.orders)
+
+    def test_order_management_rejects_when_busy(self):
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir)
+        order_management = OrderManagement(time(0, 0), time(23, 59, 59), 5,
+                                           response_storage_path=Path(temp_dir) / "responses.json",
+                                           num_workers=1, ingress_queue_depth=1)
+        gate = threading.Event()
+        order_management.ingress.submit(0, gate.wait)
+        while not order_management.ingress.queues[0].empty():
+            pass
+        first = order_management.handle_order_request(OrderRequest(1, 100.5, 10, 'B', 1))
+        second = order_management.handle_order_request(OrderRequest(1, 100.5, 10, 'B', 2))
+        self.assertEqual(first, Admission.Accepted)
+        self.assertEqual(second, Admission.Busy)
+        gate.set()
+        order_management.close()
+
+class TestAsyncOrderManagement(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.path = Path(self.temp_dir) / "responses.json"
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def create_system(self, rate):
+        system = AsyncOrderManagement(time(0, 0), time(23, 59, 59), rate, response_storage_path=self.path)
+        system.sent = []
+
+        async def send(order):
+            system.sent.append(order.m_orderId)
+            await asyncio.sleep(0.05)
+        system.send = send
+        return system
+
+    async def test_thousands_in_flight(self):
+        async with self.create_system(100000) as system:
+            await asyncio.gather(*(system.submit(OrderRequest(i % 10, 100.0, 10, 'B', i)) for i in range(1000)))
+            while len(system.sent) < 1000:
+                await asyncio.sleep(0.01)
+            # Every send sleeps 50 ms, only concurrent sends finish this quickly
+            self.assertGreater(len(system.in_flight), 100)
+            await asyncio.gather(*(system.on_response(OrderResponse(i, ResponseType.Accept)) for i in range(1000)))
+        self.assertEqual(len(list(Journal(self.path).replay())), 1000)
+
+    async def test_same_queue_semantics(self):
+        async with self.create_system(5) as system:
+            await system.submit(OrderRequest(1, 100.0, 10, 'B', 1))
+            await system.submit(OrderRequest(1, 101.0, 15, 'B', 1, RequestType.Modify))
+            self.assertEqual(system.order_queue.orders[1].m_price, 101.0)
+            await system.submit(OrderRequest(1, 0, 0, 'B', 1, RequestType.Cancel))
+            self.assertNotIn(1, system.order_queue.orders)
+            self.assertEqual(len(system.order_queue), 0)
+
+    async def test_token_bucket_paces_acquires(self):
+        bucket = AsyncTokenBucket(50, capacity=1)
+        start = time_module.monotonic()
+        for _ in range(6):
+            await bucket.acquire()
+        self.assertGreaterEqual(time_module.monotonic() - start, 0.09)
+
+
+class TestCodec(unittest.TestCase):
+    def test_request_round_trip(self):
+        order = OrderRequest(42, 101.2345, 300, 'S', 7, RequestType.Modify)
+        message = codec.encode_request(order)
+        self.assertEqual(len(message), codec.REQUEST_SIZE)
+        decoded = codec.decode_request(message)
+        self.assertEqual((decoded.m_symbolId, decoded.m_price, decoded.m_qty, decoded.m_side,
+                          decoded.m_orderId, decoded.request_type), (42, 101.2345, 300, 'S', 7, RequestType.Modify))
+
+    def test_response_round_trip(self):
+        decoded = codec.decode_response(codec.encode_response(OrderResponse(9, ResponseType.Reject)))
+        self.assertEqual((decoded.m_orderId, decoded.m_responseType), (9, ResponseType.Reject))
+
+    def test_batch_into_preallocated_buffer(self):
+        orders = [OrderRequest(i % 3, 100.0 + i, i, 'B', i) for i in range(10)]
+        buffer = bytearray(16 * codec.REQUEST_SIZE)
+        view = codec.encode_requests(orders, buffer)
+        self.assertEqual(len(view), 10 * codec.REQUEST_SIZE)
+        self.assertIs(view.obj, buffer)
+        self.assertEqual([order.m_price for order in codec.decode_requests(view)], [100.0 + i for i in range(10)])
+        # A slice of the batch decodes on its own, without copying
+        self.assertEqual(codec.decode_request(view[3 * codec.REQUEST_SIZE:]).m_orderId, 3)
+        with self.assertRaises(ValueError):
+            codec.encode_requests(orders, bytearray(codec.REQUEST_SIZE))
+
+    def test_wrong_kind_rejected(self):
+        with self.assertRaises(ValueError):
+            codec.decode_request(codec.encode_response(OrderResponse(1, ResponseType.Accept)) * 2)
+
+    def test_batch_with_wrong_kind_rejected(self):
+        responses = codec.encode_responses([OrderResponse(i, ResponseType.Accept) for i in range(4)])
+        with self.assertRaises(ValueError):
+            codec.decode_requests(responses)
+        orders = [OrderRequest(1, 100.0, 10, 'B', i) for i in range(3)]
+        with self.assertRaises(ValueError):
+            codec.decode_responses(codec.encode_requests(orders))
+        # A stray message in the middle of a batch is caught too
+        mixed = bytearray(codec.encode_requests(orders))
+        mixed[codec.REQUEST_SIZE] = codec.RESPONSE_KIND
+        with self.assertRaises(ValueError):
+            codec.decode_requests(mixed)
+        self.assertEqual(codec.decode_requests(b''), [])
+
+    def test_frame_reader_reassembles_partial_frames(self):
+        left, right = socket.socketpair()
+        try:
+            data = codec.encode_responses([OrderResponse(i, ResponseType.Accept) for i in range(3)]).tobytes()
+            reader = codec.FrameReader(right, codec.RESPONSE_SIZE)
+            left.sendall(data[:20])
+            self.assertEqual([r.m_orderId for r in codec.decode_responses(reader.read())], [0])
+            left.sendall(data[20:])
+            self.assertEqual([r.m_orderId for r in codec.decode_responses(reader.read())], [1, 2])
+            left.close()
+            self.assertIsNone(reader.read())
+        finally:
+            right.close()
+
+class TestBatchApi(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.path = Path(self.temp_dir) / "responses.json"
+        self.system = OrderManagement(time(0, 0), time(23, 59), 1000, response_storage_path=self.path,
+                                      durability=None)
+
+    def tearDown(self):
+        self.system.close()
+        shutil.rmtree(self.temp_dir)
+
+    def test_submit_many_outcomes(self):
+        with patch.object(self.system.session, 'open', True):
+            outcomes = self.system.submit_many([
+                OrderRequest(1, 100.0, 10, 'B', 1),
+                OrderRequest(2, 50.0, 5, 'S', 2),
+                OrderRequest(1, 101.0, 20, 'B', 1, RequestType.Modify),
+                OrderRequest(2, 0, 0, 'S', 2, RequestType.Cancel),
+                OrderRequest(1, 100.0, 10, 'B', 1),
+            ])
+        self.assertEqual(outcomes, [RequestOutcome.Added, RequestOutcome.Added, RequestOutcome.Modified,
+                                    RequestOutcome.Canceled, RequestOutcome.Ignored])
+        self.assertEqual(self.system.order_queue.orders[1].m_price, 101.0)
+        self.assertNotIn(2, self.system.order_queue.orders)
+
+    def test_submit_many_outside_window(self):
+        with patch.object(self.system.session, 'open', False):
+            outcomes = self.system.submit_many([OrderRequest(1, 100.0, 10, 'B', i) for i in range(3)])
+        self.assertEqual(outcomes, [RequestOutcome.Rejected] * 3)
+        self.assertEqual(len(self.system.order_queue.orders), 0)
+
+    def test_on_responses_single_write(self):
+        with patch.object(self.system.session, 'open', True):
+            self.system.submit_many([OrderRequest(i % 2, 100.0, 10, 'B', i) for i in range(4)])
+        journal = self.system.response_handler.journal
+        with patch.object(journal, 'append_many', wraps=journal.append_many) as append_many:
+            matched = self.system.on_responses([OrderResponse(0, ResponseType.Accept),
+                                                OrderResponse(99, ResponseType.Accept),
+                                                OrderResponse(3, ResponseType.Reject)])
+        self.assertEqual(matched, [True, False, True])
+        self.assertEqual(append_many.call_count, 1)
+        self.assertEqual(self.system.response_handler.latency_snapshot()["overall"]["count"], 2)
+        self.system.response_handler.flush()
+        self.assertEqual([r["order_id"] for r in Journal(self.path).replay()], [0, 3])
+
+    def test_writer_submit_many(self):
+        journal = Journal(Path(self.temp_dir) / "batched.json")
+        writer = ResponseWriter(journal, batch_size=4)
+        writer.submit({"order_id": 0})
+        writer.submit_many([{"order_id": i} for i in range(1, 10)])
+        writer.flush()
+        self.assertEqual([r["order_id"] for r in journal.replay()], list(range(10)))
+        writer.close()
+
+
+class TestHierarchicalRateLimiting(unittest.TestCase):
+    def test_token_bucket_refills_lazily(self):
+        bucket = TokenBucket(4, now=100.0)
+        bucket.tokens = 0
+        bucket.refill(100.5)
+        self.assertEqual(bucket.tokens, 2)
+        bucket.refill(200.0)
+        self.assertEqual(bucket.tokens, 4)  # Capped at capacity
+
+    def test_all_levels_must_have_a_token(self):
+        limiter = HierarchicalRateLimiter(symbol_rate=3, side_rate=2, symbol_rates={7: 1})
+        buy, sell = OrderRequest(1, 100.0, 10, 'B', 1), OrderRequest(1, 100.0, 10, 'S', 2)
+        self.assertEqual(limiter.acquire(buy, 0.0), 0.0)
+        self.assertEqual(limiter.acquire(buy, 0.0), 0.0)
+        self.assertGreater(limiter.acquire(buy, 0.0), 0.0)  # Side exhausted
+        self.assertEqual(limiter.acquire(sell, 0.0), 0.0)
+        self.assertGreater(limiter.acquire(sell, 0.0), 0.0)  # Symbol exhausted
+        # The refused side check did not take a symbol token
+        self.assertEqual(limiter.symbol_buckets[1].tokens, 0)
+        hot = OrderRequest(7, 100.0, 10, 'B', 3)
+        self.assertEqual(limiter.acquire(hot, 0.0), 0.0)
+        self.assertAlmostEqual(limiter.acquire(hot, 0.0), 1.0)
+        self.assertEqual(limiter.refused, 3)
+
+    def test_blocked_symbol_does_not_block_others(self):
+        order_queue = ShardedOrderQueue()
+        processor = OrderProcessor(1000, order_queue, rate_limiter=HierarchicalRateLimiter(symbol_rate=2))
+        processor.sent = []
+        processor.send = lambda order: processor.sent.append(order.m_orderId)
+        # A hot symbol with a deep backlog queued ahead of a quiet one
+        for i in range(50):
+            order_queue.add_order(OrderRequest(1, 100.0, 10, 'B', i))
+        order_queue.add_order(OrderRequest(2, 100.0, 10, 'B', 100))
+        thread = threading.Thread(target=processor.process_queue, daemon=True)
+        thread.start()
+        deadline = time_module.monotonic() + 2.0
+        while 100 not in processor.sent and time_module.monotonic() < deadline:
+            time_module.sleep(0.005)
+        time_module.sleep(0.05)
+        processor.close()
+        thread.join(1.0)
+        self.assertIn(100, processor.sent)
+        self.assertEqual(len([order_id for order_id in processor.sent if order_id != 100]), 2)
+        self.assertEqual(len(order_queue), 48)
+
+
+class TestPriorityLanes(unittest.TestCase):
+    def send_all(self, order_queue, count):
+        for i in range(count):
+            order_queue.add_order(OrderRequest(i % 4, 100.0, 10, 'B', i))
+        return [order_queue.pop() for _ in range(count)]
+
+    def test_cancel_and_modify_preempt_new_orders(self):
+        order_queue = ShardedOrderQueue()
+        self.send_all(order_queue, 8)
+        for i in range(100, 200):
+            order_queue.add_order(OrderRequest(i % 4, 100.0, 10, 'B', i))
+        modify = OrderRequest(0, 99.0, 5, 'B', 0, RequestType.Modify)
+        cancel = OrderRequest(0, 0, 0, 'B', 4, RequestType.Cancel)
+        order_queue.handle_request(modify)
+        order_queue.handle_request(cancel)
+        self.assertIs(order_queue.pop(), cancel)
+        self.assertIs(order_queue.pop(), modify)
+        self.assertEqual(order_queue.pop().request_type, RequestType.New)
+        self.assertEqual(len(order_queue), 99)
+
+    def test_amendments_of_queued_orders_stay_in_place(self):
+        order_queue = OrderQueue()
+        order_queue.add_order(OrderRequest(1, 100.0, 10, 'B', 1))
+        order_queue.handle_request(OrderRequest(1, 101.0, 10, 'B', 1, RequestType.Modify))
+        self.assertEqual(len(order_queue), 1)
+        self.assertEqual(order_queue.pop().m_price, 101.0)
+
+    def test_new_orders_held_back_from_reserve(self):
+        order_queue = OrderQueue()
+        self.send_all(order_queue, 3)
+        processor = OrderProcessor(5, order_queue, reserved_tokens=3)
+        sent = []
+        processor.send = sent.append
+        for i in range(3):
+            order_queue.handle_request(OrderRequest(1, 0, 0, 'B', i, RequestType.Cancel))
+        for i in range(10, 20):
+            order_queue.add_order(OrderRequest(1, 100.0, 10, 'B', i))
+        thread = threading.Thread(target=processor.process_queue, daemon=True)
+        thread.start()
+        time_module.sleep(0.1)
+        processor.close()
+        thread.join(1.0)
+        # 5 tokens: the 3 cancels, then new orders only down to the reserve of 3
+        self.assertEqual([o.request_type for o in sent[:3]], [RequestType.Cancel] * 3)
+        self.assertEqual(len(sent), 3)
+
+    def test_new_orders_do_not_starve(self):
+        order_queue = OrderQueue()
+        self.send_all(order_queue, 40)
+        order_queue.add_order(OrderRequest(1, 100.0, 10, 'B', 1000))
+        for i in range(40):
+            order_queue.handle_request(OrderRequest(1, 0, 0, 'B', i, RequestType.Cancel))
+        processor = OrderProcessor(1000, order_queue, reserved_tokens=2000, max_priority_streak=8)
+        sent = []
+        processor.send = lambda order: sent.append(order.m_orderId)
+        thread = threading.Thread(target=processor.process_queue, daemon=True)
+        thread.start()
+        deadline = time_module.monotonic() + 2.0
+        while len(sent) < 41 and time_module.monotonic() < deadline:
+            time_module.sleep(0.005)
+        processor.close()
+        thread.join(1.0)
+        self.assertEqual(sorted(sent), list(range(40)) + [1000])
+
+    def test_amendments_follow_their_order_on_the_wire(self):
+        class JitteredTransport:
+            def __init__(self):
+                self.wire = []
+                self.lock = threading.Lock()
+
+            def send(self, order):
+                time_module.sleep(random.random() * 0.001)
+                with self.lock:
+                    self.wire.append((order.m_orderId, order.request_type))
+
+        def sent(request):
+            # Waits until the processor has popped it, so the next amendment
+            # becomes a message of its own while this one may still be in flight
+            order_queue.handle_request(request)
+            deadline = time_module.monotonic() + 5.0
+            while len(order_queue) and time_module.monotonic() < deadline:
+                time_module.sleep(0)
+
+        order_queue = OrderQueue()
+        transport = JitteredTransport()
+        processor = OrderProcessor(100000, order_queue, max_in_flight=16, transport=transport)
+        thread = threading.Thread(target=processor.process_queue, daemon=True)
+        thread.start()
+        count = 300
+        for i in range(count):
+            sent(OrderRequest(i % 4, 100.0, 10, 'B', i))
+            sent(OrderRequest(i % 4, 99.0, 5, 'B', i, RequestType.Modify))
+            sent(OrderRequest(i % 4, 0, 0, 'B', i, RequestType.Cancel))
+        processor.close()
+        thread.join(1.0)
+        sequences = {}
+        for order_id, request_type in transport.wire:
+            sequences.setdefault(order_id, []).append(request_type)
+        expected = [RequestType.New, RequestType.Modify, RequestType.Cancel]
+        self.assertEqual(len(sequences), count)
+        self.assertEqual([i for i, sequence in sequences.items() if sequence != expected], [])
+
+
+class TestAmendmentCoalescing(unittest.TestCase):
+    def setUp(self):
+        self.order_queue = ShardedOrderQueue()
+        for i in range(3):
+            self.order_queue.add_order(OrderRequest(1, 100.0, 10, 'B', i))
+            self.order_queue.pop()  # Sent
+
+    def test_modifies_of_sent_order_collapse_to_latest(self):
+        for price in (101.0, 102.0, 103.0):
+            self.order_queue.handle_request(OrderRequest(1, price, 20, 'B', 0, RequestType.Modify))
+        modify = self.order_queue.pop()
+        self.assertEqual((modify.request_type, modify.m_price), (RequestType.Modify, 103.0))
+        self.assertIsNone(self.order_queue.pop())
+        # Once the merged modify has left, the next one is a new message
+        self.order_queue.handle_request(OrderRequest(1, 104.0, 20, 'B', 0, RequestType.Modify))
+        self.assertEqual(self.order_queue.pop().m_price, 104.0)
+        self.assertEqual(self.order_queue.coalescing_stats()["modifies_merged"], 2)
+
+    def test_cancel_drops_pending_modify(self):
+        self.order_queue.handle_request(OrderRequest(1, 101.0, 20, 'B', 1, RequestType.Modify))
+        self.order_queue.handle_request(OrderRequest(1, 0, 0, 'B', 1, RequestType.Cancel))
+        self.assertEqual(self.order_queue.pop().request_type, RequestType.Cancel)
+        self.assertIsNone(self.order_queue.pop())
+        self.assertEqual(self.order_queue.coalescing_stats()["modifies_dropped"], 1)
+
+    def test_cancel_before_send_annihilates_without_tokens(self):
+        processor = OrderProcessor(5, self.order_queue)
+        self.order_queue.add_order(OrderRequest(2, 100.0, 10, 'B', 10))
+        self.order_queue.handle_request(OrderRequest(2, 101.0, 10, 'B', 10, RequestType.Modify))
+        self.order_queue.handle_request(OrderRequest(2, 0, 0, 'B', 10, RequestType.Cancel))
+        self.assertEqual(len(self.order_queue), 0)
+        self.assertEqual(processor.tokens, 5)
+        stats = self.order_queue.coalescing_stats()
+        self.assertEqual((stats["modifies_in_place"], stats["cancels_annihilated"]), (1, 1))
+        self.assertEqual(stats["messages_saved"], 3)
+        self.assertEqual(stats["tokens_saved"], 3)
+
+    def test_amendments_of_acked_order_are_ignored(self):
+        shard = self.order_queue.shard(1)
+        self.order_queue.orders.pop(2)  # Acked
+        shard.modify_order(OrderRequest(1, 101.0, 20, 'B', 2, RequestType.Modify))
+        shard.cancel_order(OrderRequest(1, 0, 0, 'B', 2, RequestType.Cancel))
+        self.assertIsNone(self.order_queue.pop())
+
+    def test_order_is_indexed_before_it_is_logged(self):
+        order_queue = OrderQueue(request_log=Mock())
+        def applied(outcomes, requests):
+            if outcomes[0] == RequestOutcome.Added:
+                self.assertIn(requests[0].m_orderId, order_queue.orders)
+        order_queue.request_log.applied.side_effect = applied
+        order_queue.add_order(OrderRequest(1, 100.0, 10, 'B', 7))
+        self.assertEqual(order_queue.handle_request(OrderRequest(1, 0, 0, 'B', 7, RequestType.Cancel)),
+                         RequestOutcome.Canceled)
+        order_queue.request_log.applied.assert_called()
+
+
+class TestTradingSchedule(unittest.TestCase):
+    def test_window_crossing_midnight(self):
+        schedule = TradingSchedule([(time(22, 0), time(2, 0))])
+        self.assertTrue(schedule.is_open_at(datetime(2024, 1, 2, 23, 0)))
+        self.assertTrue(schedule.is_open_at(datetime(2024, 1, 2, 1, 0)))
+        self.assertTrue(schedule.is_open_at(datetime(2024, 1, 2, 2, 0)))
+        self.assertFalse(schedule.is_open_at(datetime(2024, 1, 2, 12, 0)))
+
+    def test_multiple_sessions(self):
+        schedule = TradingSchedule([(time(9, 0), time(12, 0)), (time(13, 0), time(16, 0))])
+        self.assertTrue(schedule.is_open_at(datetime(2024, 1, 2, 12, 0)))
+        self.assertFalse(schedule.is_open_at(datetime(2024, 1, 2, 12, 30)))
+        is_open, boundaries = schedule.transitions(datetime(2024, 1, 2, 11, 0))
+        self.assertTrue(is_open)
+        self.assertEqual(boundaries, [
+            (datetime(2024, 1, 2, 12, 0, 0, 1), False),
+            (datetime(2024, 1, 2, 13, 0), True),
+            (datetime(2024, 1, 2, 16, 0, 0, 1), False),
+            (datetime(2024, 1, 3, 9, 0), True),
+        ])
+
+    def test_scheduler_fires_at_boundaries(self):
+        now = datetime.now()
+        events = []
+        schedule = TradingSchedule([((now + timedelta(seconds=0.2)).time(), (now + timedelta(seconds=0.4)).time())])
+        start = time_module.monotonic()
+        scheduler = SessionScheduler(schedule,
+                                     on_open=lambda: events.append(("open", time_module.monotonic() - start)),
+                                     on_close=lambda: events.append(("close", time_module.monotonic() - start)))
+        scheduler.start()
+        self.assertFalse(scheduler.open)
+        time_module.sleep(0.3)
+        self.assertTrue(scheduler.open)
+        time_module.sleep(0.2)
+        scheduler.stop()
+        self.assertFalse(scheduler.open)
+        self.assertEqual([name for name, _ in events], ["open", "close"])
+        self.assertAlmostEqual(events[0][1], 0.2, delta=0.05)
+        self.assertAlmostEqual(events[1][1], 0.4, delta=0.05)
+
+    def test_moving_the_boundary_logs_out(self):
+        now = datetime.now()
+        system = OrderManagement((now - timedelta(hours=1)).time(), (now + timedelta(hours=1)).time(), 5,
+                                 response_storage_path=Path(tempfile.mkdtemp()) / "responses.json")
+        self.addCleanup(shutil.rmtree, system.response_handler.storage_path.parent)
+        self.addCleanup(system.close)
+        self.assertTrue(system.is_within_time_window())
+        self.assertTrue(system.is_logged_on)
+        system.end_time = (now - timedelta(minutes=30)).time()
+        self.assertFalse(system.is_within_time_window())
+        self.assertFalse(system.is_logged_on)
+
+
+class TestMetrics(unittest.TestCase):
+    def test_counter_sums_thread_cells(self):
+        counter = MetricsRegistry().counter("hits_total", "Hits").labels()
+        threads = [threading.Thread(target=lambda: [counter.inc() for _ in range(1000)]) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        counter.inc(5)
+        self.assertEqual(counter.value(), 4005)
+
+    def test_cached_cells_are_summed(self):
+        registry = MetricsRegistry()
+        counter = registry.counter("hits_total", "Hits").labels()
+        histogram = registry.histogram("wait_seconds", "Waits", buckets=(0.1, 1.0)).labels()
+
+        def work():
+            counter_cell, histogram_cell = counter.cell(), histogram.cell()
+            self.assertIs(counter.cell(), counter_cell)  # One per thread
+            for _ in range(1000):
+                counter_cell.inc()
+            histogram_cell.observe(0.5)
+        threads = [threading.Thread(target=work) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        counter.inc(5)
+        self.assertEqual(counter.value(), 4005)
+        self.assertEqual(histogram.value()["buckets"], [(0.1, 0), (1.0, 4), (math.inf, 4)])
+
+    def test_histogram_and_exposition(self):
+        registry = MetricsRegistry()
+        histogram = registry.histogram("wait_seconds", "Wait", buckets=(0.1, 1.0))
+        for value in (0.05, 0.5, 0.5, 5.0):
+            histogram.observe(value)
+        registry.counter("requests_total", "Requests", ("type",)).labels("New").inc(3)
+        registry.gauge("depth", "Depth", function=lambda: 7)
+        self.assertEqual(registry.snapshot()["wait_seconds"]["buckets"], [(0.1, 1), (1.0, 3), (float("inf"), 4)])
+        self.assertEqual(registry.snapshot()["requests_total"], {("New",): 3})
+        text = registry.exposition()
+        self.assertIn('# TYPE wait_seconds histogram', text)
+        self.assertIn('wait_seconds_bucket{le="+Inf"} 4', text)
+        self.assertIn('wait_seconds_count 4', text)
+        self.assertIn('requests_total{type="New"} 3', text)
+        self.assertIn('depth 7', text)
+
+    def test_oms_reports_to_registry(self):
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir)
+        system = OrderManagement(time(0, 0), time(23, 59), 1000, response_storage_path=Path(temp_dir) / "r.json",
+                                 durability=None)
+        self.addCleanup(system.close)
+        with patch.object(system.session, 'open', True):
+            system.submit_many([OrderRequest(1, 100.0, 10, 'B', i) for i in range(3)])
+        deadline = time_module.monotonic() + 2.0
+        while system.metrics.snapshot()["oms_messages_sent_total"].get(("New",), 0) < 3:
+            self.assertLess(time_module.monotonic(), deadline)
+            time_module.sleep(0.01)
+        system.on_responses([OrderResponse(0, ResponseType.Accept), OrderResponse(1, ResponseType.Reject),
+                             OrderResponse(99, ResponseType.Accept)])
+        snapshot = system.metrics.snapshot()
+        self.assertEqual(snapshot["oms_requests_total"][("New",)], 3)
+        self.assertEqual(snapshot["oms_responses_total"], {("Accept",): 1, ("Reject",): 1, ("Unknown",): 0})
+        self.assertEqual(snapshot["oms_unmatched_responses_total"], 1)
+        self.assertEqual(snapshot["oms_queue_depth"], 0)
+        self.assertEqual(snapshot["oms_time_in_queue_seconds"]["count"], 3)
+        self.assertEqual(snapshot["oms_ack_latency_seconds"]["count"], 2)
+
+    def test_exporters(self):
+        registry = MetricsRegistry()
+        registry.counter("requests_total", "Requests").inc(2)
+        server = start_http_server(registry, 0)
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        with urllib.request.urlopen(f"http://127.0.0.1:{server.server_address[1]}/metrics") as reply:
+            self.assertIn("requests_total 2", reply.read().decode())
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir)
+        path = Path(temp_dir) / "oms.prom"
+        write_textfile(registry, path)
+        self.assertIn("# TYPE requests_total counter", path.read_text())
+
+class TestRingLogger(unittest.TestCase):
+    def make_logger(self, **kwargs):
+        stream = io.StringIO()
+        logger = RingLogger(stream=stream, **kwargs)
+        self.addCleanup(logger.close)
+        return logger, stream
+
+    def test_levels_filter_before_enqueue(self):
+        logger, stream = self.make_logger(level=WARNING)
+        logger.info("Order %d added to queue.", 1)
+        logger.warning("Order %d rejected: %s", 2, "System busy")
+        logger.flush()
+        lines = stream.getvalue().splitlines()
+        self.assertEqual(len(lines), 1)
+        self.assertIn("WARNING", lines[0])
+        self.assertTrue(lines[0].endswith("Order 2 rejected: System busy"))
+        self.assertEqual(logger.stats(), {"written": 1, "dropped": 0, "pending": 0})
+
+    def test_sampling_keeps_one_in_n(self):
+        logger, stream = self.make_logger()
+        logger.set_sampling("sends", 10)
+        sampler = logger.sampled("sends")
+        for order_id in range(100):
+            sampler.info("Sending order %d to exchange", order_id)
+        logger.flush()
+        lines = stream.getvalue().splitlines()
+        self.assertEqual(len(lines), 10)
+        self.assertTrue(lines[0].endswith("Sending order 9 to exchange"))
+
+    def test_full_ring_drops_and_counts(self):
+        release = threading.Event()
+
+        class BlockingStream(io.StringIO):
+            def write(self, text):
+                release.wait()
+                return super().write(text)
+
+        stream = BlockingStream()
+        logger = RingLogger(capacity=4, stream=stream, batch_size=1)
+        self.addCleanup(logger.close)
+        logger.info("first")
+        while logger.stats()["pending"]:
+            time_module.sleep(0.001)  # Until the drain thread has taken it and blocks writing
+        for i in range(10):
+            logger.info("record %d", i)
+        self.assertEqual(logger.dropped, 6)
+        release.set()
+        logger.flush()
+        self.assertEqual(len(stream.getvalue().splitlines()), 5)
+
+    def test_records_keep_order_per_thread(self):
+        logger, stream = self.make_logger()
+        threads = [threading.Thread(target=lambda t=t: [logger.info("%d %d", t, i) for i in range(200)])
+                   for t in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        logger.close()
+        lines = stream.getvalue().splitlines()
+        self.assertEqual(len(lines), 800)
+        for t in range(4):
+            sequence = [int(line.split()[-1]) for line in lines if line.split()[-2] == str(t)]
+            self.assertEqual(sequence, list(range(200)))
+
+class TestRequestLog(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.temp_dir)
+        self.path = Path(self.temp_dir) / "requests.wal"
+
+    def test_recovers_every_lane(self):
+        request_log = RequestLog(self.path, snapshot_interval=None)
+        queue = OrderQueue(request_log=request_log)
+        queue.handle_requests([OrderRequest(1, 100.0, 10, 'B', i) for i in range(5)])
+        queue.pop()
+        queue.pop()  # Orders 0 and 1 are at the exchange
+        queue.handle_requests([
+            OrderRequest(1, 99.0, 5, 'B', 0, RequestType.Modify),   # Modify lane
+            OrderRequest(1, 0, 0, 'B', 1, RequestType.Cancel),      # Cancel lane
+            OrderRequest(1, 0, 0, 'B', 2, RequestType.Cancel),      # Never sent, gone
+            OrderRequest(1, 101.0, 10, 'B', 3, RequestType.Modify), # Applied in place
+        ])
+        request_log.close(snapshot=False)  # As if the process died
+
+        recovered = RequestLog(self.path, snapshot_interval=None)
+        self.addCleanup(recovered.close)
+        pending = recovered.pending()
+        self.assertEqual([(o.m_orderId, o.request_type) for o in pending],
+                         [(0, RequestType.Modify), (1, RequestType.Cancel), (3, RequestType.New), (4, RequestType.New)])
+        restored = OrderQueue(request_log=recovered)
+        restored.restore(pending)
+        self.assertEqual(set(restored.orders), {0, 3, 4})
+        popped = [restored.pop() for _ in range(4)]
+        self.assertEqual([(o.m_orderId, o.request_type) for o in popped],
+                         [(1, RequestType.Cancel), (0, RequestType.Modify), (3, RequestType.New), (4, RequestType.New)])
+        self.assertEqual((popped[1].m_price, popped[1].m_qty), (99.0, 5))
+        self.assertEqual(popped[2].m_price, 101.0)
+
+    def test_journal_writes_do_not_hold_the_shard_lock(self):
+        request_log = RequestLog(self.path, snapshot_interval=None)
+        self.addCleanup(request_log.close)
+        queue = ShardedOrderQueue(request_log=request_log)
+        writing = threading.Event()
+        release = threading.Event()
+        append_many = request_log.journal.append_many
+
+        def slow_append_many(records, **kwargs):
+            writing.set()
+            release.wait(5.0)  # A slow disk
+            append_many(records, **kwargs)
+        request_log.journal.append_many = slow_append_many
+        ingress = threading.Thread(target=queue.handle_request, args=(OrderRequest(1, 100.0, 10, 'B', 1),))
+        ingress.start()
+        self.assertTrue(writing.wait(5.0))
+        # The shard is free while its request is written, the processor can pop it meanwhile
+        popped = []
+        popper = threading.Thread(target=lambda: popped.append(queue.pop()))
+        popper.start()
+        popper.join(1.0)
+        self.assertEqual([order.m_orderId for order in popped], [1])
+        release.set()
+        ingress.join(5.0)
+        request_log.commit()
+        self.assertEqual(request_log.pending()[0].request_type, RequestType.Unknown)
+
+    def test_snapshot_bounds_replay(self):
+        request_log = RequestLog(self.path, snapshot_interval=None, segment_size=256)
+        queue = OrderQueue(request_log=request_log)
+        queue.handle_requests([OrderRequest(i % 3, 100.0 + i, 10, 'S', i) for i in range(100)])
+        request_log.done([0, 1])
+        self.assertEqual(request_log.snapshot(), 98)
+        self.assertEqual(request_log.journal.sealed_segments(), [])  # Covered by the snapshot
+        queue.add_order(OrderRequest(1, 100.0, 10, 'B', 100))
+        request_log.close(snapshot=False)
+
+        recovered = RequestLog(self.path, snapshot_interval=None)
+        self.addCleanup(recovered.close)
+        self.assertEqual(recovered.replayed, 1)
+        self.assertEqual(len(recovered), 99)
+        self.assertEqual(recovered.pending()[0].m_orderId, 2)
+        self.assertEqual(recovered.pending()[-1].m_orderId, 100)
+
+    def test_oms_restores_pending_orders(self):
+        storage = Path(self.temp_dir) / "r.json"
+        system = OrderManagement(time(0, 0), time(23, 59), 1000, response_storage_path=storage,
+                                 durability=None, request_log_path=self.path)
+        with patch.object(system.session, 'open', True):
+            system.submit_many([OrderRequest(1, 100.0, 10, 'B', i) for i in range(3)])
+        deadline = time_module.monotonic() + 2.0
+        while len(system.order_queue):
+            self.assertLess(time_module.monotonic(), deadline)
+            time_module.sleep(0.01)
+        time_module.sleep(0.1)  # Let the last send finish
+        system.on_responses([OrderResponse(0, ResponseType.Accept)])
+        system.close()
+
+        restarted = OrderManagement(time(0, 0), time(23, 59), 1000, response_storage_path=storage,
+                                    durability=None, request_log_path=self.path)
+        self.addCleanup(restarted.close)
+        self.assertEqual(restarted.request_log.replayed, 0)  # close() took a snapshot
+        self.assertEqual(set(restarted.order_queue.orders), {1, 2})
+        self.assertEqual(len(restarted.order_queue), 0)  # Both were sent, only their acks are missing
+        self.assertEqual(restarted.on_responses([OrderResponse(1, ResponseType.Accept)]), [True])
+
+class TestResponseStore(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.temp_dir)
+        self.path = Path(self.temp_dir) / "acks.bin"
+
+    def fill(self, store, count):
+        # Order IDs arrive shuffled so every run has to be sorted; record i has latency 1000 + i
+        store.append_many([(i * 37 % count, i % 5, ResponseType.Reject if i % 4 == 0 else ResponseType.Accept,
+                            1000 + i, 1_000_000 + i * 10) for i in range(count)])
+        store.append(7, 2, ResponseType.Accept, 5, 1_000_000 + count * 10)  # A second ack for order 7
+
+    def test_lookup_across_runs_and_tail(self):
+        store = ResponseStore(self.path, run_size=8)
+        self.addCleanup(store.close)
+        self.fill(store, 101)
+        # Runs are merged while the newest is as large as the one before it
+        counts = [run.count for run in store.runs]
+        self.assertEqual(counts, sorted(counts, reverse=True))
+        self.assertEqual(sum(counts), store.indexed)
+        self.assertLess(len(store.runs), 5)
+        for order_id in (0, 50, 100):
+            [ack] = store.lookup(order_id)
+            self.assertEqual(ack.order_id, order_id)
+            self.assertEqual(store.record(ack.latency_ns - 1000), ack)
+        first, second = store.lookup(7)
+        self.assertEqual((first.order_id, second.order_id, second.latency_ns), (7, 7, 5))
+        self.assertEqual(store.lookup(1000), [])
+
+    def test_time_range_scan(self):
+        store = ResponseStore(self.path, run_size=16)
+        self.addCleanup(store.close)
+        self.fill(store, 50)
+        acks = store.scan(1_000_100, 1_000_200)
+        self.assertEqual([ack.timestamp_ns for ack in acks], list(range(1_000_100, 1_000_200, 10)))
+        self.assertEqual(len(store.scan()), 51)
+        self.assertEqual(len(store.scan(start_ns=1_000_490)), 2)
+        # A late ack keeps its timestamp and is found in its own time range, not where it was appended
+        store.append(99, 1, ResponseType.Accept, 1, 1_000_105)
+        store.append(98, 1, ResponseType.Accept, 1, 1_000_600)
+        self.assertEqual(store.lookup(99)[0].timestamp_ns, 1_000_105)
+        self.assertEqual(store.late, 1)
+        self.assertEqual([ack.order_id for ack in store.scan(1_000_100, 1_000_110)], [10 * 37 % 50, 99])
+        self.assertEqual([ack.order_id for ack in store.scan(start_ns=1_000_500)], [7, 98])
+        self.assertEqual(len(store.scan(end_ns=1_000_110)), 12)
+
+    def test_reopen_truncates_torn_record(self):
+        store = ResponseStore(self.path, run_size=8)
+        self.fill(store, 101)
+        expected = store.lookup(42)
+        store.close()
+        with open(self.path, 'ab') as f:
+            f.write(b'torn')
+        reopened = ResponseStore(self.path, run_size=8)
+        self.addCleanup(reopened.close)
+        self.assertEqual(len(reopened), 102)
+        self.assertEqual(reopened.indexed, store.indexed)
+        self.assertEqual(sum(map(len, reopened.tail.values())), 102 - reopened.indexed)
+        self.assertEqual(reopened.lookup(42), expected)
+        reopened.append(500, 1, ResponseType.Accept, 1, 0)
+        self.assertEqual(reopened.scan(end_ns=1)[0].order_id, 500)
+
+    def test_keys_rebuilt_on_open(self):
+        store = ResponseStore(self.path, run_size=8)
+        self.fill(store, 20)
+        store.append(99, 1, ResponseType.Accept, 1, 1_000_055)  # 145 ns behind the last ack
+        store.close()
+        # As if the keys were lost in a crash, or the store predates them
+        Path(str(self.path) + ".keys").unlink()
+        reopened = ResponseStore(self.path, run_size=8)
+        self.addCleanup(reopened.close)
+        self.assertEqual(reopened.max_lag_ns, 145)
+        self.assertEqual([ack.order_id for ack in reopened.scan(1_000_050, 1_000_060)], [5 * 37 % 20, 99])
+
+    def test_handler_finds_responses(self):
+        order_queue = OrderQueue()
+        handler = ResponseHandler(order_queue, storage_path=Path(self.temp_dir) / "responses.json",
+                                  store_path=self.path)
+        self.addCleanup(handler.close)
+        for order_id in range(3):
+            order_queue.add_order(OrderRequest(4, 100.0, 10, 'B', order_id))
+        handler.handle_responses([OrderResponse(order_id, ResponseType.Accept) for order_id in range(3)])
+        [ack] = handler.find_responses(1)
+        self.assertEqual((ack.order_id, ack.symbol_id, ack.response_type), (1, 4, ResponseType.Accept))
+        self.assertGreater(ack.latency_ns, 0)
+        self.assertEqual(handler.find_responses(9), [])
+
+
+class TestResponseWindow(unittest.TestCase):
+    def record(self, order_id, timestamp, symbol_id=1, response_type=ResponseType.Accept, latency=0.001):
+        return {"order_id": order_id, "symbol_id": symbol_id, "response_type": response_type,
+                "latency": latency, "timestamp": timestamp}
+
+    def test_count_limit_rolls_up_per_minute_and_symbol(self):
+        window = ResponseWindow(max_responses=3)
+        window.extend([self.record(0, 600.0, latency=0.004), self.record(1, 630.0, response_type=ResponseType.Reject),
+                       self.record(2, 659.0, symbol_id=2), self.record(3, 660.0, latency=0.002)], now=700.0)
+        window.extend([self.record(order_id, 700.0) for order_id in range(4, 7)], now=700.0)
+        self.assertEqual([record["order_id"] for record in window], [4, 5, 6])
+        self.assertEqual(window.evicted, 4)
+        rollups = window.rollup_snapshot()
+        self.assertEqual([(rollup["minute"], rollup["symbol_id"], rollup["count"]) for rollup in rollups],
+                         [(600, 1, 2), (600, 2, 1), (660, 1, 1)])
+        first = rollups[0]
+        self.assertEqual((first["accepts"], first["rejects"]), (1, 1))
+        self.assertAlmostEqual(first["latency_sum"], 0.005)
+        self.assertEqual((first["latency_min"], first["latency_max"]), (0.001, 0.004))
+
+    def test_age_limit(self):
+        window = ResponseWindow(max_age=30)
+        window.extend([self.record(order_id, 100.0 + order_id * 10) for order_id in range(5)], now=140.0)
+        self.assertEqual([record["order_id"] for record in window], [1, 2, 3, 4])
+        window.expire(now=1000.0)
+        self.assertEqual(len(window), 0)
+        self.assertEqual([(rollup["minute"], rollup["count"]) for rollup in window.rollup_snapshot()], [(60, 2), (120, 3)])
+
+    def test_unbounded_keeps_everything(self):
+        window = ResponseWindow()
+        window.extend([self.record(order_id, 0.0) for order_id in range(100)], now=1e9)
+        self.assertEqual(len(window), 100)
+        self.assertEqual(window.rollup_snapshot(), [])
+
+    def test_handler_bounds_memory_across_restarts(self):
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir)
+        path = Path(temp_dir) / "responses.json"
+        order_queue = OrderQueue()
+        handler = ResponseHandler(order_queue, storage_path=path, max_responses=10)
+        for order_id in range(25):
+            order_queue.add_order(OrderRequest(order_id % 2, 100.0, 10, 'B', order_id))
+        handler.handle_responses([OrderResponse(order_id, ResponseType.Accept) for order_id in range(25)])
+        self.assertEqual([response["order_id"] for response in handler.responses], list(range(15, 25)))
+        self.assertEqual(sum(rollup["count"] for rollup in handler.response_rollups()), 15)
+        handler.close()
+        # Every response is still in the journal, reloading puts it back through the window
+        reloaded = ResponseHandler(order_queue, storage_path=path, max_responses=10)
+        self.addCleanup(reloaded.close)
+        self.assertEqual(len(reloaded.responses), 10)
+        self.assertEqual(sum(rollup["accepts"] for rollup in reloaded.response_rollups()), 15)
+
+    def test_legacy_history_without_symbols(self):
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir)
+        path = Path(temp_dir) / "responses.json"
+        path.write_text(json.dumps([{"order_id": order_id, "response_type": "ResponseType.Accept",
+                                     "latency": 0.1, "timestamp": 1734785224.0 + order_id}
+                                    for order_id in range(5)], indent=4))
+        handler = ResponseHandler(OrderQueue(), storage_path=path, max_responses=2)
+        self.addCleanup(handler.close)
+        self.assertEqual([response["order_id"] for response in handler.responses], [3, 4])
+        [rollup] = handler.response_rollups()
+        self.assertEqual((rollup["symbol_id"], rollup["count"], rollup["accepts"]), (-1, 3, 3))
+
+
+class TestShmRing(unittest.TestCase):
+    def setUp(self):
+        self.ring = ShmRing(slots=6, record_size=8)
+        self.addCleanup(self.ring.close)
+
+    def records(self, values):
+        return b''.join(struct.pack('<q', value) for value in values)
+
+    def test_wraps_around_and_fills_up(self):
+        self.assertEqual(self.ring.slots, 8)
+        self.assertEqual(self.ring.try_write(self.records(range(5))), 5)
+        self.assertEqual(self.ring.try_read(3), self.records(range(3)))
+        # Five slots free: the write wraps past the end of the ring and stops when it is full
+        self.assertEqual(self.ring.try_write(self.records(range(5, 12))), 6)
+        self.assertEqual(len(self.ring), 8)
+        self.assertEqual(self.ring.try_read(), self.records(range(3, 11)))
+        self.assertEqual(self.ring.try_read(), b'')
+
+    def test_reader_sees_close_after_the_last_records(self):
+        self.ring.write(self.records((1, 2)))
+        self.ring.close_writer()
+        self.assertEqual(self.ring.read(), self.records((1, 2)))
+        self.assertIsNone(self.ring.read())
+        other = ShmRing(slots=4, record_size=8)
+        self.addCleanup(other.close)
+        self.assertEqual(other.read(timeout=0.01), b'')
+
+    def test_fenced_on_hosts_without_store_ordering(self):
+        self.assertIsNone(self.ring.fence)
+        with patch("platform.machine", return_value="aarch64"):
+            ring = ShmRing(slots=8, record_size=8)
+        self.addCleanup(ring.close)
+        self.assertIsNotNone(ring.fence)
+        # The consumer end needs the creator's fence, as passing the ring to a process hands it over
+        with self.assertRaises(ValueError):
+            ShmRing.attach(ring.name)
+        reader = ShmRing.attach(ring.name, ring.fence)
+        self.addCleanup(reader.close)
+        ring.write(self.records(range(6)))
+        self.assertEqual(reader.read(4), self.records(range(4)))
+        ring.close_writer()
+        self.assertEqual(reader.read(), self.records((4, 5)))
+        self.assertIsNone(reader.read())
+
+class TestMultiProcessPipeline(unittest.TestCase):
+    def test_orders_flow_through_every_process(self):
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir)
+        exchange = MockExchange(latency="fixed:100").start()
+        self.addCleanup(exchange.stop)
+        pipeline = MultiProcessPipeline(100000, response_storage_path=Path(temp_dir) / "responses.json",
+                                        response_store_path=Path(temp_dir) / "acks.bin",
+                                        transport=functools.partial(SocketTransport, exchange.address))
+        pipeline.submit_many([OrderRequest(order_id % 3, 100.0, 10, 'B', order_id) for order_id in range(200)])
+        pipeline.submit(OrderRequest(1, 100.0, 10, 'B', 200))
+        summary = pipeline.close()
+        self.assertEqual(summary["responses"], 201)
+        self.assertEqual(summary["latency"]["overall"]["count"], 201)
+        journal = Journal(Path(temp_dir) / "responses.json")
+        self.assertEqual(sorted(record["order_id"] for record in journal.replay()), list(range(201)))
+        journal.close()
+        store = ResponseStore(Path(temp_dir) / "acks.bin")
+        self.assertEqual(store.lookup(200)[0].symbol_id, 1)
+        store.close()
+
+    def test_fenced_rings_across_processes(self):
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir)
+        exchange = MockExchange(latency="fixed:100").start()
+        self.addCleanup(exchange.stop)
+        # Rings created as on aarch64, the child processes attach them with their fences
+        with patch("platform.machine", return_value="aarch64"):
+            pipeline = MultiProcessPipeline(100000, response_storage_path=Path(temp_dir) / "responses.json",
+                                            transport=functools.partial(SocketTransport, exchange.address))
+        self.assertIsNotNone(pipeline.requests.fence)
+        pipeline.submit_many([OrderRequest(order_id % 3, 100.0, 10, 'B', order_id) for order_id in range(500)])
+        self.assertEqual(pipeline.close()["responses"], 500)
+
+
+@unittest.skipUnless(numpy, "NumPy is not installed")
+class TestResponseAnalytics(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.temp_dir)
+        # Ack i: symbol i % 3, every fifth rejected, latency i ms, one a second from t = 600 s
+        self.acks = [(i, i % 3, ResponseType.Reject if i % 5 == 0 else ResponseType.Accept,
+                      i * 1_000_000, (600 + i) * 10**9) for i in range(1, 121)]
+
+    def records(self):
+        return [{"order_id": order_id, "symbol_id": symbol_id, "response_type": str(response_type),
+                 "latency": latency_ns / 1e9, "timestamp": timestamp_ns / 1e9}
+                for order_id, symbol_id, response_type, latency_ns, timestamp_ns in self.acks]
+
+    def check(self, report, symbols=True):
+        self.assertEqual(report["responses"], 120)
+        self.assertEqual((report["accepts"], report["rejects"]), (96, 24))
+        self.assertAlmostEqual(report["reject_ratio"], 0.2)
+        latency = report["latency_ns"]
+        self.assertEqual((latency["min"], latency["max"]), (1_000_000, 120_000_000))
+        self.assertAlmostEqual(latency["p50"], 60_000_000, delta=60_000_000 / 64)
+        self.assertAlmostEqual(report["span_s"], 119.0)
+        self.assertEqual([(bucket["start"], bucket["count"]) for bucket in report["by_bucket"]],
+                         [(600.0, 59), (660.0, 60), (720.0, 1)])
+        self.assertEqual([ack["order_id"] for ack in report["worst"]], [120, 119, 118])
+        if symbols:
+            self.assertEqual({symbol_id: stats["count"] for symbol_id, stats in report["by_symbol"].items()},
+                             {0: 40, 1: 40, 2: 40})
+            self.assertEqual(report["worst"][0]["symbol_id"], 0)
+
+    def analyze(self, path):
+        # Small chunks so every statistic has to be carried across chunks
+        return response_analytics.analyze(path, bucket_seconds=60, worst=3, chunk_size=7)
+
+    def test_journal_segments(self):
+        journal = Journal(self.temp_dir / "responses.json", segment_size=2000)
+        journal.append_many(self.records())
+        journal.close()
+        self.assertTrue(journal.sealed_segments())
+        with open(self.temp_dir / "responses.json", 'ab') as f:
+            f.write(b'{"order_id": 121, "lat')  # Torn by a crash
+        self.check(self.analyze(self.temp_dir / "responses.json"))
+
+    def test_legacy_json_array_is_read_in_place(self):
+        path = self.temp_dir / "legacy.json"
+        records = self.records()
+        for record in records:
+            del record["symbol_id"]  # Not recorded by the original format
+        path.write_text(json.dumps(records, indent=4))
+        with open(path) as f:
+            self.assertEqual(list(response_analytics._iter_json_array(f, chunk_chars=50)), records)
+        report = self.analyze(path)
+        self.check(report, symbols=False)
+        self.assertEqual(list(report["by_symbol"]), [-1])
+        self.assertTrue(path.read_text().startswith("["))
+
+    def test_response_store(self):
+        store = ResponseStore(self.temp_dir / "acks.bin", run_size=50)
+        store.append_many(self.acks)
+        store.close()
+        self.check(self.analyze(self.temp_dir / "acks.bin"))
+
+    def test_cli_json(self):
+        path = self.temp_dir / "acks.bin"
+        store = ResponseStore(path)
+        store.append_many(self.acks)
+        store.close()
+        output = io.StringIO()
+        with patch("sys.stdout", output):
+            response_analytics.main([str(path), "--json", "--worst", "3"])
+        self.check(json.loads(output.getvalue(), object_hook=lambda d: {
+            int(key) if key.isdigit() else key: value for key, value in d.items()}))
+
 
 if __name__ == "__main__":
     unittest.main()